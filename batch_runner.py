@@ -0,0 +1,102 @@
+import logging
+import time
+from typing import Dict, Any, List, Optional
+from anthropic import Anthropic
+
+logger = logging.getLogger(__name__)
+
+# Below this many requests the regular messages.create path is faster, since a
+# batch is only guaranteed to finish within 24 hours.
+DEFAULT_BATCH_THRESHOLD = 5
+DEFAULT_POLL_INTERVAL = 10.0
+# Stop waiting on a batch after an hour; the caller is blocked until it ends
+DEFAULT_BATCH_TIMEOUT = 3600.0
+# Hard limit imposed by the Message Batches endpoint
+MAX_BATCH_REQUESTS = 10000
+
+class BatchRunner:
+    def __init__(self, client: Anthropic, poll_interval: float = DEFAULT_POLL_INTERVAL, timeout: Optional[float] = None):
+        """
+        Submit many independent message requests through the Message Batches API.
+
+        Args:
+            client (Anthropic): The Anthropic client.
+            poll_interval (float): Seconds to wait between status checks.
+            timeout (Optional[float]): Give up waiting after this many seconds. None waits until the batch ends.
+        """
+        self.client = client
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+
+    @staticmethod
+    def build_request(custom_id: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Build a single batch request entry.
+
+        Args:
+            custom_id (str): Identifier used to match the result back to the request.
+            params (Dict[str, Any]): The same keyword arguments that would be passed to messages.create.
+
+        Returns:
+            Dict[str, Any]: The request in the shape expected by messages.batches.create.
+        """
+        # Headers are sent once for the whole batch, not per request
+        params = {k: v for k, v in params.items() if k != "extra_headers"}
+        return {"custom_id": custom_id, "params": params}
+
+    def run(self, requests: List[Dict[str, Any]], extra_headers: Optional[Dict[str, str]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Submit the requests, wait for the batch to end and collect the results.
+
+        Args:
+            requests (List[Dict[str, Any]]): Requests built with build_request.
+            extra_headers (Optional[Dict[str, str]]): Extra headers sent with the batch submission.
+
+        Returns:
+            Dict[str, Dict[str, Any]]: Results keyed by custom_id. Successful entries hold the
+            "message"; failed ones hold "error" and "is_error": True.
+        """
+        results: Dict[str, Dict[str, Any]] = {}
+        for start in range(0, len(requests), MAX_BATCH_REQUESTS):
+            results.update(self._run_single_batch(requests[start:start + MAX_BATCH_REQUESTS], extra_headers))
+        return results
+
+    def _run_single_batch(self, requests: List[Dict[str, Any]], extra_headers: Optional[Dict[str, str]]) -> Dict[str, Dict[str, Any]]:
+        batch = self.client.messages.batches.create(requests=requests, extra_headers=extra_headers or {})
+        logger.info(f"Submitted message batch {batch.id} with {len(requests)} requests")
+
+        started = time.monotonic()
+        try:
+            while batch.processing_status != "ended":
+                if self.timeout is not None and time.monotonic() - started > self.timeout:
+                    logger.warning(f"Message batch {batch.id} did not finish within {self.timeout}s, cancelling")
+                    self.client.messages.batches.cancel(batch.id)
+                    return {
+                        request["custom_id"]: {"error": f"Batch {batch.id} timed out", "is_error": True}
+                        for request in requests
+                    }
+                time.sleep(self.poll_interval)
+                batch = self.client.messages.batches.retrieve(batch.id)
+        except KeyboardInterrupt:
+            # Don't leave an abandoned batch running (and billed) on the server
+            logger.warning(f"Interrupted while waiting on message batch {batch.id}, cancelling")
+            self.client.messages.batches.cancel(batch.id)
+            raise
+
+        logger.info(f"Message batch {batch.id} ended: {batch.request_counts}")
+
+        results: Dict[str, Dict[str, Any]] = {}
+        for entry in self.client.messages.batches.results(batch.id):
+            if entry.result.type == "succeeded":
+                results[entry.custom_id] = {"message": entry.result.message, "is_error": False}
+            elif entry.result.type == "errored":
+                results[entry.custom_id] = {"error": str(entry.result.error), "is_error": True}
+            else:
+                results[entry.custom_id] = {"error": f"Request {entry.result.type}", "is_error": True}
+
+        # Requests missing from the results file are reported rather than dropped
+        for request in requests:
+            results.setdefault(request["custom_id"], {"error": "No result returned", "is_error": True})
+        return results
+
+logger.info("batch_runner.py module loaded")
@@ -2,34 +2,49 @@
 import os
 import sys
 import textwrap
-import threading
-import itertools
+import contextlib
 import copy
+import functools
 import json
 import asyncio
 import logging
+import logging.handlers
+import atexit
+import queue
 import time
+import random
+import re
+import shlex
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
-import matplotlib.pyplot as plt
-from typing import Dict, List, Any, Union, Tuple, Optional
-from dataclasses import dataclass, field
+from typing import Dict, List, Any, Union, Tuple, Optional, Set, Iterator, BinaryIO
+from dataclasses import dataclass, field, fields, asdict
 
 # Third-party imports
 import anthropic
 import yaml
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
 from colorama import init, Fore, Style
 
 # Rich library imports
 from rich.console import Console, Group
 from rich.panel import Panel
-from rich.markdown import Markdown
-from rich.syntax import Syntax
 from rich.text import Text
-from rich.tree import Tree
 
 # New import for FilesContext
 from files_context import FilesContext
+from code_edit_tool import EDIT_CACHE_DIR
 from tools import execute_tool, TOOLS, FileReadError, _list_files, _read_file, read_files_in_folder, _create_file, _create_folder, project_structure, project_study
 from initial_review import InitialReview
 from wise_counsel import WiseCounsel
@@ -38,8 +53,26 @@ from wise_counsel import WiseCounsel
 EXIT_COMMAND = 'exit'
 LOG_DIR = Path("C-Logs")
 LOG_FILE = LOG_DIR / "codai.log"
+LOG_BUFFER_CAPACITY = 512  # Log records held in memory before writing to LOG_FILE
 CONFIG_FILE = "config.yaml"
 TOOL_CHOICE = {"type": "auto"}
+COMMAND_FLAGS = {'include-ignored', 'non-interactive'}  # Bare words recognised as flags by /project commands
+STRUCTURE_FRESHNESS_DEPTH = 2  # Directory levels checked when deciding if project_structure.json is stale
+# Directories that churn without the project layout changing, including Codai's own output folders
+STRUCTURE_FRESHNESS_SKIP_DIRS = {'.git', '__pycache__', 'node_modules', EDIT_CACHE_DIR, 'code_change_analysis', LOG_DIR.name}
+# Codai's own output files, written next to the project files (the progress file via a .tmp copy)
+STRUCTURE_FRESHNESS_ARTIFACTS = {
+    'project_structure.json', 'project_study.json',
+    'code_change_analysis_progress.json', 'code_change_analysis_progress.json.tmp'
+}
+STRUCTURE_PRINT_BATCH_LINES = 1000  # Structure listing lines buffered per write to stdout
+FOLDER_PREVIEW_CHARS = 500  # Characters of each file shown by /read folder
+STRUCTURE_JSON_ERRORS = (json.JSONDecodeError, ijson.JSONError) if ijson is not None else (json.JSONDecodeError,)
+DEFAULT_MAX_CONCURRENT_API_CALLS = 8  # Parallel calls above ~4-12 start hitting 429s
+API_RATE_LIMIT_RETRIES = 4
+API_BACKOFF_BASE_SECONDS = 1
+# Keys tools use for the file a result refers to, in the order they are preferred
+RESULT_FILE_KEYS = ('file_path', 'json_file_path', 'output_file', 'action_plan_file', 'progress_update_file', 'report_file', 'file')
 
 # Color constants
 COLOR_USER = Fore.MAGENTA
@@ -47,11 +80,13 @@ COLOR_ASSISTANT = Fore.GREEN
 COLOR_SYSTEM = Fore.YELLOW
 COLOR_ERROR = Fore.RED
 COLOR_TOOL = Fore.CYAN
+COLOR_RESET = Style.RESET_ALL
 
 # Constants
 REASONING_EMOJI = "🧠"
 RESPONSE_EMOJI = "💬"
 REASONING_TITLE = "Reasoning"
+REASONING_RE = re.compile(r'<reasoning>(.*?)</reasoning>', re.DOTALL)
 RESPONSE_TITLE = "Response"
 PANEL_TITLE = "🤖 CODAI Response"
 
@@ -61,6 +96,37 @@ init()
 # Initialize Rich console
 console = Console()
 
+def dumps_compact(obj: Any) -> str:
+    """
+    Serialise obj to compact JSON, using orjson when it is installed.
+
+    The stdlib fallback is configured to produce the same text as orjson, so
+    the system prompt (and therefore the prompt cache) is identical either way.
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj).decode('utf-8')
+        except TypeError:
+            # e.g. integers beyond 64 bits or non-string keys in a tool result
+            pass
+    return json.dumps(obj, ensure_ascii=False, separators=(',', ':'))
+
+def dumps_pretty(obj: Any) -> str:
+    """Serialise obj to JSON indented by two spaces for display, using orjson when it is installed."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode('utf-8')
+        except TypeError:
+            # e.g. integers beyond 64 bits, which the stdlib encoder still handles
+            pass
+    return json.dumps(obj, indent=2, ensure_ascii=False)
+
+def loads_json(data: Union[bytes, str]) -> Any:
+    """Parse JSON text or UTF-8 bytes, using orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
 # Exception classes
 class CodaiError(Exception):
     """Base exception class for Codai"""
@@ -79,30 +145,38 @@ def setup_logging() -> None:
     Set up logging configuration for the application.
     
     This function creates a log directory, clears the existing log file content,
-    and configures the root logger to write to the log file.
+    and configures the root logger to write to the log file. Logging calls
+    only enqueue the record; a listener thread buffers records in memory and
+    writes them in batches, so the event loop never waits on the disk. Errors
+    and interpreter exit force a flush.
     """
     LOG_DIR.mkdir(exist_ok=True)
     
-    # Clear the content of the existing log file if it exists
-    if LOG_FILE.exists():
-        with open(LOG_FILE, 'w') as log_file:
-            pass  # Opening the file in write mode and immediately closing it clears the content
-    
-    handler = logging.FileHandler(LOG_FILE, mode='a', encoding='utf-8')  # Changed mode to 'a' for append
+    file_handler = logging.FileHandler(LOG_FILE, mode='w', encoding='utf-8')  # 'w' clears the previous session's log
     formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-    handler.setFormatter(formatter)
+    file_handler.setFormatter(formatter)
+    buffered_handler = logging.handlers.MemoryHandler(capacity=LOG_BUFFER_CAPACITY, flushLevel=logging.ERROR, target=file_handler)
+
+    log_queue = queue.SimpleQueue()
+    handler = logging.handlers.QueueHandler(log_queue)
+    # The file handler applies the real format; without this basicConfig would
+    # give the queue handler its default format and records would be formatted twice
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    listener = logging.handlers.QueueListener(log_queue, buffered_handler)
+    listener.start()
+
+    def shutdown_logging() -> None:
+        listener.stop()  # Drains the queue before returning
+        buffered_handler.flush()
+
+    atexit.register(shutdown_logging)
     
-    logger = logging.getLogger()
-    logger.setLevel(logging.DEBUG)
-    logger.addHandler(handler)
-    
-    # Remove any existing handlers (e.g., StreamHandler to console)
-    for h in logger.handlers[:]:
-        if not isinstance(h, logging.FileHandler):
-            logger.removeHandler(h)
+    # force=True replaces handlers installed by imported modules (e.g. the
+    # console StreamHandler from code_edit_tool's basicConfig)
+    logging.basicConfig(level=logging.DEBUG, handlers=[handler], force=True)
     
     # Log the start of a new session
-    logger.info(f"New Codai session started at {datetime.now()}")
+    logging.getLogger().info(f"New Codai session started at {datetime.now()}")
 
 # Call setup_logging at the start of the script
 setup_logging()
@@ -110,7 +184,7 @@ setup_logging()
 # Get logger for this module
 logger = logging.getLogger(__name__)
 
-@dataclass
+@dataclass(slots=True)
 class Config:
     """Configuration class for the Codai application."""
     api_key: str
@@ -119,6 +193,8 @@ class Config:
     max_tokens: int = 8192  # Default value, adjust as needed
     interactive_mode: bool = True  # New attribute with a default value
     exclude_dirs: List[str] = field(default_factory=list)  # New attribute for excluded directories
+    max_concurrent_api_calls: int = DEFAULT_MAX_CONCURRENT_API_CALLS  # Cap on in-flight Claude requests
+    history_cap: Optional[int] = None  # Messages kept in the conversation; None keeps everything
 
     @classmethod
     def load(cls, config_path: str = CONFIG_FILE) -> 'Config':
@@ -152,12 +228,18 @@ class Config:
             if 'exclude_dirs' not in config_data:
                 config_data['exclude_dirs'] = []  # Default to an empty list if not specified
             
+            if 'max_concurrent_api_calls' not in config_data:
+                config_data['max_concurrent_api_calls'] = DEFAULT_MAX_CONCURRENT_API_CALLS
+            
+            if 'history_cap' not in config_data:
+                config_data['history_cap'] = None  # Unbounded history by default
+            
             return cls(**config_data)
         except Exception as e:
             logger.error(f"Error loading configuration: {e}")
             raise ConfigurationError(f"Failed to load configuration: {e}") from e
 
-@dataclass
+@dataclass(slots=True)
 class SystemMessage:
     base_prompt: str = """Your name is CODAI, an advanced AI system dedicated to evolving the art and science of coding. As CODAI, you are an X10 AI high-grade developer and software engineer, with exceptional expertise in analysing, optimising, and revolutionising complex software projects. Your mission is to push the boundaries of software development, introducing innovative approaches and cutting-edge methodologies.
 
@@ -233,7 +315,34 @@ Follow these guidelines to ensure your responses meet the highest standards of t
 25. Tool Use Approval: NEVER execute a tool without explicitly asking for and receiving user approval first. Always explain why you need to use the tool and wait for the user's confirmation before proceeding.
 
 Remember, as CODAI, your role goes beyond being an X10 AI high-grade developer. You are at the forefront of evolving coding practices. Your analysis should be comprehensive, insightful, and reflect the highest standards of software engineering while also introducing revolutionary ideas and approaches. Thorough verification, explicit expression of uncertainty, and a focus on code quality, performance, and security are crucial for maintaining the excellence expected at this level of expertise. Always communicate these insights in Australian English, and strive to elevate the art of coding with each interaction."""
+    # The base prompt never changes, so its JSON encoding is computed once
+    _base_block: Dict[str, str] = field(init=False, repr=False, compare=False)
+    _base_block_json: str = field(init=False, repr=False, compare=False)
+    _base_json: str = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self._base_block = {"type": "text", "text": self.base_prompt}
+        self._base_block_json = dumps_compact(self._base_block)
+        self._base_json = "[" + self._base_block_json + "]"
+
+    def _dumps_with_base(self, block: Dict[str, str]) -> str:
+        """Equivalent to dumps_compact([self._base_block, block]) without re-encoding the base prompt."""
+        return "[" + self._base_block_json + "," + dumps_compact(block) + "]"
+
+    @staticmethod
+    def _format_files(header: str, files: List[Tuple[str, str]]) -> str:
+        """
+        Build the "File: ...\nContent: ..." listing for a group of files.
 
+        The pieces are joined once, so file contents are copied a single time
+        instead of once into a per-file string and again into the result.
+        """
+        parts = [header]
+        for path, content in files:
+            parts += ("File: ", path, "\nContent: ", content, "\n")
+        if files:
+            parts.pop()  # No newline after the last file
+        return "".join(parts)
 
     def get_message_for_api(self, files_context: FilesContext) -> List[Dict[str, Any]]:
         """
@@ -245,43 +354,46 @@ Remember, as CODAI, your role goes beyond being an X10 AI high-grade developer.
         Returns:
             List[Dict[str, Any]]: Formatted system message with file context and cache control.
         """
-        message = [{"type": "text", "text": self.base_prompt}]
         existing_files, new_modified_files = files_context.split_files_for_api_context()
 
         if not existing_files and not new_modified_files:
             # If both are empty, add a cache control message
             return [{
                 "type": "text",
-                "text": json.dumps(message),
+                "text": self._base_json,
                 "cache_control": {"type": "ephemeral"}
             }]
         else:
+            message = None
             if existing_files:
-                existing_files_content = "Existing files:\n" + "\n".join(f"File: {path}\nContent: {content}" for path, content in existing_files)
-                message.append({
-                    "type": "text", 
-                    "text": existing_files_content
-                })
+                existing_files_content = self._format_files("Existing files:\n", existing_files)
                 message = [{
                     "type": "text",
-                    "text": json.dumps(message),
+                    "text": self._dumps_with_base({
+                        "type": "text", 
+                        "text": existing_files_content
+                    }),
                     "cache_control": {"type": "ephemeral"}
                 }]
             if new_modified_files:
-                new_modified_files_content = "New or modified files:\n" + "\n".join(f"File: {path}\nContent: {content}" for path, content in new_modified_files)
-                message.append({
+                new_modified_files_content = self._format_files("New or modified files:\n", new_modified_files)
+                new_block = {
                     "type": "text", 
                     "text": new_modified_files_content
-                })
+                }
+                if message is None:
+                    text = self._dumps_with_base(new_block)
+                else:
+                    text = dumps_compact(message + [new_block])
                 return [{
                     "type": "text",
-                    "text": json.dumps(message),
+                    "text": text,
                     "cache_control": {"type": "ephemeral"}
                 }]
             else:
                 return message
        
-@dataclass
+@dataclass(slots=True)
 class CacheMetrics:
     total_requests: int = 0
     total_input_tokens: int = 0
@@ -295,20 +407,29 @@ class CacheMetrics:
     current_cache_read_tokens: int = 0
     current_cache_creation_tokens: int = 0
     current_time: float = 0
+    request_times: List[float] = field(default_factory=list)
 
     def update(self, response: anthropic.types.Message, elapsed_time: float) -> None:
+        usage = response.usage
+        input_tokens = usage.input_tokens
+        output_tokens = usage.output_tokens
+        # The SDK reports None rather than 0 when caching was not involved
+        cache_read_tokens = getattr(usage, 'cache_read_input_tokens', 0) or 0
+        cache_creation_tokens = getattr(usage, 'cache_creation_input_tokens', 0) or 0
+
         self.total_requests += 1
-        self.total_input_tokens += response.usage.input_tokens
-        self.total_output_tokens += response.usage.output_tokens
-        self.total_cache_read_tokens += getattr(response.usage, 'cache_read_input_tokens', 0)
-        self.total_cache_creation_tokens += getattr(response.usage, 'cache_creation_input_tokens', 0)
+        self.total_input_tokens += input_tokens
+        self.total_output_tokens += output_tokens
+        self.total_cache_read_tokens += cache_read_tokens
+        self.total_cache_creation_tokens += cache_creation_tokens
         self.total_time += elapsed_time
+        self.request_times.append(elapsed_time)
         
         # Update current interaction metrics
-        self.current_input_tokens = response.usage.input_tokens
-        self.current_output_tokens = response.usage.output_tokens
-        self.current_cache_read_tokens = getattr(response.usage, 'cache_read_input_tokens', 0)
-        self.current_cache_creation_tokens = getattr(response.usage, 'cache_creation_input_tokens', 0)
+        self.current_input_tokens = input_tokens
+        self.current_output_tokens = output_tokens
+        self.current_cache_read_tokens = cache_read_tokens
+        self.current_cache_creation_tokens = cache_creation_tokens
         self.current_time = elapsed_time
 
     def generate_report(self) -> str:
@@ -348,13 +469,66 @@ class CacheMetrics:
         Avg Response Time: {self.total_time / self.total_requests:.2f} seconds
         """
 
-@dataclass
+def _starts_turn(content: Any) -> bool:
+    """Whether a user message's content starts a new turn rather than returning tool results."""
+    return not (isinstance(content, list) and any(
+        isinstance(block, dict) and block.get("type") == "tool_result" for block in content
+    ))
+
+@dataclass(slots=True)
 class Conversation:
     """Represents a conversation with the AI assistant."""
     system_message: SystemMessage = field(default_factory=SystemMessage)
     messages: List[Dict[str, Any]] = field(default_factory=list)
     cache_metrics: CacheMetrics = field(default_factory=CacheMetrics)
     files_context: FilesContext = field(default_factory=FilesContext)
+    # Shared by every API call made for this conversation, including the copies
+    # used while reviewing a response (see generate_response)
+    api_semaphore: asyncio.Semaphore = field(
+        default_factory=lambda: asyncio.Semaphore(DEFAULT_MAX_CONCURRENT_API_CALLS), repr=False, compare=False
+    )
+    # Runs blocking file writes off the event loop
+    io_pool: ThreadPoolExecutor = field(
+        default_factory=lambda: ThreadPoolExecutor(max_workers=2, thread_name_prefix="codai-io"), repr=False, compare=False
+    )
+    # Soft limit on len(messages); the oldest whole turns are dropped when a new one starts
+    history_cap: Optional[int] = None
+    # Config.exclude_dirs, skipped when checking whether project_structure.json is stale
+    exclude_dirs: List[str] = field(default_factory=list)
+    # Positions of user messages, kept up to date by add_message
+    _user_indices: List[int] = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self._user_indices = [i for i, msg in enumerate(self.messages) if msg["role"] == "user"]
+
+    def __deepcopy__(self, memo: Dict[int, Any]) -> 'Conversation':
+        # The semaphore and I/O pool are session-wide, so copies share them
+        memo[id(self.api_semaphore)] = self.api_semaphore
+        memo[id(self.io_pool)] = self.io_pool
+        copied = copy.copy(self)
+        memo[id(self)] = copied
+        for f in fields(self):
+            setattr(copied, f.name, copy.deepcopy(getattr(self, f.name), memo))
+        return copied
+
+    def fork_for_review(self) -> 'Conversation':
+        """
+        Make a working copy for the review loop in generate_response.
+
+        The review loop only ever edits the last message (to append reviewer
+        feedback), so that message is deep-copied and every other message is
+        shared. The system message, file context, metrics and session
+        resources are shared as well, since the loop does not modify them.
+
+        Returns:
+            Conversation: A copy whose message list can be edited without touching this one.
+        """
+        fork = copy.copy(self)
+        fork.messages = self.messages[:]
+        if fork.messages:
+            fork.messages[-1] = copy.deepcopy(fork.messages[-1])
+        fork._user_indices = self._user_indices[:]
+        return fork
 
     def add_message(self, role: str, content: Any) -> None:
         """
@@ -364,36 +538,72 @@ class Conversation:
             role (str): The role of the message sender (e.g., "user", "assistant").
             content (Any): The content of the message.
         """
+        if role == "user":
+            if self.history_cap is not None and _starts_turn(content):
+                self._trim_history()
+            self._user_indices.append(len(self.messages))
         self.messages.append({"role": role, "content": content})
 
+    def _trim_history(self) -> None:
+        """
+        Drop the oldest turns so the turn about to be added fits in history_cap.
+
+        History is only cut right before a user message that starts a turn, so
+        the kept messages still begin with a user message and no tool_result is
+        separated from its tool_use. A single turn longer than the cap is kept whole.
+        """
+        excess = len(self.messages) + 1 - self.history_cap
+        if excess <= 0:
+            return
+        cut = next(
+            (i for i in self._user_indices if i >= excess and _starts_turn(self.messages[i]["content"])),
+            len(self.messages)
+        )
+        del self.messages[:cut]
+        self._user_indices = [i - cut for i in self._user_indices if i >= cut]
+        logger.info(f"Dropped {cut} old messages to keep the history within {self.history_cap}")
+
+    def last_user_message(self) -> Optional[Dict[str, Any]]:
+        """
+        Get the most recent user message without scanning the history.
+
+        Returns:
+            Optional[Dict[str, Any]]: The last user message, or None if there is none.
+        """
+        return self.messages[self._user_indices[-1]] if self._user_indices else None
+
     def get_messages_for_api(self) -> List[Dict[str, Any]]:
         """
         Get the conversation messages formatted for the API.
+
+        Only the last two user messages are rebuilt (to carry cache_control);
+        every other entry is shared with self.messages, so callers must not
+        mutate the result.
         
         Returns:
             List[Dict[str, Any]]: Formatted conversation messages.
         """
-        formatted_messages = copy.deepcopy(self.messages)
-        user_messages = [msg for msg in formatted_messages if msg["role"] == "user"]
-        last_two_user_indices = [formatted_messages.index(msg) for msg in user_messages[-2:]]
+        formatted_messages = list(self.messages)
 
-        for i in last_two_user_indices:
+        for i in self._user_indices[-2:]:
             msg = formatted_messages[i]
-            if isinstance(msg["content"], list) and msg["content"]:
-                if isinstance(msg["content"][0], dict):
-                    msg["content"][0]["cache_control"] = {"type": "ephemeral"}
+            content = msg["content"]
+            if isinstance(content, list) and content:
+                if isinstance(content[0], dict):
+                    first_block = {**content[0], "cache_control": {"type": "ephemeral"}}
                 else:
-                    msg["content"][0] = {
+                    first_block = {
                         "type": "text",
-                        "text": str(msg["content"][0]),
+                        "text": str(content[0]),
                         "cache_control": {"type": "ephemeral"}
                     }
-            elif isinstance(msg["content"], (str, dict)):
-                msg["content"] = [{
+                formatted_messages[i] = {**msg, "content": [first_block] + content[1:]}
+            elif isinstance(content, (str, dict)):
+                formatted_messages[i] = {**msg, "content": [{
                     "type": "text",
-                    "text": str(msg["content"]),
+                    "text": str(content),
                     "cache_control": {"type": "ephemeral"}
-                }]
+                }]}
 
         return formatted_messages
 
@@ -434,7 +644,7 @@ Tips:
 
 Let's get started! How can I assist you with your project today?
 """
-    print(COLOR_ASSISTANT + welcome_text + Style.RESET_ALL)
+    print(COLOR_ASSISTANT + welcome_text + COLOR_RESET)
 
 def print_help_message():
     help_text = """
@@ -463,10 +673,10 @@ You can also use these commands without the '/' prefix.
 
 For any other input, CODAI will interpret it as a question or task related to your project.
 """
-    print(COLOR_SYSTEM + help_text + Style.RESET_ALL)
+    print(COLOR_SYSTEM + help_text + COLOR_RESET)
 
 def get_user_input() -> str:
-    print(COLOR_USER + "\nYou:" + Style.RESET_ALL, end=" ")
+    print(COLOR_USER + "\nYou:" + COLOR_RESET, end=" ")
     return input()
 
 def print_error_message(error: str) -> None:
@@ -475,8 +685,8 @@ def print_error_message(error: str) -> None:
 ║ {error} ║
 ╚{'═' * (len(error) + 2)}╝
 """
-    print(COLOR_ERROR + error_box + Style.RESET_ALL)
-    print(COLOR_SYSTEM + "Please try again or type 'help' for available commands." + Style.RESET_ALL)
+    print(COLOR_ERROR + error_box + COLOR_RESET)
+    print(COLOR_SYSTEM + "Please try again or type 'help' for available commands." + COLOR_RESET)
 
 def check_console_encoding():
     if sys.stdout.encoding.lower() != 'utf-8':
@@ -490,43 +700,302 @@ def handle_api_error(e: Exception) -> None:
     print_error_message(error_message)
     logger.error(f"API Error: {error_message}", exc_info=True)
 
-spinner_active = False
-spinner_thread = None
+SPINNER_FRAMES = ['⠋', '⠙', '⠹', '⠸', '⠼', '⠴', '⠦', '⠧', '⠇', '⠏']
+# Everything up to the elapsed time is fixed per mode, so those strings are built once
+SPINNER_FRAME_TEXT = {
+    mode: [COLOR_SYSTEM + f'\rCODAI is {mode_text} {frame} ' for frame in SPINNER_FRAMES]
+    for mode, mode_text in (("thinking", "thinking"), ("review", "reviewing"))
+}
+CLEAR_LINE = '\r\x1b[2K'  # Return to column 0 and erase the whole line
+CLEAR_SCREEN = '\x1b[2J\x1b[H'  # Erase the screen and move the cursor home
+
+def clear_screen() -> None:
+    # colorama.init() translates the escape codes on older Windows consoles
+    sys.stdout.write(CLEAR_SCREEN)
+    sys.stdout.flush()
+
+spinner_task: Optional[asyncio.Task] = None
 spinner_mode = "thinking"  # New variable to track the current mode
 
-def thinking_spinner():
-    global spinner_active, spinner_mode
-    spinner = itertools.cycle(['⠋', '⠙', '⠹', '⠸', '⠼', '⠴', '⠦', '⠧', '⠇', '⠏'])
-    start_time = time.time()
-    while spinner_active:
-        elapsed_time = int(time.time() - start_time)
-        mode_text = "reviewing" if spinner_mode == "review" else "thinking"
-        sys.stdout.write(COLOR_SYSTEM + f'\rCODAI is {mode_text} {next(spinner)} ({elapsed_time}s)' + Style.RESET_ALL)
+async def thinking_spinner():
+    # Redraws on the event loop, so it only ticks while the loop is free
+    start_time = time.monotonic()
+    tick = 0
+    last_elapsed = -1
+    elapsed_text = ''
+    try:
+        while True:
+            elapsed_time = int(time.monotonic() - start_time)
+            if elapsed_time != last_elapsed:
+                last_elapsed = elapsed_time
+                elapsed_text = f'({elapsed_time}s)' + COLOR_RESET
+            frames = SPINNER_FRAME_TEXT.get(spinner_mode, SPINNER_FRAME_TEXT["thinking"])
+            sys.stdout.write(frames[tick % len(frames)] + elapsed_text)
+            sys.stdout.flush()
+            tick += 1
+            await asyncio.sleep(0.1)
+    finally:
+        sys.stdout.write(CLEAR_LINE)
         sys.stdout.flush()
-        time.sleep(0.1)
-    sys.stdout.write('\r' + ' ' * 50 + '\r')
-    sys.stdout.flush()
 
 def start_thinking_spinner(mode="thinking"):
-    global spinner_active, spinner_thread, spinner_mode
+    global spinner_task, spinner_mode
     spinner_mode = mode
-    if not spinner_active:
-        spinner_active = True
-        spinner_thread = threading.Thread(target=thinking_spinner, daemon=True)
-        spinner_thread.start()
-
-def stop_thinking_spinner():
-    global spinner_active, spinner_thread
-    if spinner_active:
-        spinner_active = False
-        if spinner_thread:
-            spinner_thread.join(timeout=1)
-        spinner_thread = None
-
-def handle_command(command: str, conversation: Conversation) -> str:
+    if spinner_task is None:
+        spinner_task = asyncio.create_task(thinking_spinner())
+
+async def stop_thinking_spinner():
+    global spinner_task
+    if spinner_task is not None:
+        task, spinner_task = spinner_task, None
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+
+def _split_subcommand(args: str) -> Tuple[str, str]:
+    """Split "<word> <rest>" into the lowercased word and the untouched rest."""
+    head, _, rest = args.partition(' ')
+    return head.lower(), rest.strip()
+
+async def _cmd_exit(args: str, conversation: Conversation) -> str:
+    print(COLOR_SYSTEM + "Thank you for using CODAI. Goodbye!" + COLOR_RESET)
+    return "exit"
+
+async def _cmd_help(args: str, conversation: Conversation) -> str:
+    print_help_message()
+    return "continue"
+
+async def _cmd_clear(args: str, conversation: Conversation) -> str:
+    clear_screen()
+    print_welcome_message()
+    return "continue"
+
+async def _cmd_context(args: str, conversation: Conversation) -> str:
+    if args.lower() == 'files':
+        file_list = conversation.files_context.list_files_in_context()
+        console.print(Panel(file_list, title="Files in Context", border_style="cyan"))
+    return "continue"
+
+async def _cmd_list(args: str, conversation: Conversation) -> str:
+    subcommand, rest = _split_subcommand(args)
+    if subcommand == 'files':
+        path = rest or '.'
+        result = _list_files({"path": path})
+        print_file_list(result, path)
+    return "continue"
+
+async def _cmd_read(args: str, conversation: Conversation) -> str:
+    subcommand, rest = _split_subcommand(args)
+    if subcommand == 'folder':
+        parts = rest.split()
+        folder_path = parts[0] if parts else '.'
+        include_subfolders = 'subfolders' in (part.lower() for part in parts)
+        # One character past the preview is enough to know whether to print "..."
+        result = read_files_in_folder({
+            "folder_path": folder_path,
+            "include_subfolders": include_subfolders,
+            "preview_chars": FOLDER_PREVIEW_CHARS + 1
+        })
+        print_files_in_folder_contents(result, folder_path, include_subfolders)
+    elif not args:
+        print_error_message("Please specify a file to read.")
+    else:
+        result = _read_file({"file_path": args})
+        print_file_content(result, args)
+    return "continue"
+
+async def _create_file_command(args: str, conversation: Conversation) -> None:
+    parts = args.split(' ', 1)
+    if len(parts) != 2:
+        print_error_message("Please specify a file path and content. Usage: create file <path> <content>")
+        return
+    file_path, content = parts
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(conversation.io_pool, _create_file, {"file_path": file_path, "content": content})
+    print_file_creation_result(result)
+
+async def _create_folder_command(args: str, conversation: Conversation) -> None:
+    if not args:
+        print_error_message("Please specify a folder path to create.")
+        return
+    result = _create_folder({"folder_path": args})
+    print_folder_creation_result(result)
+
+async def _cmd_create(args: str, conversation: Conversation) -> str:
+    subcommand, rest = _split_subcommand(args)
+    handler = CREATE_SUBCOMMANDS.get(subcommand)
+    if handler:
+        await handler(rest, conversation)
+    return "continue"
+
+async def _cmd_project(args: str, conversation: Conversation) -> str:
+    subcommand, rest = _split_subcommand(args)
+    handler = PROJECT_SUBCOMMANDS.get(subcommand)
+    if handler:
+        handler(rest, conversation)
+    return "continue"
+
+def _parse_command_options(args: str) -> Tuple[Dict[str, str], Set[str], List[str]]:
+    """
+    Split command arguments into key=value options, bare flags and positional values.
+
+    Quoting is honoured, so paths containing spaces can be passed as "my dir".
+    Option names and a fixed set of known flags are matched case-insensitively;
+    values and positionals keep their case.
+
+    Args:
+        args (str): The argument string following the command words.
+
+    Returns:
+        Tuple[Dict[str, str], Set[str], List[str]]: The options, the flags and the positional values.
+    """
+    try:
+        # POSIX rules would treat backslashes in Windows paths as escapes
+        tokens = shlex.split(args, posix=os.name != 'nt')
+    except ValueError:  # Unbalanced quotes
+        tokens = args.split()
+
+    options: Dict[str, str] = {}
+    flags: Set[str] = set()
+    positionals: List[str] = []
+    for token in tokens:
+        key, sep, value = token.partition('=')
+        if sep:
+            options[key.lower()] = value
+        elif token.lower() in COMMAND_FLAGS:
+            flags.add(token.lower())
+        else:
+            positionals.append(token)
+    return options, flags, positionals
+
+def _project_structure_command(args: str, conversation: Conversation) -> None:
+    options, flags, positionals = _parse_command_options(args)
+    folder_path = positionals[-1] if positionals else '.'
+    output_path = options.get('output', "")
+    include_ignored = 'include-ignored' in flags
+    interactive = 'non-interactive' not in flags  # Default to True as per the tool definition
+    exclude_dirs = options['exclude'].split(',') if 'exclude' in options else []
+    
+    result = project_structure({
+        "folder_path": folder_path,
+        "include_ignored": include_ignored,
+        "output_path": output_path,
+        "interactive": interactive,
+        "exclude_dirs": exclude_dirs
+    })
+    print_project_structure(result, folder_path, include_ignored, interactive, exclude_dirs)
+
+def _is_structure_fresh(folder_path: str, structure_mtime: int, exclude_dirs: Optional[List[str]] = None,
+                        artifact_names: Optional[Set[str]] = None, max_depth: int = STRUCTURE_FRESHNESS_DEPTH) -> bool:
+    """
+    Check whether any directory near the top of the project changed after the structure file was written.
+
+    Adding, removing or renaming an entry bumps its parent directory's mtime,
+    so comparing directory mtimes (breadth-first, up to max_depth levels down)
+    detects structural changes without re-reading the tree. Excluded
+    directories are not descended into, and a directory whose only new
+    entries are excluded directories or Codai's own output files (such as
+    the project study written after the structure) still counts as fresh.
+
+    Args:
+        folder_path (str): The project folder the structure file describes.
+        structure_mtime (int): st_mtime_ns of the project_structure.json file.
+        exclude_dirs (Optional[List[str]]): Configured directories to skip, by name or by path relative to folder_path.
+        artifact_names (Optional[Set[str]]): Extra output file names to ignore, on top of STRUCTURE_FRESHNESS_ARTIFACTS.
+        max_depth (int): How many directory levels below folder_path to check.
+
+    Returns:
+        bool: True if no checked directory changed after the structure file, other than through ignored entries.
+    """
+    exclude_dirs = exclude_dirs or []
+    ignored_names = STRUCTURE_FRESHNESS_SKIP_DIRS | STRUCTURE_FRESHNESS_ARTIFACTS | (artifact_names or set())
+    ignored_names.update(d for d in exclude_dirs if '/' not in d and os.sep not in d)
+    ignored_paths = {os.path.normpath(d) for d in exclude_dirs if '/' in d or os.sep in d}
+
+    pending = deque([(folder_path, 0)])
+    while pending:
+        dir_path, depth = pending.popleft()
+        try:
+            changed = os.stat(dir_path).st_mtime_ns > structure_mtime
+            if not changed and depth >= max_depth:
+                continue
+            ignored_change = other_change = False
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    ignored = entry.name in ignored_names or (
+                        is_dir and bool(ignored_paths) and os.path.relpath(entry.path, folder_path) in ignored_paths
+                    )
+                    if is_dir and not ignored and depth < max_depth:
+                        pending.append((entry.path, depth + 1))
+                    # Only entries touched after the structure file can explain the directory change;
+                    # a kept subdirectory's ctime moves with its own contents, so it proves nothing here
+                    if changed and (ignored or not is_dir) and entry.stat(follow_symlinks=False).st_ctime_ns > structure_mtime:
+                        if ignored:
+                            ignored_change = True
+                        else:
+                            other_change = True
+            # A change with no ignored entry to account for it may be a removal, so it counts as stale
+            if changed and (other_change or not ignored_change):
+                return False
+        except OSError:
+            continue
+    return True
+
+def _project_study_command(args: str, conversation: Conversation) -> None:
+    options, flags, positionals = _parse_command_options(args)
+    folder_path = positionals[-1] if positionals else '.'
+    output_file = options.get('output', "project_study.json")
+    include_ignored = 'include-ignored' in flags
+    
+    print(COLOR_SYSTEM + "Note: Project study requires a project structure file. If not found, you'll be prompted to create or provide one." + COLOR_RESET)
+    
+    # Add check for project_structure file
+    project_structure_file = os.path.join(folder_path, "project_structure.json")
+    try:
+        structure_mtime = os.stat(project_structure_file).st_mtime_ns
+    except FileNotFoundError:
+        print(COLOR_SYSTEM + "Project structure file not found. Please run 'project structure' command first." + COLOR_RESET)
+        return
+    if not _is_structure_fresh(folder_path, structure_mtime, conversation.exclude_dirs, {os.path.basename(output_file)}):
+        print(COLOR_SYSTEM + "Project structure file may be outdated. Consider running 'project structure' command again." + COLOR_RESET)
+    
+    result = project_study({
+        "folder_path": folder_path,
+        "output_file": output_file,
+        "include_ignored": include_ignored
+    })
+    print_project_study_result(result)
+
+# Second-word tables for the commands that take a subcommand
+CREATE_SUBCOMMANDS = {
+    'file': _create_file_command,
+    'folder': _create_folder_command,
+}
+PROJECT_SUBCOMMANDS = {
+    'structure': _project_structure_command,
+    'study': _project_study_command,
+}
+
+# Commands are dispatched on their first word; each handler parses the rest
+COMMAND_HANDLERS = {
+    'exit': _cmd_exit,
+    'help': _cmd_help,
+    'clear': _cmd_clear,
+    'context': _cmd_context,
+    'list': _cmd_list,
+    'read': _cmd_read,
+    'create': _cmd_create,
+    'project': _cmd_project,
+}
+
+async def handle_command(command: str, conversation: Conversation) -> str:
     """
     Process user commands.
 
+    Only the command words are case-insensitive; file paths and content
+    are passed through as typed.
+
     Args:
         command (str): The user's command.
         conversation (Conversation): The current conversation object.
@@ -534,115 +1003,15 @@ def handle_command(command: str, conversation: Conversation) -> str:
     Returns:
         str: "exit" to end the conversation, "continue" otherwise.
     """
-    command = command.strip().lower()
+    command = command.strip()
     if command.startswith('/'):
         command = command[1:]  # Remove the leading '/'
     
-    if command == 'exit':
-        print(COLOR_SYSTEM + "Thank you for using CODAI. Goodbye!" + Style.RESET_ALL)
-        return "exit"
-    elif command == 'help':
-        print_help_message()
-    elif command == 'clear':
-        os.system('cls' if os.name == 'nt' else 'clear')
-        print_welcome_message()
-    elif command == 'context files':
-        file_list = conversation.files_context.list_files_in_context()
-        console.print(Panel(file_list, title="Files in Context", border_style="cyan"))    
-    elif command.startswith('list files'):
-        path = command[10:].strip() or '.'
-        result = _list_files({"path": path})
-        print_file_list(result, path)
-    elif command.startswith('read folder'):
-        parts = command[11:].strip().split()
-        folder_path = parts[0] if parts else '.'
-        include_subfolders = 'subfolders' in parts
-        result = read_files_in_folder({"folder_path": folder_path, "include_subfolders": include_subfolders})
-        print_files_in_folder_contents(result, folder_path, include_subfolders)
-    elif command.startswith('read'):
-        file_path = command[4:].strip()
-        if not file_path:
-            print_error_message("Please specify a file to read.")
-        else:
-            result = _read_file({"file_path": file_path})
-            print_file_content(result, file_path)
-    elif command.startswith('create file'):
-        parts = command[11:].strip().split(' ', 1)
-        if len(parts) != 2:
-            print_error_message("Please specify a file path and content. Usage: create file <path> <content>")
-        else:
-            file_path, content = parts
-            result = _create_file({"file_path": file_path, "content": content})
-            print_file_creation_result(result)
-    elif command.startswith('create folder'):
-        folder_path = command[13:].strip()
-        if not folder_path:
-            print_error_message("Please specify a folder path to create.")
-        else:
-            result = _create_folder({"folder_path": folder_path})
-            print_folder_creation_result(result)
-    elif command.startswith('project structure'):
-        parts = command[17:].strip().split()
-        folder_path = '.'
-        output_path = ""
-        include_ignored = False
-        interactive = True  # Default to True as per the tool definition
-        exclude_dirs = []
-        
-        i = 0
-        while i < len(parts):
-            if parts[i] == 'include-ignored':
-                include_ignored = True
-            elif parts[i].startswith('output='):
-                output_path = parts[i].split('=')[1]
-            elif parts[i] == 'non-interactive':
-                interactive = False
-            elif parts[i].startswith('exclude='):
-                exclude_dirs = parts[i].split('=')[1].split(',')
-            else:
-                folder_path = parts[i]
-            i += 1
-        
-        result = project_structure({
-            "folder_path": folder_path,
-            "include_ignored": include_ignored,
-            "output_path": output_path,
-            "interactive": interactive,
-            "exclude_dirs": exclude_dirs
-        })
-        print_project_structure(result, folder_path, include_ignored, interactive, exclude_dirs)
-    elif command.startswith('project study'):
-        parts = command[13:].strip().split()
-        folder_path = '.'
-        output_file = "project_study.json"
-        include_ignored = False
-        
-        for part in parts:
-            if part.startswith('output='):
-                output_file = part.split('=')[1]
-            elif part == 'include-ignored':
-                include_ignored = True
-            else:
-                folder_path = part
-        
-        print(COLOR_SYSTEM + "Note: Project study requires a project structure file. If not found, you'll be prompted to create or provide one." + Style.RESET_ALL)
-        
-        # Add check for project_structure file
-        project_structure_file = os.path.join(folder_path, "project_structure.json")
-        if not os.path.exists(project_structure_file):
-            print(COLOR_SYSTEM + "Project structure file not found. Please run 'project structure' command first." + Style.RESET_ALL)
-            return "continue"
-        elif (time.time() - os.path.getmtime(project_structure_file)) > 3600:  # 1 hour
-            print(COLOR_SYSTEM + "Project structure file may be outdated. Consider running 'project structure' command again." + Style.RESET_ALL)
-        
-        result = project_study({
-            "folder_path": folder_path,
-            "output_file": output_file,
-            "include_ignored": include_ignored
-        })
-        print_project_study_result(result)
-    
-    return "continue"
+    name, args = _split_subcommand(command)
+    handler = COMMAND_HANDLERS.get(name)
+    if handler is None:
+        return "continue"
+    return await handler(args, conversation)
 
 def print_project_study_result(result: Dict[str, Any]) -> None:
     if result.get("status") == "success":
@@ -688,61 +1057,121 @@ def print_project_study_result(result: Dict[str, Any]) -> None:
             border_style="blue"
         ))
 
+def _structure_icons() -> Tuple[str, str]:
+    """Directory and file markers for the structure listing, falling back to ASCII when stdout cannot encode emoji."""
+    try:
+        '📁📄'.encode(getattr(sys.stdout, 'encoding', None) or 'utf-8')
+        return '📁', '📄'
+    except (UnicodeEncodeError, LookupError):
+        return '[D]', '[F]'
+
+def _iter_structure_entries(json_file: BinaryIO) -> Iterator[Tuple[int, bool, str]]:
+    """
+    Yield the nodes of a project_structure.json file in display order.
+
+    With ijson installed the file is parsed incrementally, so memory grows with
+    the depth of the tree rather than its size. Otherwise the whole document is
+    loaded and walked.
+
+    Args:
+        json_file (BinaryIO): The structure file, opened in binary mode.
+
+    Returns:
+        Iterator[Tuple[int, bool, str]]: (depth, is_directory, name) for each node.
+    """
+    if ijson is None:
+        # Iterative so deep trees cannot hit the recursion limit
+        stack = [(loads_json(json_file.read()), 0)]
+        while stack:
+            node, depth = stack.pop()
+            is_dir = node['type'] == 'directory'
+            yield depth, is_dir, node['name']
+            if is_dir:
+                stack.extend((child, depth + 1) for child in reversed(node.get('children', [])))
+        return
+
+    # One entry per open JSON object: None for objects that are not tree nodes
+    # (e.g. the summary), otherwise [name_prefix, type_prefix, name, type]
+    open_maps: List[Optional[list]] = []
+    depth = 0
+    for prefix, event, value in ijson.parse(json_file):
+        if event == 'start_map':
+            if prefix == '':
+                open_maps.append(['name', 'type', None, None])
+            elif prefix.endswith('children.item'):
+                open_maps.append([prefix + '.name', prefix + '.type', None, None])
+            else:
+                open_maps.append(None)
+                continue
+            depth += 1
+        elif event == 'end_map':
+            if open_maps.pop() is not None:
+                depth -= 1
+        elif event == 'string' and open_maps and open_maps[-1] is not None:
+            node = open_maps[-1]
+            if prefix == node[0]:
+                node[2] = value
+            elif prefix == node[1]:
+                node[3] = value
+            else:
+                continue
+            # The writer emits name and type before children, so each node is
+            # complete before any of its descendants start
+            if node[2] is not None and node[3] is not None:
+                yield depth - 1, node[3] == 'directory', node[2]
+                node[0] = node[1] = None
+
 def print_project_structure(result: Dict[str, Any], folder_path: str, include_ignored: bool, interactive: bool, exclude_dirs: List[str]) -> None:
     if result.get('is_error', False):
         print_error_message(result.get('error', 'Unknown error occurred'))
         return
 
     json_file_path = result.get('json_file_path')
-    if not json_file_path or not os.path.exists(json_file_path):
-        print_error_message("JSON file not found or not created")
-        return
-
+    # Opening doubles as the existence check, so the path is only looked up once
     try:
-        with open(json_file_path, 'r', encoding='utf-8') as json_file:
-            structure = json.load(json_file)
-    except json.JSONDecodeError:
-        print_error_message("Error parsing project structure JSON file")
-        return
-    except UnicodeDecodeError:
-        print_error_message("Error reading project structure file: file is not UTF-8 encoded")
+        json_file = open(json_file_path, 'rb') if json_file_path else None
+    except FileNotFoundError:
+        json_file = None
+    except OSError as e:
+        print_error_message(f"Error occurred while printing structure: {str(e)}")
         return
-    except Exception as e:
-        print_error_message(f"Unexpected error reading project structure file: {str(e)}")
+    if json_file is None:
+        print_error_message("JSON file not found or not created")
         return
 
-    print(COLOR_SYSTEM + f"\nProject Structure for: {folder_path}" + Style.RESET_ALL)
-    print(COLOR_SYSTEM + f"Include ignored: {include_ignored}" + Style.RESET_ALL)
-    print(COLOR_SYSTEM + f"Interactive mode: {interactive}" + Style.RESET_ALL)
-    if exclude_dirs:
-        print(COLOR_SYSTEM + f"Excluded directories: {', '.join(exclude_dirs)}" + Style.RESET_ALL)
-    print("=" * 60)
-
-    def print_structure(node: Dict[str, Any], indent: str = '') -> None:
-        if node['type'] == 'directory':
-            icon = '📁'
-        else:
-            icon = '📄'
-        
+    # The with also covers the header, so the handle is closed if printing it fails
+    with json_file:
+        print(COLOR_SYSTEM + f"\nProject Structure for: {folder_path}" + COLOR_RESET)
+        print(COLOR_SYSTEM + f"Include ignored: {include_ignored}" + COLOR_RESET)
+        print(COLOR_SYSTEM + f"Interactive mode: {interactive}" + COLOR_RESET)
+        if exclude_dirs:
+            print(COLOR_SYSTEM + f"Excluded directories: {', '.join(exclude_dirs)}" + COLOR_RESET)
+        print("=" * 60)
+
+        dir_icon, file_icon = _structure_icons()
+        color, reset = COLOR_SYSTEM, COLOR_RESET
         try:
-            print(f"{indent}{COLOR_SYSTEM}{icon} {node['name']}{Style.RESET_ALL}")
-        except UnicodeEncodeError:
-            fallback_icon = 'D' if node['type'] == 'directory' else 'F'
-            print(f"{indent}{COLOR_SYSTEM}[{fallback_icon}] {node['name']}{Style.RESET_ALL}")
-        
-        if node['type'] == 'directory':
-            for child in node.get('children', []):
-                print_structure(child, indent + '  ')
-
-    try:
-        print_structure(structure)
-    except Exception as e:
-        print_error_message(f"Error occurred while printing structure: {str(e)}")
+            # Lines are written in batches as the file is parsed, so output starts
+            # before the whole structure has been read
+            lines = []
+            for depth, is_dir, name in _iter_structure_entries(json_file):
+                lines.append(f"{'  ' * depth}{color}{dir_icon if is_dir else file_icon} {name}{reset}\n")
+                if len(lines) >= STRUCTURE_PRINT_BATCH_LINES:
+                    sys.stdout.write(''.join(lines))
+                    lines.clear()
+            sys.stdout.write(''.join(lines))
+            sys.stdout.flush()
+        except STRUCTURE_JSON_ERRORS:
+            print_error_message("Error parsing project structure JSON file")
+        except UnicodeDecodeError:
+            print_error_message("Error reading project structure file: file is not UTF-8 encoded")
+        except Exception as e:
+            print_error_message(f"Error occurred while printing structure: {str(e)}")
 
-    print("\n" + COLOR_SYSTEM + "=" * 60 + Style.RESET_ALL)
+    print("\n" + COLOR_SYSTEM + "=" * 60 + COLOR_RESET)
     
-    print(COLOR_SYSTEM + f"\nJSON file created at: {json_file_path}" + Style.RESET_ALL)
-    print(COLOR_SYSTEM + "You can use this file for further analysis or processing." + Style.RESET_ALL)
+    print(COLOR_SYSTEM + f"\nJSON file created at: {json_file_path}" + COLOR_RESET)
+    print(COLOR_SYSTEM + "You can use this file for further analysis or processing." + COLOR_RESET)
 
     # Additional information from the result
     if 'summary' in result:
@@ -760,45 +1189,46 @@ def print_files_in_folder_contents(result: Dict[str, Any], folder_path: str, inc
     if 'error' in result:
         print_error_message(result['error'])
     else:
-        print(COLOR_SYSTEM + f"\nContents of files in folder: {folder_path} (including subfolders: {include_subfolders})" + Style.RESET_ALL)
+        print(COLOR_SYSTEM + f"\nContents of files in folder: {folder_path} (including subfolders: {include_subfolders})" + COLOR_RESET)
         print("=" * 40)
         for file_path, file_result in result['results'].items():
             if file_result.get('is_error', False):
-                print(f"{COLOR_ERROR}Error reading {file_path}: {file_result['error']}{Style.RESET_ALL}")
+                print(f"{COLOR_ERROR}Error reading {file_path}: {file_result['error']}{COLOR_RESET}")
             else:
-                print(f"{COLOR_SYSTEM}File: {file_path}{Style.RESET_ALL}")
+                print(f"{COLOR_SYSTEM}File: {file_path}{COLOR_RESET}")
                 print("-" * 20)
-                print(file_result['file_content'][:500] + "..." if len(file_result['file_content']) > 500 else file_result['file_content'])
+                content = file_result['file_content']
+                print(content if len(content) <= FOLDER_PREVIEW_CHARS else content[:FOLDER_PREVIEW_CHARS] + "...")
                 print("\n")
-        print(COLOR_SYSTEM + f"Total files processed: {len(result['results'])}" + Style.RESET_ALL)
+        print(COLOR_SYSTEM + f"Total files processed: {len(result['results'])}" + COLOR_RESET)
 
 def print_file_creation_result(result: Dict[str, Any]) -> None:
     if result.get('is_error', False):
         print_error_message(result['error'])
     else:
-        print(COLOR_SYSTEM + result['message'] + Style.RESET_ALL)
+        print(COLOR_SYSTEM + result['message'] + COLOR_RESET)
 
 def print_folder_creation_result(result: Dict[str, Any]) -> None:
     if result.get('is_error', False):
         print_error_message(result['error'])
     else:
-        print(COLOR_SYSTEM + result['message'] + Style.RESET_ALL)
+        print(COLOR_SYSTEM + result['message'] + COLOR_RESET)
 
 def print_file_list(result: Dict[str, Any], path: str) -> None:
     if 'error' in result:
         print_error_message(result['error'])
     else:
-        print(COLOR_SYSTEM + f"\nContents of directory: {path}" + Style.RESET_ALL)
+        print(COLOR_SYSTEM + f"\nContents of directory: {path}" + COLOR_RESET)
         print("=" * (24 + len(path)))
         if not result['files'] and not result['folders']:
             print("(Empty directory)")
         else:
             if result['folders']:
-                print(COLOR_SYSTEM + "\nFolders:" + Style.RESET_ALL)
+                print(COLOR_SYSTEM + "\nFolders:" + COLOR_RESET)
                 for folder in sorted(result['folders']):
                     print(f"  📁 {folder}")
             if result['files']:
-                print(COLOR_SYSTEM + "\nFiles:" + Style.RESET_ALL)
+                print(COLOR_SYSTEM + "\nFiles:" + COLOR_RESET)
                 for file in sorted(result['files']):
                     print(f"  📄 {file}")
 
@@ -806,31 +1236,36 @@ def print_file_content(result: Dict[str, Any], file_path: str) -> None:
     if 'error' in result:
         print_error_message(result['error'])
     else:
-        print(COLOR_SYSTEM + f"\nWhat to do with contents of file?: {file_path}" + Style.RESET_ALL)
+        print(COLOR_SYSTEM + f"\nWhat to do with contents of file?: {file_path}" + COLOR_RESET)
         print("=" * (20 + len(file_path)))
         #print(result['content'])
-        #print(COLOR_SYSTEM + "=" * (20 + len(file_path)) + Style.RESET_ALL)
+        #print(COLOR_SYSTEM + "=" * (20 + len(file_path)) + COLOR_RESET)
 
 def print_ai_response(response_content):
-    print("\n" + "=" * 80)
-    print("🤖 AI Response:")
-    print("=" * 80)
+    # Assemble the whole block first so it reaches the terminal in a single write
+    lines = ["\n" + "=" * 80, "🤖 AI Response:", "=" * 80]
     for content in response_content:
         if content.type == 'text':
-            print(textwrap.fill(content.text, width=78, initial_indent="  ", subsequent_indent="  "))
+            lines.append(textwrap.fill(content.text, width=78, initial_indent="  ", subsequent_indent="  "))
         elif content.type == 'tool_use':
-            print(f"\n  🛠️  Requesting to use tool: {content.name}")
-            print("  Tool input:")
-            print(textwrap.fill(json.dumps(content.input, indent=2), width=76, initial_indent="    ", subsequent_indent="    "))
-    print("=" * 80 + "\n")
+            lines.append(f"\n  🛠️  Requesting to use tool: {content.name}")
+            lines.append("  Tool input:")
+            lines.append(textwrap.fill(json.dumps(content.input, indent=2), width=76, initial_indent="    ", subsequent_indent="    "))
+    lines.append("=" * 80 + "\n")
+    print("\n".join(lines))
 
 def print_tool_execution(tool_name, tool_args):
-    print("\n" + "-" * 80)
-    print(f"⚙️  Executing tool: {tool_name}")
-    print(f"   Arguments: {json.dumps(tool_args, indent=2)}")
-    print("-" * 80 + "\n")
+    print("\n".join([
+        "\n" + "-" * 80,
+        f"⚙️  Executing tool: {tool_name}",
+        f"   Arguments: {json.dumps(tool_args, indent=2)}",
+        "-" * 80 + "\n",
+    ]))
 
 def print_tool_result(tool_name, result):
+    # Syntax pulls in pygments, so it is only imported once a tool result is shown
+    from rich.syntax import Syntax
+
     result_type = type(result).__name__
     
     header = Group(
@@ -848,12 +1283,12 @@ def print_tool_result(tool_name, result):
     elif isinstance(result, dict):
         content = Group(
             Text("🗃️ Dictionary Result:", style="bold green"),
-            Syntax(json.dumps(result, indent=2), "json", theme="monokai")
+            Syntax(dumps_pretty(result), "json", theme="monokai")
         )
     elif isinstance(result, list):
         content = Group(
             Text("📋 List Result:", style="bold green"),
-            Syntax(json.dumps(result, indent=2), "json", theme="monokai")
+            Syntax(dumps_pretty(result), "json", theme="monokai")
         )
     else:
         content = Group(
@@ -871,6 +1306,8 @@ def print_tool_result(tool_name, result):
     console.print(panel)
 
 def format_list_files_result(result):
+    from rich.tree import Tree
+
     tree = Tree("📁 Root")
     
     if 'folders' in result:
@@ -891,7 +1328,7 @@ def format_list_files_result(result):
 async def process_claude_response(
     response: anthropic.types.Message,
     conversation: Conversation,
-    client: anthropic.Anthropic,
+    client: anthropic.AsyncAnthropic,
     config: Config
 ) -> Union[List[Dict[str, Any]], str, None]:
     """
@@ -900,13 +1337,14 @@ async def process_claude_response(
     Args:
         response (anthropic.types.Message): The response from Claude.
         conversation (Conversation): The current conversation object.
-        client (anthropic.Anthropic): The Anthropic client.
+        client (anthropic.AsyncAnthropic): The async Anthropic client.
         config (Config): The configuration object.
 
     Returns:
         Union[List[Dict[str, Any]], str, None]: Tool results, final response, or None if no response.
     """
-    logger.debug(f"Processing Claude's response: {json.dumps(response.model_dump(), indent=2)}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Processing Claude's response: {json.dumps(response.model_dump(), indent=2)}")
 
     assistant_message_content = []
     tool_results = []
@@ -922,7 +1360,14 @@ async def process_claude_response(
             print_ai_response(response.content)
 
             print_tool_execution(content.name, content.input)
-            tool_result = execute_tool(content.name, content.input)
+            tool_input = content.input
+            if content.name == "code_edit_tool":
+                # Concurrency is a session setting, not something the model gets to choose
+                tool_input = {
+                    **tool_input,
+                    "config": {**tool_input.get("config", {}), "max_concurrent_api_calls": config.max_concurrent_api_calls}
+                }
+            tool_result = execute_tool(content.name, tool_input)
             print_tool_result(content.name, tool_result)
             tool_results.extend(_process_tool_use(content, assistant_message_content, tool_result))
 
@@ -930,7 +1375,8 @@ async def process_claude_response(
     logger.debug("Added assistant's response to conversation history")
 
     if tool_results:
-        logger.debug(f"Returning tool results: {json.dumps(tool_results, indent=2)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Returning tool results: {json.dumps(tool_results, indent=2)}")
         return tool_results
     elif final_response:
         logger.debug(f"Final response from Claude: {final_response.strip()}")
@@ -947,7 +1393,8 @@ def _process_text_content(content: anthropic.types.ContentBlock, message_content
 
 def _process_tool_use(content: anthropic.types.ContentBlock, message_content: List[Dict[str, Any]], tool_result: Dict[str, Any]) -> List[Dict[str, Any]]:
     """Process tool use content from Claude's response."""
-    logger.info(f"Processing tool use: {json.dumps(content.model_dump(), indent=2)}")
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(f"Processing tool use: {json.dumps(content.model_dump(), indent=2)}")
     tool_name = content.name
     tool_id = content.id
     tool_args = content.input
@@ -959,7 +1406,8 @@ def _process_tool_use(content: anthropic.types.ContentBlock, message_content: Li
         "input": tool_args
     })
 
-    logger.debug(f"Tool '{tool_name}' result: {json.dumps(tool_result, indent=2)}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Tool '{tool_name}' result: {json.dumps(tool_result, indent=2)}")
 
     return [{
         "tool_use_id": tool_id,
@@ -967,14 +1415,14 @@ def _process_tool_use(content: anthropic.types.ContentBlock, message_content: Li
         "result": tool_result
     }]
 
-async def generate_response(conversation: Conversation, client: anthropic.Anthropic, config: Config, wise_counsel: WiseCounsel, initial_review: InitialReview) -> None:
+async def generate_response(conversation: Conversation, client: anthropic.AsyncAnthropic, config: Config, wise_counsel: WiseCounsel, initial_review: InitialReview) -> None:
     """
     Generate a response from Claude, perform reviews until approved, and handle multiple tool uses if necessary.
     Uses a temporary context for feedback without modifying the main conversation history.
 
     Args:
         conversation (Conversation): The current conversation object.
-        client (anthropic.Anthropic): The Anthropic client.
+        client (anthropic.AsyncAnthropic): The async Anthropic client.
         config (Config): The configuration object.
         initial_review (InitialReview): The InitialReview instance for initial assessment.
         wise_counsel (WiseCounsel): The WiseCounsel instance for response review.
@@ -989,21 +1437,24 @@ async def generate_response(conversation: Conversation, client: anthropic.Anthro
             proceed_with_wise_counsel = False  # Default to False
             is_first_pass = True  # Add this line to initialize is_first_pass
 
-            # Create a deep copy of the conversation for temporary use
-            temp_conversation = copy.deepcopy(conversation)
+            # Working copy for the review loop, which may append feedback to the last message
+            temp_conversation = conversation.fork_for_review()
+            # Files only change when tools run, which happens after review, so
+            # the system message is the same for every attempt
+            system_message = temp_conversation.system_message.get_message_for_api(temp_conversation.files_context)
 
             while attempt < max_attempts and approved_response is None:
                 start_time = time.time()
                 
                 # Get a response from Claude using the temporary conversation
-                response = await _get_claude_response(temp_conversation, client, config)
+                response = await _get_claude_response(temp_conversation, client, config, system_message)
 
                 # Handle max_tokens stop reason
                 while response.stop_reason == "max_tokens":
                     truncation_message, partial_content = await handle_max_tokens_exceeded(response)
                     
                     elapsed_time = time.time() - start_time
-                    stop_thinking_spinner()
+                    await stop_thinking_spinner()
 
                     # Add the partial response to the conversation
                     conversation.add_message("assistant", [{"type": "text", "text": truncation_message}])
@@ -1011,26 +1462,27 @@ async def generate_response(conversation: Conversation, client: anthropic.Anthro
                     _handle_final_response(truncation_message)
                     return  # Exit the function after handling the truncation
 
-                stop_thinking_spinner()
+                await stop_thinking_spinner()
                 start_thinking_spinner("review")  # Switch to review mode
 
                 if is_first_pass:
-                    # Extract the last user message and AI response
-                    last_user_message = next((msg for msg in reversed(temp_conversation.messages) if msg['role'] == 'user'), None)
+                    # Extract the last user message
+                    last_user_message = temp_conversation.last_user_message()
                     
-                    def extract_response_content(response):
-                        if response.content:
-                            content = response.content[0]
-                            if content.type == 'text':
-                                return content.text
-                            elif content.type == 'tool_use':
-                                return f"Tool use requested: {content.name}"
-                            else:
-                                return f"Unexpected content type: {content.type}"
-                        else:
-                            return ""
-
-                    ai_response_text = extract_response_content(response)
+                    # Only the disabled initial review below used the response text
+                    #def extract_response_content(response):
+                    #    if response.content:
+                    #        content = response.content[0]
+                    #        if content.type == 'text':
+                    #            return content.text
+                    #        elif content.type == 'tool_use':
+                    #            return f"Tool use requested: {content.name}"
+                    #        else:
+                    #            return f"Unexpected content type: {content.type}"
+                    #    else:
+                    #        return ""
+
+                    #ai_response_text = extract_response_content(response)
 
                     # Check if the last user message is a tool_result
                     is_tool_result = False
@@ -1047,8 +1499,8 @@ async def generate_response(conversation: Conversation, client: anthropic.Anthro
 
                     # Perform initial review
                     #initial_review_result = await initial_review.assess_simplicity_clarity(
-                        json.dumps(last_user_message['content']) if last_user_message else "",
-                        ai_response_text
+                    #    json.dumps(last_user_message['content']) if last_user_message else "",
+                    #    ai_response_text
                     #)
                     #proceed_with_wise_counsel = initial_review_result['proceed_with_wise_counsel']
                     #logger.info(f"Initial review result: {initial_review_result}")
@@ -1095,14 +1547,15 @@ async def generate_response(conversation: Conversation, client: anthropic.Anthro
                     break  # Exit the loop as we have an approved response
 
             if approved_response is None:
+                await stop_thinking_spinner()
                 logger.warning(f"Failed to get an approved response after {max_attempts} attempts.")
-                print(COLOR_ERROR + f"I apologize, but I couldn't generate a satisfactory response after {max_attempts} attempts. Please try rephrasing your question." + Style.RESET_ALL)
+                print(COLOR_ERROR + f"I apologize, but I couldn't generate a satisfactory response after {max_attempts} attempts. Please try rephrasing your question." + COLOR_RESET)
                 return
 
             # Process the approved response
             elapsed_time = time.time() - start_time
             conversation.files_context.update_last_api_call_timestamp()
-            stop_thinking_spinner()
+            await stop_thinking_spinner()
             conversation.cache_metrics.update(approved_response, elapsed_time)
 
             # Add the approved response to the main conversation
@@ -1115,19 +1568,31 @@ async def generate_response(conversation: Conversation, client: anthropic.Anthro
                 break
             else:
                 logger.warning("Received empty response from Claude")
-                print(COLOR_ERROR + "I apologize, but I couldn't generate a proper response. Could you please rephrase your question?" + Style.RESET_ALL)
+                print(COLOR_ERROR + "I apologize, but I couldn't generate a proper response. Could you please rephrase your question?" + COLOR_RESET)
                 break
 
         except Exception as e:
             elapsed_time = time.time() - start_time
-            stop_thinking_spinner()
+            await stop_thinking_spinner()
             logger.error(f"Error generating response: {e}")
             error_message = f"Failed to generate response: {str(e)}"
             conversation.add_message("assistant", [{"type": "text", "text": error_message}])
             raise APIError(error_message) from e
         
     # Print cache performance report after each response
-    print(COLOR_SYSTEM + conversation.cache_metrics.generate_report() + Style.RESET_ALL)
+    print(COLOR_SYSTEM + conversation.cache_metrics.generate_report() + COLOR_RESET)
+
+TRUNCATION_PREAMBLE = (
+    "I apologize, but my response was truncated due to reaching the maximum token limit. "
+    "Here's what I managed to generate before being cut off:\n\n"
+)
+TRUNCATION_FOOTER = (
+    "To get a complete response, you could try:\n"
+    "1. Breaking your question into smaller, more focused parts.\n"
+    "2. Simplifying your query if possible.\n"
+    "3. If you're working with code or long text, consider sharing only the most relevant portions.\n"
+    "Please feel free to rephrase or split your question, and I'll do my best to provide a complete answer."
+)
 
 async def handle_max_tokens_exceeded(response: anthropic.types.Message) -> Tuple[str, str]:
     """
@@ -1139,36 +1604,23 @@ async def handle_max_tokens_exceeded(response: anthropic.types.Message) -> Tuple
     Returns:
         Tuple[str, str]: A tuple containing the truncation message and any partial content.
     """
-    truncation_message = (
-        "I apologize, but my response was truncated due to reaching the maximum token limit. "
-        "Here's what I managed to generate before being cut off:\n\n"
-    )
-    
-    partial_content = ""
-    for content in response.content:
-        if content.type == 'text':
-            partial_content += content.text
-
-    truncation_message += "```\n" + partial_content + "\n```" + "\n\n"
-    truncation_message += (
-        "To get a complete response, you could try:\n"
-        "1. Breaking your question into smaller, more focused parts.\n"
-        "2. Simplifying your query if possible.\n"
-        "3. If you're working with code or long text, consider sharing only the most relevant portions.\n"
-        "Please feel free to rephrase or split your question, and I'll do my best to provide a complete answer."
-    )
+    partial_content = ''.join(content.text for content in response.content if content.type == 'text')
+    truncation_message = ''.join((TRUNCATION_PREAMBLE, "```\n", partial_content, "\n```\n\n", TRUNCATION_FOOTER))
     
     logger.warning("Response truncated due to max tokens")
     return truncation_message, partial_content
 
-async def _get_claude_response(conversation: Conversation, client: anthropic.Anthropic, config: Config) -> anthropic.types.Message:
-    """Get a response from the Claude API."""
+async def _get_claude_response(conversation: Conversation, client: anthropic.AsyncAnthropic, config: Config, system_message: Optional[List[Dict[str, Any]]] = None) -> anthropic.types.Message:
+    """Get a response from the Claude API, optionally reusing an already built system message."""
     logger.debug("Sending request to Claude API")
     
-    system_message = conversation.system_message.get_message_for_api(conversation.files_context)
+    if system_message is None:
+        system_message = conversation.system_message.get_message_for_api(conversation.files_context)
     conversation_messages = conversation.get_messages_for_api()
 
-    response = client.messages.create(
+    response = await _create_message(
+        conversation.api_semaphore,
+        client,
         model=config.model_name,
         max_tokens=config.max_tokens,
         system=system_message,
@@ -1177,10 +1629,35 @@ async def _get_claude_response(conversation: Conversation, client: anthropic.Ant
         tool_choice=TOOL_CHOICE,
         extra_headers=config.anthropic_headers
     )
-    logger.debug(f"Received response from Claude API: {json.dumps(response.model_dump(), indent=2)}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Received response from Claude API: {json.dumps(response.model_dump(), indent=2)}")
     _log_api_usage(response.usage)
     return response
 
+async def _create_message(semaphore: asyncio.Semaphore, client: anthropic.AsyncAnthropic, **kwargs: Any) -> anthropic.types.Message:
+    """
+    Call messages.create while holding the concurrency semaphore, backing off on rate limits.
+
+    Args:
+        semaphore (asyncio.Semaphore): Limits how many requests are in flight at once.
+        client (anthropic.AsyncAnthropic): The async Anthropic client.
+        **kwargs: Arguments passed through to messages.create.
+
+    Returns:
+        anthropic.types.Message: The response from Claude.
+    """
+    for attempt in range(API_RATE_LIMIT_RETRIES + 1):
+        try:
+            async with semaphore:
+                return await client.messages.create(**kwargs)
+        except anthropic.RateLimitError:
+            if attempt == API_RATE_LIMIT_RETRIES:
+                raise
+            # Sleep outside the semaphore so other requests can use the slot
+            delay = API_BACKOFF_BASE_SECONDS * 2 ** attempt + random.uniform(0, 1)
+            logger.warning(f"Rate limited by the API, retrying in {delay:.1f}s (attempt {attempt + 1}/{API_RATE_LIMIT_RETRIES})")
+            await asyncio.sleep(delay)
+
 def _log_api_usage(usage: anthropic.types.Usage) -> None:
     """Log the API usage information."""
     logger.info(f"API usage - Input tokens: {usage.input_tokens}, "
@@ -1188,6 +1665,11 @@ def _log_api_usage(usage: anthropic.types.Usage) -> None:
                 f"Cache creation tokens: {getattr(usage, 'cache_creation_input_tokens', 0)}, "
                 f"Cache read tokens: {getattr(usage, 'cache_read_input_tokens', 0)}")
 
+@functools.lru_cache(maxsize=1024)
+def _relative_path(file_path: str) -> str:
+    """Path relative to the working directory, cached because tools keep returning the same paths."""
+    return os.path.relpath(os.path.abspath(file_path))
+
 def _handle_tool_results(results: List[Dict[str, Any]], conversation: Conversation) -> None:
     """Handle tool results by updating FilesContext and adding results to the conversation."""
     logger.info("Tool was used, processing results")
@@ -1197,36 +1679,26 @@ def _handle_tool_results(results: List[Dict[str, Any]], conversation: Conversati
         is_error = result_content.get("is_error", False)
 
         if not is_error:
-            # Find all keys containing 'file' (case-insensitive)
-            file_keys = [key for key in result_content.keys() if 'file' in key.lower()]
-            
-            # Prioritize 'file_path' if it exists, otherwise use the first found key
-            if 'file_path' in file_keys:
-                file_path = result_content['file_path']
-            elif file_keys:
-                file_path = result_content[file_keys[0]]
-            else:
-                file_path = None
+            file_path = next((result_content[key] for key in RESULT_FILE_KEYS if key in result_content), None)
 
             file_content = result_content.get("file_content")
             
             if file_path:
-                # Convert to absolute path if it's not already
-                if not os.path.isabs(file_path):
-                    file_path = os.path.abspath(file_path)
+                relative_path = _relative_path(file_path)
 
-                if file_content is None and os.path.exists(file_path):
-                    # Read file content if not provided but file exists
+                if file_content is None:
+                    # Read file content if not provided; a missing file just leaves it unset
                     try:
-                        with open(file_path, 'r') as f:
-                            file_content = f.read()
+                        with open(file_path, 'rb') as f:
+                            file_content = f.read().decode('utf-8', errors='replace')
+                    except FileNotFoundError:
+                        file_content = None
                     except Exception as e:
                         logger.error(f"Error reading file {file_path}: {str(e)}")
                         file_content = None
 
                 if file_content:
                     # Update FilesContext with the file content
-                    relative_path = os.path.relpath(file_path)
                     conversation.files_context.update_file_in_context(relative_path, file_content, tool_name)
                     logger.info(f"Updated FilesContext with content from {relative_path}")
                     
@@ -1237,7 +1709,7 @@ def _handle_tool_results(results: List[Dict[str, Any]], conversation: Conversati
                             {
                                 "type": "tool_result",
                                 "tool_use_id": tool_result["tool_use_id"],
-                                "content": json.dumps({
+                                "content": dumps_compact({
                                     "file_path": relative_path,
                                     "message": f"File content has been updated in the context. Use this reference to access the content from tool: {tool_name}"
                                 }),
@@ -1253,7 +1725,7 @@ def _handle_tool_results(results: List[Dict[str, Any]], conversation: Conversati
                             {
                                 "type": "tool_result",
                                 "tool_use_id": tool_result["tool_use_id"],
-                                "content": json.dumps({
+                                "content": dumps_compact({
                                     "file_path": relative_path,
                                     "message": f"File was created or referenced by {tool_name} but content is not available in the context. You may need to use the read_file tool to access its content."
                                 }),
@@ -1269,22 +1741,21 @@ def _handle_tool_results(results: List[Dict[str, Any]], conversation: Conversati
                         {
                             "type": "tool_result",
                             "tool_use_id": tool_result["tool_use_id"],
-                            "content": json.dumps(result_content),
+                            "content": dumps_compact(result_content),
                             "is_error": False
                         }
                     ]
                 }
         else:
-            # Handle error results
+            # Handle error results. is_error already marks the block, so the
+            # message goes as plain text rather than JSON wrapped in a string
             tool_results_message = {
                 "role": "user",
                 "content": [
                     {
                         "type": "tool_result",
                         "tool_use_id": tool_result["tool_use_id"],
-                        "content": json.dumps({
-                            "error": result_content.get("error", "Unknown error occurred")
-                        }),
+                        "content": str(result_content.get("error", "Unknown error occurred")),
                         "is_error": True
                     }
                 ]
@@ -1307,12 +1778,12 @@ def format_ai_output(content: str) -> str:
         str: Formatted and indented string.
     """
     # Parse the content as JSON to handle potential nested structures
-    parsed = json.loads(content)
+    parsed = loads_json(content)
     # Extract the actual content (either 'reasoning' or 'response')
     actual_content = list(parsed.values())[0]
-    # Use json.dumps for consistent indentation if the content is a complex structure
+    # Use JSON for consistent indentation if the content is a complex structure
     if isinstance(actual_content, (dict, list)):
-        return json.dumps(actual_content, indent=2)
+        return dumps_pretty(actual_content)
     else:
         # For simple strings, split into lines and indent
         lines = actual_content.split('\n')
@@ -1328,17 +1799,10 @@ def extract_reasoning(response: str) -> Tuple[str, str]:
     Returns:
         Tuple[str, str]: A tuple containing the extracted reasoning and the remaining response.
     """
-    reasoning = ""
-    if "<reasoning>" in response and "</reasoning>" in response:
-        start = response.index("<reasoning>") + len("<reasoning>")
-        end = response.index("</reasoning>")
-        reasoning = response[start:end].strip()
-        response = response[:start-len("<reasoning>")] + response[end+len("</reasoning>"):]
-    return reasoning, response
-
-def format_reasoning(reasoning: str) -> str:
-    lines = reasoning.split("\n")
-    return "\n".join(f"   > {line}" for line in lines)
+    match = REASONING_RE.search(response)
+    if match is None:
+        return "", response
+    return match.group(1).strip(), response[:match.start()] + response[match.end():]
 
 def format_markdown_content(reasoning: Optional[str], response: str) -> str:
     """
@@ -1351,14 +1815,14 @@ def format_markdown_content(reasoning: Optional[str], response: str) -> str:
     Returns:
         str: Formatted markdown content.
     """
-    markdown_content = ""
+    parts = []
     if reasoning:
-        markdown_content += f"{REASONING_EMOJI} **{REASONING_TITLE}**\n"
-        markdown_content += "> " + reasoning.replace("\n", "\n> ") + "\n\n"
-    
-    markdown_content += f"{RESPONSE_EMOJI} **{RESPONSE_TITLE}**\n\n"
-    markdown_content += response
-    return markdown_content
+        parts.append(f"{REASONING_EMOJI} **{REASONING_TITLE}**\n> ")
+        parts.append(reasoning.replace("\n", "\n> "))
+        parts.append("\n\n")
+    parts.append(f"{RESPONSE_EMOJI} **{RESPONSE_TITLE}**\n\n")
+    parts.append(response)
+    return "".join(parts)
 
 def print_assistant_response(response: str, console: Optional[Console] = None) -> None:
     """
@@ -1377,6 +1841,8 @@ def print_assistant_response(response: str, console: Optional[Console] = None) -
     if not response.strip():
         raise ValueError("Response cannot be empty")
 
+    from rich.markdown import Markdown
+
     try:
         reasoning, final_response = extract_reasoning(response)
         markdown_content = format_markdown_content(reasoning, final_response)
@@ -1400,7 +1866,7 @@ def print_assistant_response(response: str, console: Optional[Console] = None) -
 def _handle_final_response(result: str) -> None:
     print_assistant_response(result)
 
-async def process_user_input(conversation: Conversation, user_input: str, client: anthropic.Anthropic, config: Config, wise_counsel: WiseCounsel, initial_review: InitialReview) -> bool:
+async def process_user_input(conversation: Conversation, user_input: str, client: anthropic.AsyncAnthropic, config: Config, wise_counsel: WiseCounsel, initial_review: InitialReview) -> bool:
     """
     Process user input and generate a response.
 
@@ -1411,7 +1877,7 @@ async def process_user_input(conversation: Conversation, user_input: str, client
     Args:
         conversation (Conversation): The current conversation object.
         user_input (str): The user's input string.
-        client (anthropic.Anthropic): The Anthropic client for API calls.
+        client (anthropic.AsyncAnthropic): The async Anthropic client for API calls.
         config (Config): The configuration object.
         wise_counsel (WiseCounsel): The WiseCounsel instance for response review.
         initial_review (InitialReview): The InitialReview instance for initial assessment.
@@ -1423,16 +1889,19 @@ async def process_user_input(conversation: Conversation, user_input: str, client
         Exception: Any exception that occurs during processing is logged and printed.
     """
     if user_input.startswith('/'):
-        result = handle_command(user_input, conversation)
+        result = await handle_command(user_input, conversation)
         if result == "exit":
             return False
     else:
         if "project study" in user_input.lower():
             project_structure_file = "project_structure.json"
-            if not os.path.exists(project_structure_file):
+            try:
+                structure_mtime = os.stat(project_structure_file).st_mtime_ns
+            except FileNotFoundError:
                 user_input += "\n\n[NOTE: project_structure output is not available. Consider running project_structure before project_study.]"
-            elif (time.time() - os.path.getmtime(project_structure_file)) > 3600:  # 1 hour
-                user_input += "\n\n[NOTE: project_structure output may be outdated. Consider running project_structure again before project_study.]"
+            else:
+                if not _is_structure_fresh('.', structure_mtime, config.exclude_dirs):
+                    user_input += "\n\n[NOTE: project_structure output may be outdated. Consider running project_structure again before project_study.]"
             
             user_input += "\n\nBefore proceeding with project_study, please confirm that project_structure has been run recently."
 
@@ -1445,20 +1914,22 @@ async def process_user_input(conversation: Conversation, user_input: str, client
             print_error_message(str(e))
         return True
 
-async def conversation_loop(conversation: Conversation, client: anthropic.Anthropic, config: Config, wise_counsel: WiseCounsel, initial_review: InitialReview) -> None:
+async def conversation_loop(conversation: Conversation, client: anthropic.AsyncAnthropic, config: Config, wise_counsel: WiseCounsel, initial_review: InitialReview) -> None:
     """
     Main conversation loop.
 
     Args:
         conversation (Conversation): The current conversation object.
-        client (anthropic.Anthropic): The Anthropic client.
+        client (anthropic.AsyncAnthropic): The async Anthropic client.
         config (Config): The configuration object.
         wise_counsel (WiseCounsel): The WiseCounsel instance for response review.
         initial_review (InitialReview): The InitialReview instance for initial assessment.
     """
-    os.system('cls' if os.name == 'nt' else 'clear')
+    clear_screen()
     
     print_welcome_message()
+    # Checked after the clear so the warning stays on screen
+    check_console_encoding()
     
     while True:
         user_input = get_user_input()
@@ -1466,6 +1937,8 @@ async def conversation_loop(conversation: Conversation, client: anthropic.Anthro
         if not should_continue:
             break
 
+    conversation.io_pool.shutdown(wait=True)
+
     if conversation.cache_metrics.total_requests > 0:
         visualize_metrics(conversation.cache_metrics)
     else:
@@ -1476,17 +1949,26 @@ def visualize_metrics(metrics: CacheMetrics) -> None:
         print("No metrics to visualize. No requests were made.")
         return
 
-    plt.figure(figsize=(12, 6))
     avg_response_time = metrics.total_time / metrics.total_requests
-    plt.plot(range(1, metrics.total_requests + 1), [avg_response_time] * metrics.total_requests, label='Average Response Time')
-    plt.title('Average Response Time per Request')
-    plt.xlabel('Request Number')
-    plt.ylabel('Response Time (s)')
-    plt.legend()
-    plt.savefig('response_times.png')
-    plt.close()
-
-    print(f"Metrics visualization saved as 'response_times.png'")
+
+    # A single request has nothing to compare, so only the summary is printed
+    if len(metrics.request_times) > 1:
+        # Imported here because pyplot takes most of a second to load and is only
+        # needed at the end of a session
+        import matplotlib.pyplot as plt
+
+        request_numbers = range(1, len(metrics.request_times) + 1)
+        plt.figure(figsize=(12, 6))
+        plt.bar(request_numbers, metrics.request_times, label='Response Time')
+        plt.axhline(avg_response_time, color='tab:orange', linestyle='--', label='Average Response Time')
+        plt.title('Response Time per Request')
+        plt.xlabel('Request Number')
+        plt.ylabel('Response Time (s)')
+        plt.legend()
+        plt.savefig('response_times.png')
+        plt.close()
+
+        print(f"Metrics visualization saved as 'response_times.png'")
     print(f"Total requests: {metrics.total_requests}")
     print(f"Average response time: {avg_response_time:.2f} seconds")
 
@@ -1494,52 +1976,38 @@ def main() -> None:
     """Main function to run the Codai application."""
     try:
         config = Config.load()
-        client = anthropic.Anthropic(api_key=config.api_key)
-        conversation = Conversation()
+        # The async client keeps one connection pool for the whole session, so the
+        # conversation must run on a single event loop (see conversation_loop).
+        client = anthropic.AsyncAnthropic(api_key=config.api_key)
+        conversation = Conversation(
+            api_semaphore=asyncio.Semaphore(config.max_concurrent_api_calls),
+            history_cap=config.history_cap,
+            exclude_dirs=config.exclude_dirs
+        )
         files_context = FilesContext()
-
-        check_console_encoding()
         
         # Initialize WiseCounsel
-        wise_counsel = WiseCounsel(client, config.__dict__)
-        initial_review = InitialReview(client, config.__dict__)
+        wise_counsel = WiseCounsel(client, asdict(config))
+        initial_review = InitialReview(client, asdict(config))
         
         # Main conversation loop
-        os.system('cls' if os.name == 'nt' else 'clear')
-        print_welcome_message()
-        
-        while True:
-            user_input = get_user_input()
-            if user_input.startswith('/'):
-                result = handle_command(user_input, conversation)
-                if result == "exit":
-                    break
-                # Continue the loop for other commands
-            else:
-                should_continue = asyncio.run(process_user_input(conversation, user_input, client, config, wise_counsel, initial_review))
-                if not should_continue:
-                    break
-
-        if conversation.cache_metrics.total_requests > 0:
-            visualize_metrics(conversation.cache_metrics)
-        else:
-            print("No metrics to visualize. No requests were made.")
+        asyncio.run(conversation_loop(conversation, client, config, wise_counsel, initial_review))
             
     except ConfigurationError as e:
         logger.error(f"Configuration error: {e}")
-        print(COLOR_ERROR + f"Configuration error: {str(e)}" + Style.RESET_ALL)
+        print(COLOR_ERROR + f"Configuration error: {str(e)}" + COLOR_RESET)
     except FileReadError as e:
         logger.error(f"File read error: {e}")
-        print(COLOR_ERROR + f"File read error: {str(e)}" + Style.RESET_ALL)
+        print(COLOR_ERROR + f"File read error: {str(e)}" + COLOR_RESET)
     except APIError as e:
         logger.error(f"API error: {e}")
-        print(COLOR_ERROR + f"API error: {str(e)}" + Style.RESET_ALL)
+        print(COLOR_ERROR + f"API error: {str(e)}" + COLOR_RESET)
     except Exception as e:
         logger.error(f"Unexpected error: {e}", exc_info=True)
-        print(COLOR_ERROR + f"An unexpected error occurred: {str(e)}" + Style.RESET_ALL)
+        print(COLOR_ERROR + f"An unexpected error occurred: {str(e)}" + COLOR_RESET)
     finally:
         logger.info("Codai session ended.")
-        print(COLOR_SYSTEM + "Codai session ended." + Style.RESET_ALL)
+        print(COLOR_SYSTEM + "Codai session ended." + COLOR_RESET)
 
 if __name__ == "__main__":
     main()             
\ No newline at end of file
@@ -1,16 +1,32 @@
 ﻿import json
+import hashlib
 import logging
+import os
 import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 import time
 import random
-from typing import Dict, Any, List, Union, Tuple, Callable
+from typing import Dict, Any, List, Union, Tuple, Callable, Optional
 from functools import wraps
-from anthropic import Anthropic
+from anthropic import Anthropic, APIConnectionError, APIStatusError
 from rich.console import Console
 from rich.panel import Panel
 from rich.syntax import Syntax
+from rich.text import Text
 from rich.progress import Progress, SpinnerColumn, TextColumn, BarColumn
 import difflib
+from batch_runner import BatchRunner, DEFAULT_BATCH_THRESHOLD, DEFAULT_BATCH_TIMEOUT, DEFAULT_POLL_INTERVAL
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 # Initialize logger
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -19,19 +35,61 @@ logger = logging.getLogger(__name__)
 # Initialize console for rich output
 console = Console()
 
-def retry_with_backoff(retries: int = 3, backoff_in_seconds: int = 1) -> Callable:
+# One client per API key, so repeated tool calls reuse its connection pool
+_client_cache: Dict[Optional[str], Anthropic] = {}
+
+# orjson.JSONDecodeError subclasses json.JSONDecodeError, so callers catch the same exception either way
+_json_loads = orjson.loads if orjson is not None else json.loads
+
+# Greedy, so it spans from the first opening bracket to the last closing one
+# and captures the outermost structure around any surrounding prose
+_JSON_EXTRACT_RE = re.compile(r'[\{\[].*[\}\]]', re.DOTALL)
+
+# Below this many edits a str.find per search is cheaper than building an automaton
+AHO_CORASICK_MIN_EDITS = 4
+
+# Edit blocks longer than this are shown as a plain, truncated panel because
+# syntax highlighting multi-KB blocks dominates the approval prompt
+APPROVAL_HIGHLIGHT_MAX_CHARS = 2000
+APPROVAL_PREVIEW_HEAD_CHARS = 1000
+APPROVAL_PREVIEW_TAIL_CHARS = 500
+
+# Parallel edit-instruction requests when files are not batched
+DEFAULT_MAX_CONCURRENT_REQUESTS = 8
+
+# Approved edit instructions are kept here, one JSON file per distinct request,
+# when config["edit_cache"] is True
+EDIT_CACHE_DIR = ".codai_edit_cache"
+
+# Same statuses the SDK itself treats as transient; anything else fails the same way on retry
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+def _is_retryable(error: Exception) -> bool:
+    """Whether an API error is transient (connection problems, timeouts, rate limits, overload, 5xx)."""
+    if isinstance(error, APIConnectionError):
+        return True
+    if isinstance(error, APIStatusError):
+        return error.status_code in RETRYABLE_STATUS_CODES or error.status_code >= 500
+    return False
+
+def retry_with_backoff(retries: int = 3, backoff_in_seconds: int = 1, max_total_seconds: float = 30.0) -> Callable:
     def rwb(f: Callable) -> Callable:
         @wraps(f)
         def wrapper(*args: Any, **kwargs: Any) -> Any:
             x = 0
+            deadline = time.monotonic() + max_total_seconds
             while True:
                 try:
                     return f(*args, **kwargs)
                 except Exception as e:
-                    if x == retries:
+                    if x == retries or not _is_retryable(e):
                         raise
                     sleep = (backoff_in_seconds * 2 ** x + 
                              random.uniform(0, 1))
+                    # Give up now rather than sleep past the budget
+                    if time.monotonic() + sleep > deadline:
+                        raise
+                    logger.warning(f"{f.__name__} failed with {type(e).__name__}, retrying in {sleep:.1f}s")
                     time.sleep(sleep)
                     x += 1
         return wrapper
@@ -46,20 +104,24 @@ def parse_search_replace_blocks(response_text: str) -> List[Dict[str, Union[str,
     
     Returns:
         List[Dict[str, Union[str, Dict[str, str]]]]: A list of parsed instructions or error dictionaries.
+        An empty list means the response explicitly asked for no changes.
     """
     def extract_json(text: str) -> str:
         """Extract JSON object or array from a string."""
-        json_match = re.search(r'(\{|\[).*?(\}|\])', text, re.DOTALL)
+        json_match = _JSON_EXTRACT_RE.search(text)
         return json_match.group(0) if json_match else text
 
     def safe_loads(json_str: str) -> Any:
         """Safely load JSON string, handling potential issues."""
-        try:
-            return json.loads(json_str)
-        except json.JSONDecodeError:
-            # If it fails, try to extract a valid JSON subset
-            extracted = extract_json(json_str)
-            return json.loads(extracted)
+        # Well-formed responses start with the structure itself; only text
+        # with surrounding prose needs the extraction pass
+        if json_str[:1] in ('{', '['):
+            try:
+                return _json_loads(json_str)
+            except json.JSONDecodeError:
+                pass
+        # Try to extract a valid JSON subset
+        return _json_loads(extract_json(json_str))
 
     try:
         # Remove outer quotes and cleanup the string
@@ -76,6 +138,11 @@ def parse_search_replace_blocks(response_text: str) -> List[Dict[str, Union[str,
         else:
             instructions = [parsed_data]  # Treat as a single instruction
         
+        # An explicit empty list is the model saying no changes are needed, not a parse failure
+        if not instructions:
+            logger.info("Response contains no edit instructions; no changes needed")
+            return []
+        
         # Validate and clean instructions
         valid_instructions = []
         for idx, instruction in enumerate(instructions):
@@ -97,14 +164,9 @@ def parse_search_replace_blocks(response_text: str) -> List[Dict[str, Union[str,
         logger.error(f"Error parsing search/replace blocks: {str(e)}", exc_info=True)
         return [{"error": "PARSING_ERROR", "message": str(e)}]
 
-@retry_with_backoff(retries=3)
-def generate_edit_instructions(client: Anthropic, file_path: str, file_content: str, instructions: str, project_context: str, config: Dict[str, Any]) -> List[Dict[str, str]]:
-    """Generate edit instructions using the Anthropic API with added robustness."""
-    if not all([file_path, file_content, instructions, project_context]):
-        raise ValueError("Missing required input for generating edit instructions")
-
-    try:
-        prompt = f"""
+def build_edit_request_params(file_content: str, instructions: str, project_context: str, config: Dict[str, Any]) -> Dict[str, Any]:
+    """Build the messages.create arguments used to request edit instructions for one file."""
+    prompt = f"""
         You are an AI coding agent that generates edit instructions for code files in any programming language. Your task is to analyze the provided code and generate edit instructions in JSON format. Follow these steps:
 
         1. Review the entire file content to understand the context and identify the programming language used:
@@ -143,16 +205,78 @@ def generate_edit_instructions(client: Anthropic, file_path: str, file_content:
         Do not include any explanatory text outside the JSON structure in your response.
         """
 
-        response = client.messages.create(
-            model=config.get("model_name", "claude-3-5-sonnet-20240620"),
-            max_tokens=config.get("max_tokens", 8192),
-            system=prompt,
-            messages=[
-                {"role": "user", "content": "Generate edit instructions based on the provided content and instructions."}
-            ],
-            temperature=0.5,
-            extra_headers=config.get("anthropic_headers", {})
-        )
+    return {
+        "model": config.get("model_name", "claude-3-5-sonnet-20240620"),
+        "max_tokens": config.get("max_tokens", 8192),
+        "system": prompt,
+        "messages": [
+            {"role": "user", "content": "Generate edit instructions based on the provided content and instructions."}
+        ],
+        "temperature": 0.5,
+        "extra_headers": config.get("anthropic_headers", {})
+    }
+
+def _edit_cache_path(params: Dict[str, Any], config: Dict[str, Any]) -> Optional[str]:
+    """
+    Where the edit instructions for a request are cached, or None unless caching is enabled.
+
+    The key hashes every parameter that affects the response (model, prompt,
+    file content, instructions, project context, sampling settings), so any
+    change to the inputs misses the cache.
+    """
+    if not config.get("edit_cache", False):
+        return None
+    payload = {k: v for k, v in params.items() if k != "extra_headers"}
+    key = hashlib.blake2b(json.dumps(payload, sort_keys=True).encode('utf-8'), digest_size=20).hexdigest()
+    return os.path.join(config.get("edit_cache_dir", EDIT_CACHE_DIR), f"{key}.json")
+
+def _load_cached_instructions(cache_path: Optional[str]) -> Optional[List[Dict[str, str]]]:
+    """Return previously generated edit instructions, or None on a cache miss."""
+    if cache_path is None:
+        return None
+    try:
+        with open(cache_path, 'rb') as f:
+            instructions = _json_loads(f.read())
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable edit cache entry {cache_path}: {str(e)}")
+        return None
+    logger.info(f"Using cached edit instructions from {cache_path}")
+    return instructions
+
+def _store_cached_instructions(cache_path: Optional[str], instructions: List[Dict[str, str]]) -> None:
+    """Persist edit instructions that were applied; error results are never cached."""
+    if cache_path is None or any('error' in instruction for instruction in instructions):
+        return
+    cache_dir = os.path.dirname(cache_path)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # Write to a temporary file and rename it, so a crash never leaves a truncated entry
+        with tempfile.NamedTemporaryFile('wb', dir=cache_dir, suffix='.tmp', delete=False) as f:
+            f.write(orjson.dumps(instructions) if orjson is not None else json.dumps(instructions).encode('utf-8'))
+        os.replace(f.name, cache_path)
+    except OSError as e:
+        logger.warning(f"Could not write edit cache entry {cache_path}: {str(e)}")
+
+@retry_with_backoff(retries=3)
+def _create_edit_message(client: Anthropic, params: Dict[str, Any]) -> Any:
+    """Request edit instructions, retrying transient API errors."""
+    return client.messages.create(**params)
+
+def generate_edit_instructions(client: Anthropic, file_path: str, file_content: str, instructions: str, project_context: str, config: Dict[str, Any]) -> List[Dict[str, str]]:
+    """Generate edit instructions using the Anthropic API with added robustness."""
+    if not all([file_path, file_content, instructions, project_context]):
+        raise ValueError("Missing required input for generating edit instructions")
+
+    try:
+        params = build_edit_request_params(file_content, instructions, project_context, config)
+        cache_path = _edit_cache_path(params, config)
+        cached_instructions = _load_cached_instructions(cache_path)
+        if cached_instructions is not None:
+            return cached_instructions
+
+        response = _create_edit_message(client, params)
         
         if not response.content:
             logger.error("Empty response from API")
@@ -169,16 +293,216 @@ def generate_edit_instructions(client: Anthropic, file_path: str, file_content:
         logger.error(f"Error in generate_edit_instructions: {str(e)}", exc_info=True)
         return [{"error": "GENERATION_ERROR", "message": str(e)}]
 
-def apply_edits(file_path: str, edit_instructions: List[Dict[str, str]], original_content: str) -> Tuple[str, bool]:
-    """Apply the edit instructions to the file content."""
-    edited_content = original_content
-    changes_made = False
+def generate_edit_instructions_batch(client: Anthropic, files: List[Dict[str, Any]], project_context: str, config: Dict[str, Any]) -> List[List[Dict[str, str]]]:
+    """
+    Generate edit instructions for many files with a single Message Batches submission.
 
+    Args:
+        client (Anthropic): The Anthropic client.
+        files (List[Dict[str, Any]]): Files to edit, each with 'path', 'content', and 'instructions'.
+        project_context (str): Overall project context.
+        config (Dict[str, Any]): Configuration settings.
+
+    Returns:
+        List[List[Dict[str, str]]]: Edit instructions (or error dictionaries) for each file, in input order.
+    """
+    all_instructions: List[List[Dict[str, str]]] = [[] for _ in files]
+    requests = []
+    for idx, file in enumerate(files):
+        if not all([file.get('path'), file.get('content'), file.get('instructions'), project_context]):
+            all_instructions[idx] = [{"error": "GENERATION_ERROR", "message": "Missing required input for generating edit instructions"}]
+            continue
+        params = build_edit_request_params(file['content'], file['instructions'], project_context, config)
+        cached_instructions = _load_cached_instructions(_edit_cache_path(params, config))
+        if cached_instructions is not None:
+            all_instructions[idx] = cached_instructions
+            continue
+        requests.append(BatchRunner.build_request(f"file-{idx}", params))
+
+    if not requests:
+        return all_instructions
+
+    runner = BatchRunner(
+        client,
+        poll_interval=config.get("batch_poll_interval", DEFAULT_POLL_INTERVAL),
+        timeout=config.get("batch_timeout", DEFAULT_BATCH_TIMEOUT)
+    )
+    batch_results = runner.run(requests, extra_headers=config.get("anthropic_headers", {}))
+
+    for request in requests:
+        idx = int(request["custom_id"].split("-", 1)[1])
+        result = batch_results[request["custom_id"]]
+        if result["is_error"]:
+            all_instructions[idx] = [{"error": "GENERATION_ERROR", "message": result["error"]}]
+        elif not result["message"].content:
+            all_instructions[idx] = [{"error": "EMPTY_RESPONSE", "message": "Received empty response from API"}]
+        else:
+            all_instructions[idx] = parse_search_replace_blocks(result["message"].content[0].text)
+            logger.info(f"Generated {len(all_instructions[idx])} edit instructions for {files[idx]['path']}")
+
+    return all_instructions
+
+def generate_edit_instructions_concurrently(client: Anthropic, files: List[Dict[str, Any]], project_context: str, config: Dict[str, Any]) -> List[Optional[List[Dict[str, str]]]]:
+    """
+    Request edit instructions for every file at once on a thread pool.
+
+    The per-file API calls are independent, so overlapping them turns N round
+    trips into roughly one. Approval prompts still happen one file at a time
+    afterwards, in process_file.
+
+    Args:
+        client (Anthropic): The Anthropic client, shared by all threads.
+        files (List[Dict[str, Any]]): Files to edit, each with 'path', 'content', and 'instructions'.
+        project_context (str): Overall project context.
+        config (Dict[str, Any]): Configuration settings; max_concurrent_api_calls caps the threads.
+
+    Returns:
+        List[Optional[List[Dict[str, str]]]]: Edit instructions for each file, in input order. None
+        marks a file whose inputs were invalid, so process_file reports it as before.
+    """
+    def generate(file: Dict[str, Any]) -> Optional[List[Dict[str, str]]]:
+        try:
+            return generate_edit_instructions(client, file.get('path'), file.get('content'), file.get('instructions'), project_context, config)
+        except ValueError:
+            return None
+
+    max_workers = max(1, min(config.get("max_concurrent_api_calls", DEFAULT_MAX_CONCURRENT_REQUESTS), len(files)))
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="codai-edit") as executor:
+        return list(executor.map(generate, files))
+
+def _find_search_starts(content: str, searches: List[str]) -> List[List[int]]:
+    """
+    Find where each search string occurs in content.
+
+    Occurrences are non-overlapping and taken left to right, the same ones
+    str.replace would change. With pyahocorasick installed and enough searches,
+    all of them are found in a single scan of content.
+
+    Args:
+        content (str): The text to search.
+        searches (List[str]): Non-empty search strings.
+
+    Returns:
+        List[List[int]]: Start offsets for each search, in order.
+    """
+    if ahocorasick is None or len(searches) < AHO_CORASICK_MIN_EDITS:
+        starts = []
+        for search in searches:
+            positions = []
+            start = content.find(search)
+            while start != -1:
+                positions.append(start)
+                start = content.find(search, start + len(search))
+            starts.append(positions)
+        return starts
+
+    automaton = ahocorasick.Automaton()
+    for search in set(searches):
+        automaton.add_word(search, search)
+    automaton.make_automaton()
+
+    # The automaton reports overlapping matches, ordered by end offset
+    matches: Dict[str, List[int]] = {}
+    for end_index, search in automaton.iter(content):
+        matches.setdefault(search, []).append(end_index - len(search) + 1)
+
+    starts = []
+    for search in searches:
+        positions = []
+        next_free = 0
+        for start in matches.get(search, []):
+            if start >= next_free:
+                positions.append(start)
+                next_free = start + len(search)
+        starts.append(positions)
+    return starts
+
+def _find_edit_spans(content: str, edits: List[Dict[str, str]]) -> Optional[List[Tuple[int, int, str]]]:
+    """
+    Locate every occurrence of each edit's search text in the original content.
+
+    Returns None when applying the edits one at a time could give a different
+    result than splicing them all into the original: a search that is empty
+    or only appears after earlier edits, matches that overlap or sit closer
+    together than the longest search, or a replacement that could form a
+    later edit's search text with the characters around it.
+
+    Args:
+        content (str): The original file content.
+        edits (List[Dict[str, str]]): Edit instructions with 'search' and 'replace' keys.
+
+    Returns:
+        Optional[List[Tuple[int, int, str]]]: (start, end, replacement) spans sorted by position, or None.
+    """
+    if not all(edit['search'] for edit in edits):
+        return None
+
+    spans = []
+    for idx, starts in enumerate(_find_search_starts(content, [edit['search'] for edit in edits])):
+        if not starts:
+            return None
+        spans.extend((start, start + len(edits[idx]['search']), idx) for start in starts)
+
+    spans.sort()
+    # Far enough apart that no search can touch two spans at once
+    reach = max((len(edit['search']) for edit in edits), default=1) - 1
+    if any(current[0] - previous[1] < reach for previous, current in zip(spans, spans[1:])):
+        return None
+
+    for start, end, idx in spans:
+        for later in edits[idx + 1:]:
+            margin = len(later['search']) - 1
+            window = content[max(0, start - margin):start] + edits[idx]['replace'] + content[end:end + margin]
+            if later['search'] in window:
+                return None
+
+    return [(start, end, edits[idx]['replace']) for start, end, idx in spans]
+
+def apply_edits(file_path: str, edit_instructions: List[Dict[str, str]], original_content: str, show_diff: bool = True) -> Tuple[str, bool]:
+    """
+    Apply the edit instructions to the file content.
+
+    Diffs are only generated when show_diff is set, since nobody sees them
+    outside interactive mode. Repeats of an identical search/replace pair are
+    applied once.
+    """
+    # Keyed on (search, replace) so a repeated instruction is applied, and scanned for, only once
+    unique_edits: Dict[Tuple[str, str], Dict[str, str]] = {}
+    repeated = 0
     for edit in edit_instructions:
         if 'error' in edit:
             logger.error(f"Error in edit instruction: {edit['error']} - {edit['message']}")
-            continue
+        elif unique_edits.setdefault((edit['search'], edit['replace']), edit) is not edit:
+            repeated += 1
+    if repeated:
+        logger.debug(f"Ignoring {repeated} repeated edit instructions for {file_path}")
+    edits = list(unique_edits.values())
+    if not edits:
+        return original_content, False
+
+    spans = _find_edit_spans(original_content, edits)
+    if spans is not None:
+        # Independent edits: splice all replacements into the original in one pass
+        parts = []
+        position = 0
+        for start, end, replace_content in spans:
+            parts.append(original_content[position:start])
+            parts.append(replace_content)
+            position = end
+        parts.append(original_content[position:])
+        edited_content = ''.join(parts)
+
+        if show_diff:
+            for edit in edits:
+                # Display the diff for this edit
+                diff = generate_diff(edit['search'], edit['replace'], file_path)
+                console.print(Panel(diff, title=f"Changes in {file_path}", expand=False))
+        return edited_content, bool(edits)
 
+    edited_content = original_content
+    changes_made = False
+
+    for edit in edits:
         search_content = edit['search']
         replace_content = edit['replace']
 
@@ -186,9 +510,10 @@ def apply_edits(file_path: str, edit_instructions: List[Dict[str, str]], origina
             edited_content = edited_content.replace(search_content, replace_content)
             changes_made = True
 
-            # Display the diff for this edit
-            diff = generate_diff(search_content, replace_content, file_path)
-            console.print(Panel(diff, title=f"Changes in {file_path}", expand=False))
+            if show_diff:
+                # Display the diff for this edit
+                diff = generate_diff(search_content, replace_content, file_path)
+                console.print(Panel(diff, title=f"Changes in {file_path}", expand=False))
         else:
             logger.warning(f"Search content not found in {file_path}: {search_content[:50]}...")
 
@@ -205,6 +530,12 @@ def generate_diff(original: str, new: str, path: str) -> str:
     ))
     return ''.join(diff)
 
+def _approval_block(code: str) -> Union[Syntax, Text]:
+    """Highlight a search/replace block, or truncate it as plain text if it is too large."""
+    if len(code) > APPROVAL_HIGHLIGHT_MAX_CHARS:
+        return Text(code[:APPROVAL_PREVIEW_HEAD_CHARS] + "\n... [truncated] ...\n" + code[-APPROVAL_PREVIEW_TAIL_CHARS:])
+    return Syntax(code, "python", theme="monokai", line_numbers=False, word_wrap=False)
+
 def get_user_approval(path: str, edit_instructions: List[Dict[str, str]], config: Dict[str, Any]) -> bool:
     """
     Display proposed changes and ask for user approval.
@@ -225,16 +556,19 @@ def get_user_approval(path: str, edit_instructions: List[Dict[str, str]], config
         if 'error' in edit:
             console.print(f"[bold red]Error: {edit['error']} - {edit['message']}[/bold red]")
         else:
-            console.print(Panel(Syntax(edit['search'], "python", theme="monokai"), title="Original"))
-            console.print(Panel(Syntax(edit['replace'], "python", theme="monokai"), title="Proposed Change"))
+            console.print(Panel(_approval_block(edit['search']), title="Original"))
+            console.print(Panel(_approval_block(edit['replace']), title="Proposed Change"))
     
     console.show_cursor()
     approval = console.input("[bold yellow]Do you approve these changes? (yes/no): [/bold yellow]")
     return approval.lower() == "yes"
 
-def process_file(client: Anthropic, file: Dict[str, Any], project_context: str, config: Dict[str, Any]) -> Dict[str, Any]:
+def process_file(client: Anthropic, file: Dict[str, Any], project_context: str, config: Dict[str, Any], edit_instructions: List[Dict[str, str]] = None) -> Dict[str, Any]:
     """
     Process a single file for editing.
+
+    If edit_instructions are given (e.g. from a batch run) they are applied as-is
+    instead of requesting new ones.
     """
     try:
         path = file['path']
@@ -242,15 +576,30 @@ def process_file(client: Anthropic, file: Dict[str, Any], project_context: str,
         original_content = file['content']
 
         # Generate edit instructions
-        edit_instructions = generate_edit_instructions(client, path, original_content, instructions, project_context, config)
+        if edit_instructions is None:
+            edit_instructions = generate_edit_instructions(client, path, original_content, instructions, project_context, config)
 
-        if edit_instructions and not any('error' in instruction for instruction in edit_instructions):
+        # An empty list is the model saying no changes are needed
+        if not edit_instructions:
+            return {
+                "path": path,
+                "status": "no_changes",
+                "message": f"No changes needed for {path}"
+            }
+
+        if not any('error' in instruction for instruction in edit_instructions):
             if get_user_approval(path, edit_instructions, config):
-                edited_content, changes_made = apply_edits(path, edit_instructions, original_content)
+                edited_content, changes_made = apply_edits(path, edit_instructions, original_content, config.get("interactive_mode", True))
                 if changes_made:
                     try:
-                        with open(path, 'w') as f:
+                        # A single write of the whole string; the content is already in memory,
+                        # so chunking it would only add calls
+                        with open(path, 'w', encoding='utf-8') as f:
                             f.write(edited_content)
+                        # Only instructions the user approved and that applied cleanly are
+                        # cached, so a rejected edit is requested afresh on the next attempt
+                        params = build_edit_request_params(original_content, instructions, project_context, config)
+                        _store_cached_instructions(_edit_cache_path(params, config), edit_instructions)
                         return {
                             "path": path,
                             "status": "success",
@@ -293,7 +642,14 @@ def process_file(client: Anthropic, file: Dict[str, Any], project_context: str,
             "error": str(e)
         }
 
-def code_edit_tool(tool_input: Dict[str, Any]) -> Dict[str, Any]:
+def _get_client(api_key: Optional[str]) -> Anthropic:
+    """Return the cached client for api_key, creating it on first use."""
+    client = _client_cache.get(api_key)
+    if client is None:
+        client = _client_cache[api_key] = Anthropic(api_key=api_key)
+    return client
+
+def code_edit_tool(tool_input: Dict[str, Any], client: Optional[Anthropic] = None) -> Dict[str, Any]:
     """
     Edit multiple code files based on AI-generated instructions.
     
@@ -302,6 +658,10 @@ def code_edit_tool(tool_input: Dict[str, Any]) -> Dict[str, Any]:
             - files (List[Dict[str, Any]]): List of files to edit, each with 'path', 'content', and 'instructions'.
             - project_context (str): Overall project context.
             - config (Dict[str, Any]): Configuration settings including model_name, max_tokens, anthropic_headers, and interactive_mode.
+              With interactive_mode off, batch_threshold, batch_poll_interval and batch_timeout control the Message Batches path.
+              Otherwise up to max_concurrent_api_calls files (set from the session config) are requested in parallel.
+              With edit_cache on, approved and applied instructions are cached under edit_cache_dir.
+        client (Optional[Anthropic]): Client to use instead of the cached one for config["api_key"].
 
     Returns:
         Dict[str, Any]: A dictionary containing the results of the editing process and any error information.
@@ -315,12 +675,24 @@ def code_edit_tool(tool_input: Dict[str, Any]) -> Dict[str, Any]:
             logger.error("No files provided for editing")
             return {"error": "No files provided for editing", "is_error": True}
 
-        # Initialize Anthropic client
-        client = Anthropic(api_key=config.get("api_key"))
+        # Use the caller's client if given, otherwise the cached one for this key
+        if client is None:
+            client = _get_client(config.get("api_key"))
 
         results = []
         console_output = []
 
+        # Nobody is waiting on approval prompts, so collapse the per-file calls
+        # into one batch submission once there are enough of them. Otherwise
+        # the calls for several files are made concurrently up front.
+        precomputed_instructions = None
+        if not config.get("interactive_mode", True) and len(files) >= config.get("batch_threshold", DEFAULT_BATCH_THRESHOLD):
+            console.print(f"[cyan]Submitting {len(files)} files as a message batch...[/cyan]")
+            precomputed_instructions = generate_edit_instructions_batch(client, files, project_context, config)
+        elif len(files) > 1:
+            with console.status(f"[cyan]Generating edit instructions for {len(files)} files...[/cyan]"):
+                precomputed_instructions = generate_edit_instructions_concurrently(client, files, project_context, config)
+
         with Progress(
             SpinnerColumn(),
             TextColumn("[progress.description]{task.description}"),
@@ -330,11 +702,12 @@ def code_edit_tool(tool_input: Dict[str, Any]) -> Dict[str, Any]:
         ) as progress:
             edit_task = progress.add_task("[cyan]Editing files...", total=len(files))
 
-            for file in files:
+            for idx, file in enumerate(files):
                 # Hide progress bar
                 progress.stop()
 
-                file_result = process_file(client, file, project_context, config)
+                edit_instructions = precomputed_instructions[idx] if precomputed_instructions is not None else None
+                file_result = process_file(client, file, project_context, config, edit_instructions)
 
                 # Show progress bar again
                 progress.start()
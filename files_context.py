@@ -1,5 +1,14 @@
-from typing import Dict, List, Tuple, Optional
-from datetime import datetime
+import heapq
+import sys
+from typing import Dict, Iterable, List, Tuple, Optional, Set
+from dataclasses import dataclass
+
+@dataclass(slots=True)
+class _FileEntry:
+    """Content and modification details of one file in the context."""
+    content: str
+    last_modified: int  # Position in the update order, from FilesContext._update_seq
+    source: str  # Name of the tool (or 'user') that supplied the content, interned
 
 class FilesContext:
     """
@@ -11,12 +20,21 @@ class FilesContext:
     of files within the application.
     """
 
+    # No per-instance __dict__; the attributes are read on every API request
+    __slots__ = ("entries", "_update_seq", "_last_api_seq", "_modified_since_api_call", "_sorted_paths")
+
     def __init__(self):
-        """Initialize the FileContext with empty dictionaries and no last API call time."""
-        self.files: Dict[str, str] = {}
-        self.last_modified: Dict[str, datetime] = {}
-        self.modification_source: Dict[str, str] = {}
-        self.last_api_call: Optional[datetime] = None
+        """Initialize the FileContext with no files and no API call made yet."""
+        # One record per file, so an update or removal is a single dict operation
+        self.entries: Dict[str, _FileEntry] = {}
+        # Modifications are only ever ordered, never read as times, so a counter
+        # replaces datetime.now()
+        self._update_seq = 0
+        self._last_api_seq: Optional[int] = None
+        # Paths updated since the last API call, so splitting needs no comparisons
+        self._modified_since_api_call: Set[str] = set()
+        # Built by list_files_in_context, reset when a path is added or removed
+        self._sorted_paths: Optional[List[str]] = None
 
     def update_file_in_context(self, relative_path: str, file_content: str, source: str) -> None:
         """
@@ -27,9 +45,36 @@ class FilesContext:
             file_content (str): The content of the file.
             source (str): The source of the modification (e.g., 'user', 'list_files', 'read_file').
         """
-        self.files[relative_path] = file_content
-        self.last_modified[relative_path] = datetime.now()
-        self.modification_source[relative_path] = source
+        if relative_path not in self.entries:
+            self._sorted_paths = None
+        self._update_seq += 1
+        # Sources come from a handful of tool names, parsed anew from each API
+        # response; interning keeps one string per name instead of one per file
+        self.entries[relative_path] = _FileEntry(file_content, self._update_seq, sys.intern(source))
+        self._modified_since_api_call.add(relative_path)
+
+    def update_files_in_context(self, files: Iterable[Tuple[str, str, str]]) -> None:
+        """
+        Add or update several files at once, e.g. everything read from a folder.
+
+        Equivalent to calling update_file_in_context for each file in order, with
+        the bookkeeping done once for the whole group.
+
+        Args:
+            files (Iterable[Tuple[str, str, str]]): (relative_path, file_content, source) for each file.
+        """
+        entries = self.entries
+        update_seq = self._update_seq
+        updated_paths = []
+        for relative_path, file_content, source in files:
+            update_seq += 1
+            entries[relative_path] = _FileEntry(file_content, update_seq, sys.intern(source))
+            updated_paths.append(relative_path)
+        if update_seq != self._update_seq:
+            self._update_seq = update_seq
+            self._modified_since_api_call.update(updated_paths)
+            # Cheaper than checking each path for whether it is new
+            self._sorted_paths = None
 
     def remove_file_from_context(self, relative_path: str) -> None:
         """
@@ -41,12 +86,12 @@ class FilesContext:
         Raises:
             KeyError: If the file does not exist in the context.
         """
-        if relative_path not in self.files:
-            raise KeyError(f"File '{relative_path}' not found in the context.")
-        
-        del self.files[relative_path]
-        del self.last_modified[relative_path]
-        del self.modification_source[relative_path]
+        try:
+            del self.entries[relative_path]
+        except KeyError:
+            raise KeyError(f"File '{relative_path}' not found in the context.") from None
+        self._modified_since_api_call.discard(relative_path)
+        self._sorted_paths = None
 
     def get_all_file_paths(self) -> List[str]:
         """
@@ -55,7 +100,7 @@ class FilesContext:
         Returns:
             List[str]: A list of relative paths of all files in the context.
         """
-        return list(self.files.keys())
+        return list(self.entries)
 
     def list_files_in_context(self) -> str:
         """
@@ -64,13 +109,15 @@ class FilesContext:
         Returns:
             str: A formatted string containing a list of all files in the context.
         """
-        file_list = self.get_all_file_paths()
-        if not file_list:
+        if not self.entries:
             return "No files in context."
         
-        return "Files in context:\n" + "\n".join(f"- {file}" for file in sorted(file_list))
+        if self._sorted_paths is None:
+            self._sorted_paths = sorted(self.entries)
+        # The bullet prefix goes in the separator, so no per-line strings are built
+        return "Files in context:\n- " + "\n- ".join(self._sorted_paths)
 
-    def split_files_for_api_context(self) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]:
+    def split_files_for_api_context(self, limit: Optional[int] = None) -> Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]:
         """
         Split and retrieve files into existing and new/modified categories for API context.
 
@@ -78,33 +125,51 @@ class FilesContext:
         modified since the last API call from those that haven't changed. It sorts the files
         based on their last modification time.
 
+        Args:
+            limit (Optional[int]): Return at most this many of the oldest files in each list.
+                Only those are ordered, which is cheaper than sorting everything. None returns all files.
+
         Returns:
             Tuple[List[Tuple[str, str]], List[Tuple[str, str]]]: A tuple containing two lists:
                 1. Existing files: [(relative_path, file_content), ...]
                 2. New/modified files: [(relative_path, file_content), ...]
                 Both lists are sorted by last modification time (oldest first).
         """
-        existing_files = []
-        new_modified_files = []
-
-        for relative_path, file_content in self.files.items():
-            file_tuple = (relative_path, file_content)
-            if self.last_api_call and self.last_modified[relative_path] > self.last_api_call:
-                new_modified_files.append(file_tuple)
-            else:
-                existing_files.append(file_tuple)
+        entries = self.entries
+        # Before the first API call every file counts as existing
+        modified = self._modified_since_api_call if self._last_api_seq is not None else set()
+
+        # (last_modified, path, content) sorts by update order without a key
+        # function; the counter values are unique, so only ints are compared
+        new_modified_files = [
+            (entries[relative_path].last_modified, relative_path, entries[relative_path].content)
+            for relative_path in modified
+        ]
+        existing_files = [
+            (entry.last_modified, relative_path, entry.content)
+            for relative_path, entry in entries.items()
+            if relative_path not in modified
+        ]
 
         # Sort both lists by last modification time (oldest first)
-        existing_files.sort(key=lambda x: self.last_modified[x[0]])
-        new_modified_files.sort(key=lambda x: self.last_modified[x[0]])
-
-        return existing_files, new_modified_files
+        if limit is None:
+            existing_files.sort()
+            new_modified_files.sort()
+        else:
+            existing_files = heapq.nsmallest(limit, existing_files)
+            new_modified_files = heapq.nsmallest(limit, new_modified_files)
+
+        return (
+            [(relative_path, file_content) for _, relative_path, file_content in existing_files],
+            [(relative_path, file_content) for _, relative_path, file_content in new_modified_files]
+        )
 
     def update_last_api_call_timestamp(self) -> None:
         """
-        Update the timestamp of the last API call.
+        Mark the point of the last API call in the update order.
 
         This method should be called immediately after each API call to ensure
         accurate tracking of file modifications between calls.
         """
-        self.last_api_call = datetime.now()
+        self._last_api_seq = self._update_seq
+        self._modified_since_api_call.clear()
@@ -1,23 +1,93 @@
+import asyncio
+import hashlib
 import json
 import logging
-from typing import Dict, Any, List
+import re
+from collections import OrderedDict
+from typing import Dict, Any, List, Tuple, Union
 import anthropic
 from anthropic.types import Message
 
 logger = logging.getLogger(__name__)
 
+# The whole assessment in the order requested by assess_simplicity_clarity, matched in one scan
+ASSESSMENT_RE = re.compile(
+    r'<user_score>(\d+)</user_score>\s*<user_explanation>(.*?)</user_explanation>\s*'
+    r'<ai_score>(\d+)</ai_score>\s*<ai_explanation>(.*?)</ai_explanation>',
+    re.DOTALL
+)
+# Individual tags, for responses that do not follow the format exactly
+USER_SCORE_RE = re.compile(r'<user_score>(\d+)</user_score>')
+USER_EXPLANATION_RE = re.compile(r'<user_explanation>(.*?)</user_explanation>', re.DOTALL)
+AI_SCORE_RE = re.compile(r'<ai_score>(\d+)</ai_score>')
+AI_EXPLANATION_RE = re.compile(r'<ai_explanation>(.*?)</ai_explanation>', re.DOTALL)
+AI_EXPLANATION_CLOSE = '</ai_explanation>'
+# One assessment per item in an assess_batch response
+INDEXED_ASSESSMENT_RE = re.compile(r'<assessment index="(\d+)">(.*?)</assessment>', re.DOTALL)
+
+# Rating guidance shared by the single and batched assessment prompts
+ASSESSMENT_CRITERIA = """
+        You are an expert in assessing the simplicity and clarity of meaning and context in communication. Your task is to evaluate both a user's input and an AI's response, focusing on the underlying meaning and contextual relevance rather than just the surface-level text. Rate them on a scale from 1 to 100, where:
+
+        1 is extremely complex, unclear in meaning, or lacking contextual relevance.
+        100 is very simple, clear in meaning, and highly relevant to the context.
+
+        Consider factors such as:
+        - Coherence of ideas
+        - Relevance to the conversation context
+        - Ease of understanding the intended meaning
+        - Absence of ambiguity or confusion in the message
+"""
+
+ASSESSMENT_TAGS = """
+        <user_score>Score for user input</user_score>
+        <user_explanation>Brief explanation for user input score, focusing on meaning and context</user_explanation>
+        <ai_score>Score for AI response</ai_score>
+        <ai_explanation>Brief explanation for AI response score, focusing on meaning and context</ai_explanation>
+"""
+
+# System prompts are constant, so they are assembled once at import
+SYSTEM_MESSAGE = ASSESSMENT_CRITERIA + """
+        Please provide your assessment in the following format:
+
+        <assessment>""" + ASSESSMENT_TAGS + """        </assessment>
+
+        Ensure that your scores are integers between 1 and 100.
+        """
+
+BATCH_SYSTEM_MESSAGE = ASSESSMENT_CRITERIA + """
+        You will be given several numbered items, each with a user input and an AI response. Assess every item separately and provide one assessment per item in the following format, where k is the item's index:
+
+        <assessment index="k">""" + ASSESSMENT_TAGS + """        </assessment>
+
+        Ensure that your scores are integers between 1 and 100.
+        """
+
+# Output tokens allowed per assessed pair
+ASSESSMENT_MAX_TOKENS = 1000
+# Output limit of a single request when config has no max_tokens (the model's ceiling);
+# assess_batch splits larger batches so no call asks for more
+MAX_OUTPUT_TOKENS = 8192
+
+# Assessments remembered per InitialReview, least recently used evicted first
+ASSESSMENT_CACHE_SIZE = 256
+
 class InitialReview:
-    def __init__(self, client: anthropic.Anthropic, config: Dict[str, Any]):
+    def __init__(self, client: Union[anthropic.AsyncAnthropic, anthropic.Anthropic], config: Dict[str, Any]):
         """
         Initialize the InitialReview instance.
 
         Args:
-            client (anthropic.Anthropic): The Anthropic client for making API calls.
+            client (Union[anthropic.AsyncAnthropic, anthropic.Anthropic]): The Anthropic client for making
+                API calls. Calls on a sync client run in a worker thread so they do not block the event loop.
             config (Dict[str, Any]): Configuration dictionary for the Anthropic API.
         """
         self.client = client
         self.config = config
-        logger.info("InitialReview initialized with config: %s", json.dumps(config))
+        # Successful assessments keyed by a digest of the assessed pair
+        self._assessment_cache: OrderedDict[bytes, Dict[str, Any]] = OrderedDict()
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("InitialReview initialized with config: %s", json.dumps(config))
 
     async def assess_simplicity_clarity(self, user_input: str, ai_response: str) -> Dict[str, Any]:
         """
@@ -30,31 +100,14 @@ class InitialReview:
         Returns:
             Dict[str, Any]: Assessment results including scores and whether to proceed with WiseCounsel.
         """
-        logger.info("Starting initial simplicity and clarity assessment of meaning and context")
-
-        system_message = """
-        You are an expert in assessing the simplicity and clarity of meaning and context in communication. Your task is to evaluate both a user's input and an AI's response, focusing on the underlying meaning and contextual relevance rather than just the surface-level text. Rate them on a scale from 1 to 100, where:
+        cache_key = self._cache_key(user_input, ai_response)
+        cached = self._assessment_cache.get(cache_key)
+        if cached is not None:
+            self._assessment_cache.move_to_end(cache_key)
+            logger.info("Reusing cached initial assessment")
+            return dict(cached)
 
-        1 is extremely complex, unclear in meaning, or lacking contextual relevance.
-        100 is very simple, clear in meaning, and highly relevant to the context.
-
-        Consider factors such as:
-        - Coherence of ideas
-        - Relevance to the conversation context
-        - Ease of understanding the intended meaning
-        - Absence of ambiguity or confusion in the message
-
-        Please provide your assessment in the following format:
-
-        <assessment>
-        <user_score>Score for user input</user_score>
-        <user_explanation>Brief explanation for user input score, focusing on meaning and context</user_explanation>
-        <ai_score>Score for AI response</ai_score>
-        <ai_explanation>Brief explanation for AI response score, focusing on meaning and context</ai_explanation>
-        </assessment>
-
-        Ensure that your scores are integers between 1 and 100.
-        """
+        logger.info("Starting initial simplicity and clarity assessment of meaning and context")
 
         user_message = f"""
         Please assess the simplicity and clarity of the following user input and AI response:
@@ -67,63 +120,185 @@ class InitialReview:
         """
 
         try:
-            assessment_response = await self._get_assessment(system_message, user_message)
+            assessment_text = await self._get_assessment(SYSTEM_MESSAGE, user_message)
             logger.info("Received initial assessment response")
 
-            assessment_text = assessment_response.content[0].text if assessment_response.content else ""
             logger.info("Extracted initial assessment text (length: %d): %s", len(assessment_text), assessment_text)
 
-            user_score, user_explanation, ai_score, ai_explanation = self._parse_assessment(assessment_text)
-
-            proceed_with_wise_counsel = user_score < 50 and ai_score < 60
+            scores, has_scores = self._parse_assessment(assessment_text)
+            result = self._build_result(*scores)
 
-            result = {
-                "user_score": user_score,
-                "user_explanation": user_explanation,
-                "ai_score": ai_score,
-                "ai_explanation": ai_explanation,
-                "proceed_with_wise_counsel": proceed_with_wise_counsel
-            }
-
-            logger.info("Initial assessment completed. Result: %s", json.dumps(result))
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("Initial assessment completed. Result: %s", json.dumps(result))
+            # A reply without both scores (truncated or malformed) is not replayed for the same pair
+            if has_scores:
+                self._remember(cache_key, result)
             return result
 
         except Exception as e:
             logger.error("Error in initial assessment process: %s", str(e))
-            return {
-                "user_score": 0,
-                "user_explanation": "Error occurred during initial assessment",
-                "ai_score": 0,
-                "ai_explanation": "Error occurred during initial assessment",
-                "proceed_with_wise_counsel": False
-            }
+            return self._error_result()
+
+    async def assess_batch(self, pairs: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """
+        Assess several (user_input, ai_response) pairs with as few API calls as the output limit allows.
+
+        Each call covers as many pairs as fit in config['max_tokens'] at
+        ASSESSMENT_MAX_TOKENS per pair; the calls run concurrently.
+
+        Args:
+            pairs (List[Tuple[str, str]]): The user inputs and AI responses to assess.
 
-    async def _get_assessment(self, system_message: str, user_message: str) -> Message:
+        Returns:
+            List[Dict[str, Any]]: One result per pair, in order, shaped like the result of
+            assess_simplicity_clarity. Pairs missing from the response get the error result.
+        """
+        pairs_per_call = max(1, self.config.get('max_tokens', MAX_OUTPUT_TOKENS) // ASSESSMENT_MAX_TOKENS)
+        chunks = await asyncio.gather(*(
+            self._assess_chunk(pairs[start:start + pairs_per_call])
+            for start in range(0, len(pairs), pairs_per_call)
+        ))
+        return [result for chunk in chunks for result in chunk]
+
+    async def _assess_chunk(self, pairs: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """Assess pairs that fit in one response with a single API call."""
+        if len(pairs) == 1:
+            return [await self.assess_simplicity_clarity(*pairs[0])]
+
+        logger.info("Starting batched initial assessment of %d pairs", len(pairs))
+
+        items = "\n".join(
+            f'<item index="{index}">\nUser Input:\n{user_input}\n\nAI Response:\n{ai_response}\n</item>'
+            for index, (user_input, ai_response) in enumerate(pairs)
+        )
+        user_message = f"Please assess the simplicity and clarity of each of the following items:\n\n{items}"
+
+        try:
+            messages = [{"role": "user", "content": user_message}]
+            assessment_response = await self._make_api_call(
+                BATCH_SYSTEM_MESSAGE, messages, max_tokens=ASSESSMENT_MAX_TOKENS * len(pairs)
+            )
+            assessment_text = assessment_response.content[0].text if assessment_response.content else ""
+        except Exception as e:
+            logger.error("Error in batched initial assessment process: %s", str(e))
+            return [self._error_result() for _ in pairs]
+
+        results: List[Dict[str, Any]] = [self._error_result() for _ in pairs]
+        for match in INDEXED_ASSESSMENT_RE.finditer(assessment_text):
+            index = int(match.group(1))
+            if index < len(pairs):
+                results[index] = self._build_result(*self._parse_assessment(match.group(2))[0])
+
+        logger.info("Batched initial assessment completed for %d pairs", len(pairs))
+        return results
+
+    @staticmethod
+    def _cache_key(user_input: str, ai_response: str) -> bytes:
+        """Digest of an assessed pair; the separator keeps ("ab", "c") and ("a", "bc") apart."""
+        return hashlib.blake2b((user_input + "\x00" + ai_response).encode("utf-8"), digest_size=16).digest()
+
+    def _remember(self, cache_key: bytes, result: Dict[str, Any]) -> None:
+        """Cache a copy of a successful assessment, evicting the least recently used one if full."""
+        self._assessment_cache[cache_key] = dict(result)
+        if len(self._assessment_cache) > ASSESSMENT_CACHE_SIZE:
+            self._assessment_cache.popitem(last=False)
+
+    @staticmethod
+    def _build_result(user_score: int, user_explanation: str, ai_score: int, ai_explanation: str) -> Dict[str, Any]:
+        """Build the assessment result, including whether WiseCounsel should review the response."""
+        return {
+            "user_score": user_score,
+            "user_explanation": user_explanation,
+            "ai_score": ai_score,
+            "ai_explanation": ai_explanation,
+            "proceed_with_wise_counsel": user_score < 50 and ai_score < 60
+        }
+
+    @staticmethod
+    def _error_result() -> Dict[str, Any]:
+        """Result reported when an assessment could not be obtained."""
+        return {
+            "user_score": 0,
+            "user_explanation": "Error occurred during initial assessment",
+            "ai_score": 0,
+            "ai_explanation": "Error occurred during initial assessment",
+            "proceed_with_wise_counsel": False
+        }
+
+    async def _get_assessment(self, system_message: str, user_message: str) -> str:
         """
         Get an assessment from the AI.
 
+        With an async client the response is streamed and reading stops as soon as
+        the assessment is complete.
+
         Args:
             system_message (str): The system message containing assessment instructions.
             user_message (str): The user message containing the text to be assessed.
 
         Returns:
-            Message: The AI's assessment response.
+            str: The text of the AI's assessment response.
 
         Raises:
             Exception: If there's an error in the API call.
         """
         logger.info("Getting initial assessment response")
         messages = [{"role": "user", "content": user_message}]
-        logger.info("Messages for API call: %s", json.dumps(messages))
-        return await self._make_api_call(system_message, messages)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Messages for API call: %s", json.dumps(messages))
+        if isinstance(self.client, anthropic.AsyncAnthropic):
+            return await self._stream_assessment(system_message, messages)
+        response = await self._make_api_call(system_message, messages)
+        return response.content[0].text if response.content else ""
+
+    async def _stream_assessment(self, system: str, messages: List[Dict[str, str]]) -> str:
+        """
+        Stream an assessment, stopping once every field has been received.
+
+        Args:
+            system (str): The system message.
+            messages (List[Dict[str, str]]): The list of messages for the conversation.
+
+        Returns:
+            str: The assessment text received so far.
 
-    async def _make_api_call(self, system: str, messages: List[Dict[str, str]]) -> Message:
+        Raises:
+            Exception: If there's an error in the API call.
+        """
+        logger.info("Streaming initial review response")
+        text = ""
+        try:
+            async with self.client.messages.stream(**self._request_params(system, messages, ASSESSMENT_MAX_TOKENS)) as stream:
+                async for chunk in stream.text_stream:
+                    text += chunk
+                    # The AI explanation is the last field, so once its closing tag
+                    # arrives and the assessment parses, the rest is not needed
+                    if AI_EXPLANATION_CLOSE in text[-(len(chunk) + len(AI_EXPLANATION_CLOSE)):] and ASSESSMENT_RE.search(text):
+                        logger.info("Assessment complete, closing the stream early")
+                        break
+        except Exception as e:
+            logger.error("Error in initial review API call: %s", str(e))
+            raise
+        return text
+
+    def _request_params(self, system: str, messages: List[Dict[str, str]], max_tokens: int) -> Dict[str, Any]:
+        """Keyword arguments for messages.create or messages.stream."""
+        return dict(
+            model=self.config['model_name'],
+            max_tokens=max_tokens,  # Adjusted for shorter responses
+            system=system,
+            messages=messages,
+            extra_headers=self.config.get('anthropic_headers', {})
+        )
+
+    async def _make_api_call(self, system: str, messages: List[Dict[str, str]], max_tokens: int = ASSESSMENT_MAX_TOKENS) -> Message:
         """
         Make an API call to the Anthropic client.
 
         Args:
             system (str): The system message.
             messages (List[Dict[str, str]]): The list of messages for the conversation.
+            max_tokens (int): Output token limit for the response.
 
         Returns:
             Message: The response from the Anthropic API.
@@ -133,20 +308,20 @@ class InitialReview:
         """
         logger.info("Making API call to Anthropic for initial review")
         try:
-            response = self.client.messages.create(
-                model=self.config['model_name'],
-                max_tokens=1000,  # Adjusted for shorter responses
-                system=system,
-                messages=messages,
-                extra_headers=self.config.get('anthropic_headers', {})
-            )
-            logger.info("Initial review API call successful. Response: %s", json.dumps(response.model_dump()))
+            params = self._request_params(system, messages, max_tokens)
+            if isinstance(self.client, anthropic.AsyncAnthropic):
+                response = await self.client.messages.create(**params)
+            else:
+                response = await asyncio.to_thread(self.client.messages.create, **params)
+            # Dumping the whole response is only worth it when the log is written
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("Initial review API call successful. Response: %s", json.dumps(response.model_dump()))
             return response
         except Exception as e:
             logger.error("Error in initial review API call: %s", str(e))
             raise
 
-    def _parse_assessment(self, assessment_text: str) -> tuple:
+    def _parse_assessment(self, assessment_text: str) -> Tuple[tuple, bool]:
         """
         Parse the assessment text to extract scores and explanations.
 
@@ -154,20 +329,29 @@ class InitialReview:
             assessment_text (str): The text containing the assessment.
 
         Returns:
-            tuple: (user_score, user_explanation, ai_score, ai_explanation)
+            Tuple[tuple, bool]: (user_score, user_explanation, ai_score, ai_explanation), and whether
+            both scores were found. Missing scores are reported as 0.
         """
-        import re
+        # Error and empty responses carry no tags; skip the regex scans for them
+        if "<user_score>" not in assessment_text and "<ai_score>" not in assessment_text:
+            return (0, "", 0, ""), False
+
+        match = ASSESSMENT_RE.search(assessment_text)
+        if match:
+            user_score, user_explanation, ai_score, ai_explanation = match.groups()
+            return (int(user_score), user_explanation.strip(), int(ai_score), ai_explanation.strip()), True
 
-        user_score_match = re.search(r'<user_score>(\d+)</user_score>', assessment_text)
-        user_explanation_match = re.search(r'<user_explanation>(.*?)</user_explanation>', assessment_text, re.DOTALL)
-        ai_score_match = re.search(r'<ai_score>(\d+)</ai_score>', assessment_text)
-        ai_explanation_match = re.search(r'<ai_explanation>(.*?)</ai_explanation>', assessment_text, re.DOTALL)
+        user_score_match = USER_SCORE_RE.search(assessment_text)
+        user_explanation_match = USER_EXPLANATION_RE.search(assessment_text)
+        ai_score_match = AI_SCORE_RE.search(assessment_text)
+        ai_explanation_match = AI_EXPLANATION_RE.search(assessment_text)
 
         user_score = int(user_score_match.group(1)) if user_score_match else 0
         user_explanation = user_explanation_match.group(1).strip() if user_explanation_match else ""
         ai_score = int(ai_score_match.group(1)) if ai_score_match else 0
         ai_explanation = ai_explanation_match.group(1).strip() if ai_explanation_match else ""
 
-        return user_score, user_explanation, ai_score, ai_explanation
+        has_scores = user_score_match is not None and ai_score_match is not None
+        return (user_score, user_explanation, ai_score, ai_explanation), has_scores
 
 logger.info("initial_review.py module loaded")
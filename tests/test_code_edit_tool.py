@@ -0,0 +1,25 @@
+import os
+import tempfile
+import unittest
+
+from code_edit_tool import parse_search_replace_blocks, process_file
+
+
+class ProcessFileTest(unittest.TestCase):
+    def test_empty_reply_means_no_changes(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "example.py")
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write("print('hello')\n")
+            file = {"path": path, "content": "print('hello')\n", "instructions": "Leave it as it is"}
+
+            result = process_file(None, file, "Example project", {"interactive_mode": False},
+                                  parse_search_replace_blocks("[]"))
+
+            self.assertEqual(result["status"], "no_changes")
+            with open(path, encoding='utf-8') as f:
+                self.assertEqual(f.read(), "print('hello')\n")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,24 +3,238 @@ import sys
 import re
 import logging
 import datetime
-from typing import Dict, Any, List, Set, Tuple
+from typing import Dict, Any, FrozenSet, Iterator, List, Set, TextIO, Tuple, Optional
+from dataclasses import dataclass
 from pathlib import Path
 import fnmatch
 import ast
 import codecs
 import json
 import time
+import heapq
+import functools
+import itertools
+from collections import Counter, OrderedDict, deque
+from operator import itemgetter
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 
 from code_edit_tool import code_edit_tool
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# POSIX only; elsewhere review_and_update_progress falls back to a polled lock file
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    from charset_normalizer import from_bytes as detect_charset
+except ImportError:
+    detect_charset = None
+
 logger = logging.getLogger(__name__)
 
-def read_file_with_encoding(file_path: str) -> str:
+# Threads used by project_study and read_files_in_folder to overlap file reads;
+# the work is mostly I/O. CODAI_READ_MAX_WORKERS overrides the default, e.g.
+# 1 to read serially on slow network drives.
+DEFAULT_READ_MAX_WORKERS = min(32, (os.cpu_count() or 1) * 4)
+
+def _read_max_workers() -> int:
+    value = os.environ.get("CODAI_READ_MAX_WORKERS", "").strip()
+    if not value:
+        return DEFAULT_READ_MAX_WORKERS
+    try:
+        return max(1, int(value))
+    except ValueError:
+        logger.warning(f"Ignoring invalid CODAI_READ_MAX_WORKERS value: {value!r}")
+        return DEFAULT_READ_MAX_WORKERS
+
+READ_MAX_WORKERS = _read_max_workers()
+
+# project_study analyzes at least this many files in worker processes, where
+# the regex scans run on all cores; fewer aren't worth starting the processes
+STUDY_PROCESS_MIN_FILES = 64
+# Files sent to a worker process per task
+STUDY_PROCESS_CHUNK_SIZE = 16
+# Worker processes come from a fork server, which starts before the application's
+# threads do, so a worker never inherits a lock another thread was holding. This
+# module is preloaded there, so workers start without re-importing it; without a
+# fork server (Windows) the analysis stays on threads
+STUDY_PROCESS_CONTEXT = (
+    multiprocessing.get_context('forkserver') if 'forkserver' in multiprocessing.get_all_start_methods() else None
+)
+if STUDY_PROCESS_CONTEXT is not None:
+    STUDY_PROCESS_CONTEXT.set_forkserver_preload([__name__])
+
+# Files remembered by read_file_with_encoding, least recently used evicted first
+FILE_CONTENT_CACHE_SIZE = 256
+# Files larger than this many bytes are read every time instead of being cached
+FILE_CONTENT_CACHE_MAX_BYTES = 1024 * 1024
+
+# Contents returned by read_file_with_encoding, keyed by absolute path. An entry
+# is only reused while the file's mtime and size are unchanged.
+_file_content_cache: OrderedDict[str, Tuple[int, int, str]] = OrderedDict()
+# Files are read from worker threads, so reordering and eviction are serialised
+_file_content_cache_lock = threading.Lock()
+# Patterns returned by parse_gitignore, keyed and invalidated the same way
+_gitignore_cache: Dict[str, Tuple[int, int, FrozenSet[str]]] = {}
+# Steps expanded from action plan files by code_change_analysis_planner, likewise
+_action_plan_steps_cache: Dict[str, Tuple[int, int, List[Dict[str, str]]]] = {}
+# Parsed code change analysis progress files, keyed by absolute path and
+# invalidated on a change of inode, mtime or size. The inode is part of the key
+# because review_and_update_progress replaces the file instead of rewriting it.
+_progress_cache: Dict[str, Tuple[int, int, int, Dict[str, Dict[str, Any]]]] = {}
+
+# Bytes charset_normalizer inspects when a file is not valid UTF-8
+ENCODING_SNIFF_BYTES = 65536
+# Tried in order when charset_normalizer is not installed or cannot tell
+FALLBACK_ENCODINGS = ['utf-16', 'ascii', 'iso-8859-1', 'cp1252']
+# Byte order marks that identify the encoding outright. UTF-32 LE comes before
+# UTF-16 LE, whose mark is its prefix; the UTF-8 mark needs no entry since UTF-8
+# is tried first anyway.
+BYTE_ORDER_MARKS = [
+    (codecs.BOM_UTF32_LE, 'utf-32'),
+    (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+# Distinct .gitignore pattern combinations whose compiled IgnoreIndex is kept
+IGNORE_INDEX_CACHE_SIZE = 256
+# Recent file contents whose function/class line spans update_target keeps
+DEFINITION_SPANS_CACHE_SIZE = 32
+# AST nodes that can contain statements, and so function or class definitions
+STATEMENT_NODE_TYPES = (ast.stmt, ast.excepthandler, ast.match_case)
+# Line breaks as update_target counts them, matching content.split('\n')
+NEWLINE_RE = re.compile('\n')
+# Characters that make a .gitignore pattern a glob rather than a literal path
+GLOB_METACHARACTERS_RE = re.compile(r'[*?\[]')
+
+def write_json_file(file_path: str, data: Any) -> None:
+    """
+    Write data to file_path as indented JSON.
+
+    Uses orjson when it is installed, which serialises to UTF-8 bytes in C;
+    otherwise falls back to json.dumps. Either way the encoded document goes
+    to the file in a single write call.
+
+    Args:
+        file_path (str): The path of the JSON file to write.
+        data (Any): The JSON-serialisable data.
+    """
+    if orjson is not None:
+        with open(file_path, 'wb') as json_file:
+            json_file.write(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    else:
+        with open(file_path, 'w', encoding='utf-8') as json_file:
+            json_file.write(json.dumps(data, indent=2))
+
+def _json_string(value: str) -> str:
+    """Encode a string as a JSON string literal, as write_json_file would."""
+    if orjson is not None:
+        return orjson.dumps(value).decode('utf-8')
+    return json.dumps(value)
+
+def _json_indented(data: Any) -> str:
+    """Encode data as JSON indented by two spaces, as write_json_file would."""
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode('utf-8')
+    return json.dumps(data, indent=2)
+
+def read_json_file(file_path: str) -> Any:
+    """
+    Read a JSON file written by write_json_file.
+
+    Args:
+        file_path (str): The path of the JSON file to read.
+
+    Returns:
+        Any: The parsed data.
+    """
+    with open(file_path, 'rb') as json_file:
+        content = json_file.read()
+    return orjson.loads(content) if orjson is not None else json.loads(content)
+
+def invalidate_file_cache(file_path: str) -> None:
+    """
+    Drop any cached content for a file. Call this after writing to it.
+
+    Args:
+        file_path (str): The path of the file that was written.
+    """
+    with _file_content_cache_lock:
+        _file_content_cache.pop(os.path.abspath(file_path), None)
+
+def _decode_text(data: bytes, encoding: str, errors: str = 'strict', final: bool = True) -> str:
+    """
+    Decode bytes the way a text-mode open() would, with universal newlines.
+
+    When final is False a character cut off at the end of data is left out
+    instead of raising UnicodeDecodeError.
+    """
+    text = codecs.getincrementaldecoder(encoding)(errors).decode(data, final)
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
+def _decode_file_bytes(data: bytes, final: bool = True) -> Optional[Tuple[str, str]]:
+    """
+    Decode file contents, trying UTF-8 first and guessing the encoding otherwise.
+
+    Args:
+        data (bytes): The raw file contents, or a prefix of them.
+        final (bool): False if data is only a prefix of the file.
+
+    Returns:
+        Optional[Tuple[str, str]]: The text and the encoding used, or None if no encoding fits.
+    """
+    for bom, encoding in BYTE_ORDER_MARKS:
+        if data.startswith(bom):
+            try:
+                return _decode_text(data, encoding, final=final), encoding
+            except UnicodeError:
+                break  # Not really a byte order mark; detect as usual
+
+    try:
+        return _decode_text(data, 'utf-8', final=final), 'utf-8'
+    except UnicodeDecodeError:
+        pass
+
+    if detect_charset is not None:
+        best_match = detect_charset(data[:ENCODING_SNIFF_BYTES]).best()
+        if best_match is not None:
+            # The guess comes from a prefix, so undecodable bytes later on are replaced
+            return _decode_text(data, best_match.encoding, 'replace', final), best_match.encoding
+
+    for encoding in FALLBACK_ENCODINGS:
+        try:
+            return _decode_text(data, encoding, final=final), encoding
+        # utf-16 raises a plain UnicodeError for data without a byte order mark
+        except UnicodeError:
+            logger.warning(f"Failed to decode with {encoding} encoding. Trying next encoding.")
+    return None
+
+def read_file_with_encoding(file_path: str, max_chars: Optional[int] = None) -> str:
     """
     Attempt to read a file using multiple encodings.
+
+    The file is read once as bytes. A byte order mark selects the matching
+    UTF-16/UTF-32 codec directly; otherwise UTF-8 is tried first and the
+    encoding is guessed with charset_normalizer when it is installed, falling
+    back to trying a fixed list of encodings. Repeated reads of an unchanged
+    file are served from a cache after a single os.stat call.
     
     Args:
         file_path (str): The path to the file to be read.
+        max_chars (Optional[int]): Read at most this many characters. Partial reads, and files
+            over FILE_CONTENT_CACHE_MAX_BYTES, are not cached.
     
     Returns:
         str: The contents of the file.
@@ -28,19 +242,46 @@ def read_file_with_encoding(file_path: str) -> str:
     Raises:
         FileReadError: If the file cannot be read with any of the attempted encodings.
     """
-    encodings = ['utf-8', 'utf-16', 'ascii', 'iso-8859-1', 'cp1252']
+    cache_key = os.path.abspath(file_path)
+    try:
+        stat_result = os.stat(file_path)
+    except OSError as e:
+        logger.error(f"Error reading file {file_path}: {str(e)}")
+        raise FileReadError(f"Error reading file {file_path}: {str(e)}")
+
+    with _file_content_cache_lock:
+        cached = _file_content_cache.get(cache_key)
+        fresh = cached is not None and cached[0] == stat_result.st_mtime_ns and cached[1] == stat_result.st_size
+        if fresh:
+            _file_content_cache.move_to_end(cache_key)
+    if fresh:
+        logger.debug("Using cached content for unchanged file %s.", file_path)
+        return cached[2] if max_chars is None else cached[2][:max_chars]
     
-    for encoding in encodings:
-        try:
-            with open(file_path, 'r', encoding=encoding) as file:
-                content = file.read()
-            logger.info(f"Successfully read file {file_path} with {encoding} encoding.")
+    try:
+        with open(file_path, 'rb') as file:
+            # No character takes more than 4 bytes, so this covers max_chars; short
+            # reads still take a full sniffing window so the encoding guess is sound
+            read_limit = None if max_chars is None else max(max_chars * 4, ENCODING_SNIFF_BYTES)
+            data = file.read() if read_limit is None else file.read(read_limit)
+    except Exception as e:
+        logger.error(f"Error reading file {file_path}: {str(e)}")
+        raise FileReadError(f"Error reading file {file_path}: {str(e)}")
+
+    complete = read_limit is None or len(data) < read_limit
+    decoded = _decode_file_bytes(data, complete)
+    if decoded is not None:
+        content, encoding = decoded
+        logger.info("Successfully read file %s with %s encoding.", file_path, encoding)
+        if max_chars is None:
+            if stat_result.st_size <= FILE_CONTENT_CACHE_MAX_BYTES:
+                with _file_content_cache_lock:
+                    _file_content_cache[cache_key] = (stat_result.st_mtime_ns, stat_result.st_size, content)
+                    _file_content_cache.move_to_end(cache_key)
+                    if len(_file_content_cache) > FILE_CONTENT_CACHE_SIZE:
+                        _file_content_cache.popitem(last=False)
             return content
-        except UnicodeDecodeError:
-            logger.warning(f"Failed to read {file_path} with {encoding} encoding. Trying next encoding.")
-        except Exception as e:
-            logger.error(f"Error reading file {file_path}: {str(e)}")
-            raise FileReadError(f"Error reading file {file_path}: {str(e)}")
+        return content[:max_chars]
     
     error_msg = f"Unable to read file {file_path} with any of the attempted encodings."
     logger.error(error_msg)
@@ -55,26 +296,32 @@ def _list_files(tool_input: Dict[str, str]) -> Dict[str, Any]:
         logger.error(error_msg)
         return {"error": error_msg, "is_error": True}
     
-    items = os.listdir(path)
-    files = [f for f in items if os.path.isfile(os.path.join(path, f))]
-    folders = [f for f in items if os.path.isdir(os.path.join(path, f))]
+    # scandir gets the entry types from the directory listing, so only symlinks
+    # need a stat; sorting the names first leaves both lists in order
+    with os.scandir(path) as entries:
+        entries = sorted(entries, key=lambda entry: entry.name)
+    files, folders = [], []
+    for entry in entries:
+        if entry.is_dir():
+            folders.append(entry.name)
+        elif entry.is_file():
+            files.append(entry.name)
     
-    result = f"Contents of directory: {path}\n"
-    result += "=" * (24 + len(path)) + "\n"
+    # Collected as parts and joined once, rather than grown with += per entry
+    parts = [f"Contents of directory: {path}\n", "=" * (24 + len(path)) + "\n"]
     
     if not files and not folders:
-        result += "(Empty directory)\n"
+        parts.append("(Empty directory)\n")
     else:
         if folders:
-            result += "\nFolders:\n"
-            for folder in sorted(folders):
-                result += f"  📁 {folder}\n"
+            parts.append("\nFolders:\n")
+            parts.extend(f"  📁 {folder}\n" for folder in folders)
         if files:
-            result += "\nFiles:\n"
-            for file in sorted(files):
-                result += f"  📄 {file}\n"
+            parts.append("\nFiles:\n")
+            parts.extend(f"  📄 {file}\n" for file in files)
+    result = "".join(parts)
     
-    logger.info(f"list_files tool result: {result}")
+    logger.info("list_files tool result: %s", result)
     return {"result": result, "is_error": False}
 
 def _read_file(tool_input: Dict[str, str]) -> Dict[str, Any]:
@@ -94,7 +341,7 @@ def _read_file(tool_input: Dict[str, str]) -> Dict[str, Any]:
             "file_path": relative_path,
             "file_content": file_content
         }
-        logger.info(f"Successfully read file: {file_path}")
+        logger.info("Successfully read file: %s", file_path)
         return result
     except FileReadError as e:
         error_msg = str(e)
@@ -106,9 +353,16 @@ def _read_file(tool_input: Dict[str, str]) -> Dict[str, Any]:
         return {"error": error_msg, "is_error": True}
 
 def read_files_in_folder(tool_input: Dict[str, Any]) -> Dict[str, Any]:
-    """Read the contents of all files in the specified folder, with option to include subfolders."""
+    """
+    Read the contents of all files in the specified folder, with option to include subfolders.
+
+    Callers that only display the start of each file can pass "preview_chars"
+    to stop reading each file after that many characters. Files are read on a
+    thread pool so their reads overlap; results keep the directory order.
+    """
     folder_path = tool_input.get("folder_path", "")
     include_subfolders = tool_input.get("include_subfolders", False)
+    preview_chars = tool_input.get("preview_chars")
     root_dir = os.getcwd()  # Get the current working directory as root
     target_dir = os.path.join(root_dir, folder_path)
     
@@ -119,34 +373,51 @@ def read_files_in_folder(tool_input: Dict[str, Any]) -> Dict[str, Any]:
         logger.error(error_msg)
         return {"error": error_msg, "is_error": True}
     
-    results = {}
+    # Paths relative to root_dir are built from one relpath of target_dir, as
+    # everything below it only adds plain names
+    relative_prefix = _relative_prefix(target_dir, root_dir)
     if include_subfolders:
+        file_paths = []
+        relative_paths = []
+        target_prefix = os.path.join(target_dir, "")
         for root, _, files in os.walk(target_dir):
-            for file in files:
-                file_path = os.path.join(root, file)
-                _process_file(file_path, root_dir, results)
+            # One join per folder; the file names are simply appended
+            prefix = os.path.join(root, "")
+            relative_root = os.path.join(relative_prefix + root[len(target_prefix):], "")
+            file_paths.extend(prefix + file for file in files)
+            relative_paths.extend(relative_root + file for file in files)
     else:
-        for item in os.listdir(target_dir):
-            file_path = os.path.join(target_dir, item)
-            if os.path.isfile(file_path):
-                _process_file(file_path, root_dir, results)
+        with os.scandir(target_dir) as entries:
+            file_entries = [entry for entry in entries if entry.is_file()]
+        file_paths = [entry.path for entry in file_entries]
+        relative_paths = [relative_prefix + entry.name for entry in file_entries]
+
+    results = {}
+    if file_paths:
+        with ThreadPoolExecutor(max_workers=min(READ_MAX_WORKERS, len(file_paths)), thread_name_prefix="codai-read") as executor:
+            for relative_path, file_result in executor.map(_process_file, file_paths, relative_paths, itertools.repeat(preview_chars)):
+                results[relative_path] = file_result
     
     return {"results": results}
 
-def _process_file(file_path: str, root_dir: str, results: Dict[str, Any]) -> None:
-    """Helper function to process a single file and add it to the results."""
+def _relative_prefix(dir_path: str, root_dir: str) -> str:
+    """Return dir_path relative to root_dir with a trailing separator, or '' for root_dir itself."""
+    relative_dir = os.path.relpath(dir_path, root_dir)
+    return "" if relative_dir == os.curdir else relative_dir + os.sep
+
+def _process_file(file_path: str, relative_path: str, max_chars: Optional[int] = None) -> Tuple[str, Dict[str, Any]]:
+    """Helper function to read a single file, returning its relative path and result entry."""
     try:
-        file_content = read_file_with_encoding(file_path)
-        relative_path = os.path.relpath(file_path, root_dir)
-        results[relative_path] = {
+        file_content = read_file_with_encoding(file_path, max_chars)
+        logger.info("Successfully read file: %s", relative_path)
+        return relative_path, {
             "file_content": file_content,
             "is_error": False
         }
-        logger.info(f"Successfully read file: {relative_path}")
     except Exception as e:
         error_msg = f"An error occurred while reading file {relative_path}: {str(e)}"
         logger.error(error_msg, exc_info=True)
-        results[relative_path] = {"error": error_msg, "is_error": True}
+        return relative_path, {"error": error_msg, "is_error": True}
   
 def _create_file(tool_input: Dict[str, str]) -> Dict[str, Any]:
     """Create a new file with the specified content."""
@@ -157,6 +428,7 @@ def _create_file(tool_input: Dict[str, str]) -> Dict[str, Any]:
     try:
         with open(file_path, 'w', encoding='utf-8') as file:
             file.write(content)
+        invalidate_file_cache(file_path)
         logger.info(f"Successfully created file: {file_path}")
         return {"message": f"File created successfully: {file_path}", "is_error": False}
     except Exception as e:
@@ -195,29 +467,111 @@ def _create_folder(tool_input: Dict[str, str]) -> Dict[str, Any]:
             "folder_status": "error"
         }
 
-def parse_gitignore(gitignore_path: str) -> Set[str]:
-    """Parse .gitignore file and return a set of ignore patterns."""
+def parse_gitignore(gitignore_path: str) -> FrozenSet[str]:
+    """
+    Parse .gitignore file and return a set of ignore patterns.
+
+    Results are cached by path and reused while the file's mtime and size are
+    unchanged, so repeated project_structure runs don't re-read the same files.
+    """
+    try:
+        stat_result = os.stat(gitignore_path)
+    except OSError:
+        return frozenset()
+    cache_key = os.path.abspath(gitignore_path)
+    cached = _gitignore_cache.get(cache_key)
+    if cached and cached[0] == stat_result.st_mtime_ns and cached[1] == stat_result.st_size:
+        return cached[2]
+    
     ignore_patterns = set()
-    if os.path.exists(gitignore_path):
-        with open(gitignore_path, 'r') as gitignore_file:
-            for line in gitignore_file:
-                line = line.strip()
-                if line and not line.startswith('#'):
-                    # Preserve the original pattern, including any trailing slash
-                    ignore_patterns.add(line)
+    with open(gitignore_path, 'r') as gitignore_file:
+        for line in gitignore_file:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                # Preserve the original pattern, including any trailing slash
+                ignore_patterns.add(line)
+    # Frozen, since the same set is handed to every caller
+    ignore_patterns = frozenset(ignore_patterns)
+    _gitignore_cache[cache_key] = (stat_result.st_mtime_ns, stat_result.st_size, ignore_patterns)
     return ignore_patterns
 
-def should_ignore(path: str, root: str, ignore_patterns: Set[str]) -> bool:
-    """Check if a path should be ignored based on .gitignore rules."""
-    relative_path = os.path.relpath(path, root)
-    for pattern in ignore_patterns:
-        # Remove trailing slash if present
-        pattern = pattern.rstrip('/')
-        if fnmatch.fnmatch(relative_path, pattern) or \
-           fnmatch.fnmatch(relative_path, f"{pattern}/*") or \
-           fnmatch.fnmatch(os.path.basename(path), pattern):
+@dataclass(slots=True, frozen=True)
+class IgnoreIndex:
+    """.gitignore patterns bucketed by how cheaply they can be matched."""
+    literals: FrozenSet[str]  # Plain names and paths, matched by set lookup
+    suffixes: Tuple[str, ...]  # Tails of '*.ext' patterns, matched by str.endswith
+    path_re: Optional[re.Pattern]  # Remaining globs against the relative path (pattern or pattern/*)
+    name_re: Optional[re.Pattern]  # Remaining globs against the basename
+
+# Pattern sets are frozensets shared through the parse_gitignore cache, so each
+# distinct combination is compiled once per process rather than once per call
+@functools.lru_cache(maxsize=IGNORE_INDEX_CACHE_SIZE)
+def compile_ignore_patterns(ignore_patterns: FrozenSet[str]) -> IgnoreIndex:
+    """
+    Compile .gitignore patterns into the index used by should_ignore.
+
+    Literal names and '*.ext' patterns, usually most of a .gitignore, are matched
+    without regexes. The other globs are translated once and joined into a single
+    alternation, so checking a path is at most one regex run per form. Results
+    are cached per pattern set.
+
+    Args:
+        ignore_patterns (FrozenSet[str]): Patterns as returned by parse_gitignore.
+
+    Returns:
+        IgnoreIndex: The bucketed patterns.
+    """
+    literals = set()
+    suffixes = set()
+    path_alternatives = []
+    name_alternatives = []
+    for pattern in sorted(ignore_patterns):
+        # Remove trailing slash if present; normcase as fnmatch.fnmatch would
+        pattern = os.path.normcase(pattern.rstrip('/'))
+        if pattern and not GLOB_METACHARACTERS_RE.search(pattern):
+            literals.add(pattern)
+        elif pattern.startswith('*.') and not GLOB_METACHARACTERS_RE.search(pattern, 1):
+            suffixes.add(pattern[1:])
+        else:
+            name_alternatives.append(fnmatch.translate(pattern))
+            # The relative path matches the pattern itself or anything below it
+            path_alternatives.append(name_alternatives[-1])
+            path_alternatives.append(fnmatch.translate(f"{pattern}/*"))
+    return IgnoreIndex(
+        literals=frozenset(literals),
+        suffixes=tuple(sorted(suffixes, key=len, reverse=True)),
+        path_re=re.compile('|'.join(path_alternatives)) if path_alternatives else None,
+        name_re=re.compile('|'.join(name_alternatives)) if name_alternatives else None,
+    )
+
+def should_ignore(path: str, root: str, ignore_index: IgnoreIndex) -> bool:
+    """Check if a path should be ignored based on .gitignore rules compiled by compile_ignore_patterns."""
+    return _is_ignored(os.path.relpath(path, root), os.path.basename(path), ignore_index)
+
+def _is_ignored(relative_path: str, basename: str, ignore_index: IgnoreIndex) -> bool:
+    """
+    should_ignore for callers that already know the normalised relative path and
+    basename, as the directory walks do, which saves an os.path.relpath per entry.
+    """
+    relative_path = os.path.normcase(relative_path)
+    basename = os.path.normcase(basename)
+    literals = ignore_index.literals
+    suffixes = ignore_index.suffixes
+    if basename in literals or basename.endswith(suffixes):
+        return True
+    if literals or suffixes:
+        # A literal or '*.ext' pattern matches the path itself or any folder above it
+        sep_index = relative_path.find(os.sep)
+        while sep_index != -1:
+            parent = relative_path[:sep_index]
+            if parent in literals or parent.endswith(suffixes):
+                return True
+            sep_index = relative_path.find(os.sep, sep_index + 1)
+        if relative_path in literals or relative_path.endswith(suffixes):
             return True
-    return False
+    if ignore_index.path_re is None:
+        return False
+    return bool(ignore_index.path_re.match(relative_path) or ignore_index.name_re.match(basename))
 
 def read_exclude_dirs_from_file(file_path: str) -> Set[str]:
     """
@@ -235,11 +589,11 @@ def read_exclude_dirs_from_file(file_path: str) -> Set[str]:
         with open(file_path, 'r') as f:
             content = f.read()
         
-        # Split by both commas and newlines
-        dirs = re.split(r'[,\n]', content)
+        # Split by both commas and newlines, with plain str operations
+        dirs = content.replace(',', '\n').split('\n')
         
         # Strip whitespace and add non-empty directories to the set
-        exclude_dirs = {d.strip() for d in dirs if d.strip()}
+        exclude_dirs = {d for d in map(str.strip, dirs) if d}
         
     except Exception as e:
         logger.error(f"Error reading exclude directories file: {str(e)}")
@@ -256,7 +610,7 @@ def project_structure(tool_input: Dict[str, Any]) -> Dict[str, Any]:
             - folder_path (str): The relative path of the folder to analyze.
             - output_path (str, optional): The relative path for the output JSON file.
             - interactive (bool, optional): Whether to seek user approval. Defaults to True.
-            - exclude_dirs (List[str], optional): List of directories to exclude from traversal.
+            - exclude_dirs (List[str], optional): List of directories to exclude from traversal. Bare names are excluded at any depth.
             - user_interaction_callback (callable, optional): A function to handle user interactions when interactive is True.
             - include_ignored (bool, optional): Whether to include files and directories that would be ignored by .gitignore rules. Defaults to False.
 
@@ -267,6 +621,9 @@ def project_structure(tool_input: Dict[str, Any]) -> Dict[str, Any]:
     output_path = tool_input.get("output_path", "")
     interactive = tool_input.get("interactive", True)
     exclude_dirs = set(tool_input.get("exclude_dirs", []))
+    # Bare directory names (e.g. node_modules, .venv) are pruned at any depth;
+    # entries containing a path separator only match that relative path
+    excluded_dir_names = {d for d in exclude_dirs if '/' not in d and os.sep not in d}
     user_interaction_callback = tool_input.get("user_interaction_callback")
     include_ignored = tool_input.get("include_ignored", False)
     
@@ -283,9 +640,10 @@ def project_structure(tool_input: Dict[str, Any]) -> Dict[str, Any]:
     # Parse root .gitignore
     root_gitignore_path = os.path.join(root_dir, '.gitignore')
     root_ignore_patterns = parse_gitignore(root_gitignore_path)
+    root_ignore_index = compile_ignore_patterns(root_ignore_patterns)
     
     # Get list of directories to traverse, respecting .gitignore if include_ignored is False
-    dirs_to_traverse = get_dirs_respecting_gitignore(target_dir, root_dir, root_ignore_patterns, include_ignored)
+    dirs_to_traverse = get_dirs_respecting_gitignore(target_dir, root_dir, root_ignore_index, include_ignored)
     
     if interactive:
         gitignore_status = "ignored" if include_ignored else "respected"
@@ -326,44 +684,8 @@ def project_structure(tool_input: Dict[str, Any]) -> Dict[str, Any]:
                 else:
                     print("Invalid input. Please enter 'yes' or 'no'.")
     
-    exclude_dirs.update(set(d for d in os.listdir(target_dir) if os.path.isdir(os.path.join(target_dir, d)) and d not in dirs_to_traverse))
-    
-    def build_structure(dir_path: str, ignore_patterns: Set[str]) -> Dict[str, Any]:
-        structure = {"name": os.path.basename(dir_path), "type": "directory", "children": []}
-        
-        # Parse folder-specific .gitignore and combine with root ignore patterns
-        local_gitignore_path = os.path.join(dir_path, '.gitignore')
-        local_ignore_patterns = parse_gitignore(local_gitignore_path)
-        combined_ignore_patterns = ignore_patterns.union(local_ignore_patterns)
-        
-        try:
-            items = os.listdir(dir_path)
-            for item in items:
-                item_path = os.path.join(dir_path, item)
-                rel_path = os.path.relpath(item_path, target_dir)
-                
-                if include_ignored or not should_ignore(rel_path, root_dir, combined_ignore_patterns):
-                    if rel_path not in exclude_dirs:
-                        if os.path.isdir(item_path):
-                            child_structure = build_structure(item_path, combined_ignore_patterns)
-                            structure["children"].append(child_structure)
-                        else:
-                            structure["children"].append({"name": item, "type": "file"})
-        except Exception as e:
-            logger.error(f"Error processing directory {dir_path}: {str(e)}")
-            structure["error"] = str(e)
-        
-        return structure
-    
-    project_structure = build_structure(target_dir, root_ignore_patterns)
-    
-    # Add summary information
-    project_structure["summary"] = {
-        "total_files": sum(1 for item in project_structure["children"] if item["type"] == "file"),
-        "total_directories": sum(1 for item in project_structure["children"] if item["type"] == "directory"),
-        "traversed_directories": dirs_to_traverse,
-        "excluded_directories": list(exclude_dirs)
-    }
+    with os.scandir(target_dir) as entries:
+        exclude_dirs.update(entry.name for entry in entries if entry.is_dir() and entry.name not in dirs_to_traverse)
     
     # Determine the output file path
     if not output_path:
@@ -371,35 +693,144 @@ def project_structure(tool_input: Dict[str, Any]) -> Dict[str, Any]:
     else:
         output_path = os.path.join(root_dir, output_path)
     
+    # The JSON is written while the tree is walked, so the output file and any
+    # folders created for it already exist during the walk; they are left out
+    # unless they existed beforehand
+    new_output_paths = set()
+    missing_path = os.path.abspath(output_path)
+    while not os.path.exists(missing_path) and missing_path != os.path.dirname(missing_path):
+        new_output_paths.add(os.path.normcase(missing_path))
+        missing_path = os.path.dirname(missing_path)
+    new_output_names = {os.path.basename(new_path) for new_path in new_output_paths}
+    
     # Ensure the directory for the output file exists
     os.makedirs(os.path.dirname(output_path), exist_ok=True)
     
+    def write_structure(json_file: TextIO, dir_path: str, rel_dir: str, ignore_patterns: FrozenSet[str],
+                        ignore_index: IgnoreIndex, indent: str) -> Tuple[int, int]:
+        """
+        Write a directory's JSON object, without its closing brace, and return
+        the number of files and directories directly inside it.
+        """
+        inner = indent + "  "
+        json_file.write(f'{indent}{{\n{inner}"name": {_json_string(os.path.basename(dir_path))},\n'
+                        f'{inner}"type": "directory",\n{inner}"children": [')
+        # Only this directory's entries are held in memory, never the whole tree
+        children = []
+        error = None
+        combined_ignore_patterns = ignore_patterns
+        try:
+            # scandir reports the entry type from the directory listing itself,
+            # so is_dir() needs no extra stat call except for symlinks
+            with os.scandir(dir_path) as entries:
+                entries = list(entries)
+            
+            # Parse folder-specific .gitignore and combine with root ignore patterns.
+            # The listing shows whether there is one, so most folders need no
+            # further syscall, and they share the parent's patterns and matcher.
+            if any(entry.name == '.gitignore' for entry in entries):
+                local_ignore_patterns = parse_gitignore(os.path.join(dir_path, '.gitignore'))
+                if local_ignore_patterns - ignore_patterns:
+                    combined_ignore_patterns = ignore_patterns.union(local_ignore_patterns)
+                    ignore_index = compile_ignore_patterns(combined_ignore_patterns)
+            for entry in entries:
+                item = entry.name
+                # Relative to target_dir, built up during the descent instead of via
+                # os.path.relpath; rel_dir never ends in a separator, so no join is needed
+                rel_path = f"{rel_dir}{os.sep}{item}" if rel_dir else item
+                
+                # Cheap set lookups first, so excluded subtrees are dropped
+                # before any pattern matching or descent; bare names only
+                # exclude directories, and is_dir() comes from the listing
+                if rel_path in exclude_dirs or (item in excluded_dir_names and entry.is_dir()):
+                    continue
+                if not include_ignored and _is_ignored(rel_path, item, ignore_index):
+                    continue
+                if item in new_output_names and os.path.normcase(os.path.abspath(entry.path)) in new_output_paths:
+                    continue
+                if entry.is_dir():
+                    children.append((item, entry.path, rel_path, True))
+                else:
+                    children.append((item, entry.path, rel_path, False))
+        except Exception as e:
+            logger.error(f"Error processing directory {dir_path}: {str(e)}")
+            error = str(e)
+        
+        file_count = 0
+        child_indent = inner + "  "
+        for index, (item, child_path, rel_path, is_dir) in enumerate(children):
+            json_file.write(",\n" if index else "\n")
+            if is_dir:
+                write_structure(json_file, child_path, rel_path, combined_ignore_patterns, ignore_index, child_indent)
+                json_file.write(f"\n{child_indent}}}")
+            else:
+                json_file.write(f'{child_indent}{{\n{child_indent}  "name": {_json_string(item)},\n'
+                                f'{child_indent}  "type": "file"\n{child_indent}}}')
+                file_count += 1
+        json_file.write(f"\n{inner}]" if children else "]")
+        if error is not None:
+            json_file.write(f',\n{inner}"error": {_json_string(error)}')
+        return file_count, len(children) - file_count
+    
     # Create the JSON file
     try:
-        with open(output_path, 'w') as json_file:
-            json.dump(project_structure, json_file, indent=2)
+        with open(output_path, 'w', encoding='utf-8') as json_file:
+            total_files, total_directories = write_structure(
+                json_file, target_dir, "", root_ignore_patterns, root_ignore_index, "")
+            
+            # Add summary information
+            summary = {
+                "total_files": total_files,
+                "total_directories": total_directories,
+                "traversed_directories": dirs_to_traverse,
+                "excluded_directories": list(exclude_dirs)
+            }
+            summary_json = _json_indented(summary).replace("\n", "\n  ")
+            json_file.write(f',\n  "summary": {summary_json}\n}}')
         
         logger.info(f"Project structure JSON file created: {output_path}")
         return {
             "json_file_path": output_path,
             "is_error": False,
-            "summary": project_structure["summary"]
+            "summary": summary
         }
     except Exception as e:
         error_msg = f"Error creating JSON file: {str(e)}"
         logger.error(error_msg)
         return {"error": error_msg, "is_error": True}
     
-def get_dirs_respecting_gitignore(dir_path: str, root_dir: str, ignore_patterns: Set[str], include_ignored: bool) -> List[str]:
+def get_dirs_respecting_gitignore(dir_path: str, root_dir: str, ignore_index: IgnoreIndex, include_ignored: bool) -> List[str]:
     dirs = []
-    for item in os.listdir(dir_path):
-        item_path = os.path.join(dir_path, item)
-        if os.path.isdir(item_path):
-            relative_path = os.path.relpath(item_path, root_dir)
-            if include_ignored or not should_ignore(relative_path, root_dir, ignore_patterns):
-                dirs.append(item)
+    # relpath once for the folder; each entry's relative path is then that plus its name
+    relative_prefix = _relative_prefix(dir_path, root_dir)
+    with os.scandir(dir_path) as entries:
+        for entry in entries:
+            if entry.is_dir():
+                if include_ignored or not _is_ignored(relative_prefix + entry.name, entry.name, ignore_index):
+                    dirs.append(entry.name)
     return dirs
 
+def _analyze_files(file_paths: List[str]) -> List[Dict[str, Any]]:
+    """
+    Run analyze_file on each path, in worker processes when there are enough files.
+
+    Args:
+        file_paths (List[str]): Absolute paths of the files to analyze.
+
+    Returns:
+        List[Dict[str, Any]]: The analyses, in the order of file_paths.
+    """
+    cpu_count = os.cpu_count() or 1
+    if STUDY_PROCESS_CONTEXT is not None and cpu_count > 1 and len(file_paths) >= STUDY_PROCESS_MIN_FILES:
+        try:
+            # Only paths go to the workers; each reads its own files
+            with ProcessPoolExecutor(max_workers=cpu_count, mp_context=STUDY_PROCESS_CONTEXT) as executor:
+                return list(executor.map(analyze_file, file_paths, chunksize=STUDY_PROCESS_CHUNK_SIZE))
+        except BrokenProcessPool as e:
+            logger.warning(f"Worker processes failed during project analysis, retrying on threads: {str(e)}")
+    with ThreadPoolExecutor(max_workers=min(READ_MAX_WORKERS, len(file_paths)), thread_name_prefix="codai-study") as executor:
+        return list(executor.map(analyze_file, file_paths))
+
 def project_study(tool_input: Dict[str, Any]) -> Dict[str, Any]:
     project_root = tool_input.get("project_root", ".")
     folder_path = tool_input.get("folder_path", "")
@@ -428,8 +859,7 @@ def project_study(tool_input: Dict[str, Any]) -> Dict[str, Any]:
         }
     
     # Load project structure data
-    with open(abs_structure_file_path, 'r') as f:
-        project_structure_data = json.load(f)
+    project_structure_data = read_json_file(abs_structure_file_path)
     
     # Initialize project data
     project_data = {
@@ -440,12 +870,16 @@ def project_study(tool_input: Dict[str, Any]) -> Dict[str, Any]:
         "summary": {}
     }
     
-    # Analyze files
-    for file_info in project_structure_data.get("children", []):
-        if file_info["type"] == "file":
-            rel_file_path = os.path.join(folder_path, file_info["name"])
-            abs_file_path = os.path.join(abs_project_root, rel_file_path)
-            file_analysis = analyze_file(abs_file_path)
+    # Analyze files. Each analysis only touches its own file and analyzer, so
+    # they run concurrently; results keep the structure order.
+    rel_file_paths = [
+        os.path.join(folder_path, file_info["name"])
+        for file_info in project_structure_data.get("children", [])
+        if file_info["type"] == "file"
+    ]
+    if rel_file_paths:
+        abs_file_paths = [os.path.join(abs_project_root, rel_file_path) for rel_file_path in rel_file_paths]
+        for rel_file_path, file_analysis in zip(rel_file_paths, _analyze_files(abs_file_paths)):
             project_data["files"][rel_file_path] = file_analysis
             project_data["functions"].extend(file_analysis["functions"])
             project_data["imports"].extend(file_analysis["imports"])
@@ -459,8 +893,7 @@ def project_study(tool_input: Dict[str, Any]) -> Dict[str, Any]:
     # Save the project data to a JSON file
     output_path = os.path.join(folder_path, output_file)
     abs_output_path = os.path.join(abs_project_root, output_path)
-    with open(abs_output_path, 'w', encoding='utf-8') as f:
-        json.dump(project_data, f, indent=2)
+    write_json_file(abs_output_path, project_data)
     
     return {
         "status": "success",
@@ -473,33 +906,99 @@ def project_study(tool_input: Dict[str, Any]) -> Dict[str, Any]:
         }
     }
 
+# An import statement: optional "from <module>", then either a parenthesised
+# name list (which may span lines) or the rest of the line up to a comment or
+# ';', following backslash continuations
+IMPORT_STATEMENT_RE = re.compile(
+    r'^[ \t]*(?:from[ \t]+(\S+)[ \t]+)?import[ \t]+(\([^)]*\)|(?:[^\n#;\\]|\\\n)+)',
+    re.MULTILINE
+)
+IMPORT_SEPARATOR_RE = re.compile(r'\s*,\s*')
+# Comments inside a parenthesised name list
+IMPORT_COMMENT_RE = re.compile(r'#[^\n]*')
+STDLIB_MODULE_NAMES = frozenset(sys.stdlib_module_names)
+
+# Characters other than \n that str.splitlines treats as line boundaries
+LINE_BOUNDARY_RE = re.compile('[\r\x0b\x0c\x1c\x1d\x1e\x85\u2028\u2029]')
+
+# Analyzer patterns, matched over the whole file. [^\S\n] is whitespace other
+# than a newline, which keeps every match within a single line.
+PY_IMPORT_RE = re.compile(r'^[^\S\n]*(?:from[^\S\n]+(\S+)[^\S\n]+)?import[^\S\n]+(.*\S)', re.MULTILINE)
+PY_FUNCTION_RE = re.compile(r'^[^\S\n]*def[^\S\n]+(\w+)[^\S\n]*\((.*?)\):', re.MULTILINE)
+JS_IMPORT_RE = re.compile(r'^[^\S\n]*(?:import|export)[^\S\n]+(.+?)[^\S\n]+from[^\S\n]+[\'"](.+?)[\'"]', re.MULTILINE)
+JS_FUNCTION_RE = re.compile(
+    r'^[^\S\n]*(?:function[^\S\n]+(\w+)|(?:let|const)[^\S\n]+(\w+)[^\S\n]*=[^\S\n]*(?:function|\([^)\n]*\)[^\S\n]*=>))',
+    re.MULTILINE
+)
+# C# using statements, or ASP.NET Import directives
+CS_IMPORT_RE = re.compile(
+    r'^[^\S\n]*(?:using[^\S\n]+([\w.]+)[^\S\n]*;|<%@[^\S\n]*Import[^\S\n]+Namespace[^\S\n]*=[^\S\n]*"([\w.]+)"[^\S\n]*%>)',
+    re.MULTILINE
+)
+# C# methods; ASP.NET code-behind handlers ("protected void X(...) {") match it too
+CS_METHOD_RE = re.compile(
+    r'(public|private|protected|internal|static)?[^\S\n]*[\w<>[\]]+[^\S\n]+(\w+)[^\S\n]*\([^)\n]*\)[^\S\n]*{'
+)
+
+def _iter_matches_with_lines(pattern: re.Pattern, content: str) -> Iterator[Tuple[int, re.Match]]:
+    """Yield (line_number, match) for each match, counting newlines between matches only once."""
+    line = 1
+    position = 0
+    for match in pattern.finditer(content):
+        line += content.count('\n', position, match.start())
+        position = match.start()
+        yield line, match
+
 def analyze_imports(content: str) -> List[Dict[str, Any]]:
-    tree = ast.parse(content)
+    """
+    List the import statements of Python source with one regex pass.
+
+    Unlike a full parse this also works on files with syntax errors, at the
+    cost of also matching import lines inside strings.
+    """
     imports = []
-    
-    for node in ast.walk(tree):
-        if isinstance(node, (ast.Import, ast.ImportFrom)):
-            for alias in node.names:
-                import_info = {
-                    "name": alias.name,
-                    "alias": alias.asname,
-                    "type": "standard" if alias.name in sys.stdlib_module_names else "third-party",
-                    "from_import": isinstance(node, ast.ImportFrom),
-                    "module": node.module if isinstance(node, ast.ImportFrom) else None,
-                    "line": node.lineno
-                }
-                
-                # Check if it's a local import
-                if import_info["type"] == "third-party":
-                    if import_info["from_import"] and import_info["module"] and "." in import_info["module"]:
-                        import_info["type"] = "local"
-                    elif not import_info["from_import"] and "." in import_info["name"]:
-                        import_info["type"] = "local"
-                
-                imports.append(import_info)
+
+    for line, match in _iter_matches_with_lines(IMPORT_STATEMENT_RE, content):
+        from_module, imported_items = match.groups()
+        # Relative imports have no module name beyond the leading dots
+        module = (from_module.lstrip('.') or None) if from_module else None
+        imported_items = IMPORT_COMMENT_RE.sub('', imported_items).replace('\\\n', ' ').strip('()')
+
+        for item in imported_items.split(','):
+            name, _, alias = item.strip().partition(' as ')
+            name = name.strip()
+            if not name:
+                continue
+            import_info = {
+                "name": name,
+                "alias": alias.strip() or None,
+                "type": "standard" if name in STDLIB_MODULE_NAMES else "third-party",
+                "from_import": from_module is not None,
+                "module": module,
+                "line": line
+            }
+            
+            # Check if it's a local import
+            if import_info["type"] == "third-party":
+                if import_info["from_import"] and import_info["module"] and "." in import_info["module"]:
+                    import_info["type"] = "local"
+                elif not import_info["from_import"] and "." in import_info["name"]:
+                    import_info["type"] = "local"
+            
+            imports.append(import_info)
     
     return imports
 
+def _count_lines(content: str) -> int:
+    """Return len(content.splitlines()) without building the list of lines."""
+    if LINE_BOUNDARY_RE.search(content):
+        # Line breaks other than \n are rare; leave them to splitlines
+        return len(content.splitlines())
+    line_count = content.count('\n')
+    if content and not content.endswith('\n'):
+        line_count += 1  # Last line without a trailing newline
+    return line_count
+
 class BaseAnalyzer:
     def analyze_imports(self, content: str) -> List[Dict[str, Any]]:
         return []
@@ -507,75 +1006,74 @@ class BaseAnalyzer:
     def analyze_functions(self, content: str) -> List[Dict[str, Any]]:
         return []
 
-    def analyze_file(self, file_path: str) -> Dict[str, Any]:
-        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
-            content = f.read()
+    def analyze_file(self, file_path: str, content: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Analyze a file's imports and functions.
+
+        Args:
+            file_path (str): Path of the file.
+            content (Optional[str]): The file's text if the caller has already read it;
+                otherwise the file is read here.
+
+        Returns:
+            Dict[str, Any]: Size, line count, imports and functions of the file.
+        """
+        if content is None:
+            with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+                content = f.read()
 
         return {
             "size_bytes": len(content),
-            "line_count": len(content.splitlines()),
+            "line_count": _count_lines(content),
             "imports": self.analyze_imports(content),
             "functions": self.analyze_functions(content)
         }
 
 class PythonAnalyzer(BaseAnalyzer):
     def analyze_imports(self, content: str) -> List[Dict[str, Any]]:
-        import_pattern = r'^(?:from\s+(\S+)\s+)?import\s+(.+)$'
         imports = []
-        for line_num, line in enumerate(content.splitlines(), 1):
-            match = re.match(import_pattern, line.strip())
-            if match:
-                from_module, imported_items = match.groups()
-                for item in re.split(r'\s*,\s*', imported_items):
-                    name, _, alias = item.partition(' as ')
-                    imports.append({
-                        "name": name.strip(),
-                        "alias": alias.strip() or None,
-                        "from_module": from_module,
-                        "line": line_num
-                    })
+        for line_num, match in _iter_matches_with_lines(PY_IMPORT_RE, content):
+            from_module, imported_items = match.groups()
+            for item in IMPORT_SEPARATOR_RE.split(imported_items):
+                name, _, alias = item.partition(' as ')
+                imports.append({
+                    "name": name.strip(),
+                    "alias": alias.strip() or None,
+                    "from_module": from_module,
+                    "line": line_num
+                })
         return imports
 
     def analyze_functions(self, content: str) -> List[Dict[str, Any]]:
-        function_pattern = r'^def\s+(\w+)\s*\((.*?)\):'
         functions = []
-        for line_num, line in enumerate(content.splitlines(), 1):
-            match = re.match(function_pattern, line.strip())
-            if match:
-                name, params = match.groups()
-                functions.append({
-                    "name": name,
-                    "parameters": [p.strip() for p in params.split(',') if p.strip()],
-                    "line_number": line_num
-                })
+        for line_num, match in _iter_matches_with_lines(PY_FUNCTION_RE, content):
+            name, params = match.groups()
+            functions.append({
+                "name": name,
+                "parameters": [p.strip() for p in params.split(',') if p.strip()],
+                "line_number": line_num
+            })
         return functions
 
 class JavaScriptAnalyzer(BaseAnalyzer):
     def analyze_imports(self, content: str) -> List[Dict[str, Any]]:
-        import_pattern = r'^(?:import|export)\s+(.+?)\s+from\s+[\'"](.+?)[\'"]'
         imports = []
-        for line_num, line in enumerate(content.splitlines(), 1):
-            match = re.match(import_pattern, line.strip())
-            if match:
-                imported_items, module = match.groups()
-                imports.append({
-                    "name": imported_items.strip('{}'),
-                    "from_module": module,
-                    "line": line_num
-                })
+        for line_num, match in _iter_matches_with_lines(JS_IMPORT_RE, content):
+            imported_items, module = match.groups()
+            imports.append({
+                "name": imported_items.strip('{}'),
+                "from_module": module,
+                "line": line_num
+            })
         return imports
 
     def analyze_functions(self, content: str) -> List[Dict[str, Any]]:
-        function_pattern = r'^(?:function\s+(\w+)|(?:let|const)\s+(\w+)\s*=\s*(?:function|\([^)]*\)\s*=>))'
         functions = []
-        for line_num, line in enumerate(content.splitlines(), 1):
-            match = re.match(function_pattern, line.strip())
-            if match:
-                name = match.group(1) or match.group(2)
-                functions.append({
-                    "name": name,
-                    "line_number": line_num
-                })
+        for line_num, match in _iter_matches_with_lines(JS_FUNCTION_RE, content):
+            functions.append({
+                "name": match.group(1) or match.group(2),
+                "line_number": line_num
+            })
         return functions
 
 class GenericAnalyzer(BaseAnalyzer):
@@ -592,52 +1090,58 @@ def get_analyzer(file_path: str) -> BaseAnalyzer:
     else:
         return GenericAnalyzer()
 
-def analyze_file(file_path: str) -> Dict[str, Any]:
+def analyze_file(file_path: str, content: Optional[str] = None) -> Dict[str, Any]:
     analyzer = get_analyzer(file_path)
-    return analyzer.analyze_file(file_path)
+    return analyzer.analyze_file(file_path, content)
 class CSharpAnalyzer(BaseAnalyzer):
     def analyze_imports(self, content: str) -> List[Dict[str, Any]]:
         imports = []
-        # C# using statements
-        using_pattern = r'^using\s+([\w.]+)\s*;'
-        # ASP.NET Import directives
-        import_directive_pattern = r'<%@\s*Import\s+Namespace\s*=\s*"([\w.]+)"\s*%>'
-        
-        for line_num, line in enumerate(content.splitlines(), 1):
-            match = re.match(using_pattern, line.strip()) or re.match(import_directive_pattern, line.strip())
-            if match:
-                imports.append({
-                    "name": match.group(1),
-                    "line": line_num
-                })
+        for line_num, match in _iter_matches_with_lines(CS_IMPORT_RE, content):
+            imports.append({
+                "name": match.group(1) or match.group(2),
+                "line": line_num
+            })
         return imports
 
     def analyze_functions(self, content: str) -> List[Dict[str, Any]]:
         functions = []
-        # C# method pattern
-        method_pattern = r'(public|private|protected|internal|static)?\s*[\w<>[\]]+\s+(\w+)\s*\([^)]*\)\s*{'
-        # ASP.NET code-behind method pattern
-        codebehind_pattern = r'protected\s+void\s+(\w+)\s*\([^)]*\)\s*{'
-        
-        for line_num, line in enumerate(content.splitlines(), 1):
-            match = re.search(method_pattern, line) or re.search(codebehind_pattern, line)
-            if match:
+        last_line = 0
+        for line_num, match in _iter_matches_with_lines(CS_METHOD_RE, content):
+            # Only the first method on each line is reported
+            if line_num != last_line:
                 functions.append({
-                    "name": match.group(2) if match.group(2) else match.group(1),
+                    "name": match.group(2),
                     "line_number": line_num
                 })
+                last_line = line_num
         return functions
 
 def generate_relations(files: Dict[str, Any]) -> List[Dict[str, str]]:
-    """Generate relations between files based on imports."""
+    """
+    Generate relations between files based on imports.
+
+    A file is related to every other file that defines a function with the
+    name it imports. Each (from, to) pair is reported once.
+    """
+    # Function name -> files defining it, so each import is a single lookup
+    function_owners: Dict[str, List[str]] = {}
+    for file_name, file_data in files.items():
+        for func in file_data["functions"]:
+            owners = function_owners.setdefault(func["name"], [])
+            if not owners or owners[-1] != file_name:
+                owners.append(file_name)
+
     relations = []
+    seen: Set[Tuple[str, str]] = set()
     for file_name, file_data in files.items():
         for imp in file_data["imports"]:
-            for other_file, other_data in files.items():
-                if file_name != other_file and any(func["name"] in imp for func in other_data["functions"]):
+            imported_name = imp.get("name") or imp.get("module") or ""
+            for owner in function_owners.get(imported_name.rsplit('.', 1)[-1], ()):
+                if owner != file_name and (file_name, owner) not in seen:
+                    seen.add((file_name, owner))
                     relations.append({
                         "from": file_name,
-                        "to": other_file,
+                        "to": owner,
                         "type": "import"
                     })
     return relations
@@ -656,21 +1160,16 @@ def generate_summary(project_data: Dict[str, Any]) -> Dict[str, Any]:
 
 def count_file_types(files: Dict[str, Any]) -> Dict[str, int]:
     """Count the number of files of each type."""
-    file_types = {}
-    for file_name in files:
-        ext = os.path.splitext(file_name)[1].lower() or 'unknown'
-        file_types[ext] = file_types.get(ext, 0) + 1
-    return file_types
+    return dict(Counter(os.path.splitext(file_name)[1].lower() or 'unknown' for file_name in files))
 
 def get_largest_files(files: Dict[str, Any], n: int) -> List[Tuple[str, int]]:
     """Get the n largest files by size."""
-    return sorted([(name, data["size_bytes"]) for name, data in files.items()], 
-                  key=lambda x: x[1], reverse=True)[:n]
+    # Same result as sorting and slicing, ties included, without sorting every file
+    return heapq.nlargest(n, ((name, data["size_bytes"]) for name, data in files.items()), key=itemgetter(1))
 
 def get_most_complex_files(files: Dict[str, Any], n: int) -> List[Tuple[str, int]]:
     """Get the n most complex files based on the number of functions."""
-    return sorted([(name, len(data["functions"])) for name, data in files.items()], 
-                  key=lambda x: x[1], reverse=True)[:n]
+    return heapq.nlargest(n, ((name, len(data["functions"])) for name, data in files.items()), key=itemgetter(1))
 
 def intelligent_edit(tool_input: Dict[str, Any]) -> Dict[str, Any]:
     """
@@ -695,9 +1194,12 @@ def intelligent_edit(tool_input: Dict[str, Any]) -> Dict[str, Any]:
     mode = tool_input.get("mode", "replace")
 
     try:
-        # Read the original content of the file, handling BOM if present
-        with codecs.open(file_path, 'r', encoding='utf-8-sig') as file:
-            original_content = file.read()
+        # Read the original content of the file, handling BOM if present. One
+        # binary read and decode, instead of codecs.open's chunked StreamReader
+        with open(file_path, 'rb') as file:
+            original_bytes = file.read()
+        had_bom = original_bytes.startswith(codecs.BOM_UTF8)
+        original_content = original_bytes.decode('utf-8-sig')
 
         if target:
             # Update a specific target (function or class) within the file
@@ -713,9 +1215,14 @@ def intelligent_edit(tool_input: Dict[str, Any]) -> Dict[str, Any]:
             else:
                 return {"error": f"Invalid mode: {mode}", "is_error": True}
 
-        # Write the updated content back to the file, preserving BOM if it was present
-        with codecs.open(file_path, 'w', encoding='utf-8-sig') as file:
-            file.write(updated_content)
+        # Write the updated content back to the file, preserving BOM if it was present.
+        # Encoded up front, so the file gets a single write call
+        encoded_content = updated_content.encode('utf-8')
+        if had_bom:
+            encoded_content = codecs.BOM_UTF8 + encoded_content
+        with open(file_path, 'wb') as file:
+            file.write(encoded_content)
+        invalidate_file_cache(file_path)
 
         return {
             "message": f"File {file_path} updated successfully.",
@@ -728,6 +1235,54 @@ def intelligent_edit(tool_input: Dict[str, Any]) -> Dict[str, Any]:
     except Exception as e:
         return {"error": f"An error occurred: {str(e)}", "is_error": True}
 
+@functools.lru_cache(maxsize=DEFINITION_SPANS_CACHE_SIZE)
+def _definition_spans(content: str) -> Dict[str, Tuple[Optional[int], Optional[int]]]:
+    """
+    Map each function and class name in Python source to the character offsets of its lines.
+
+    The source is parsed and walked once; when a name is defined more than once
+    the first definition in ast.walk order wins. Results are cached by content,
+    so repeated edits against the same source skip the parse.
+
+    Args:
+        content (str): The Python source.
+
+    Returns:
+        Dict[str, Tuple[Optional[int], Optional[int]]]: Per name, the offset where its
+            first line starts and where the line after its last one starts. None stands
+            for a line past the end of the content.
+
+    Raises:
+        SyntaxError: If the source cannot be parsed.
+    """
+    line_starts = [0]
+    line_starts.extend(match.end() for match in NEWLINE_RE.finditer(content))
+
+    def line_offset(line: int) -> Optional[int]:
+        return line_starts[line] if line < len(line_starts) else None
+
+    spans = {}
+    # Breadth-first like ast.walk, so the same definition wins, but only through
+    # nodes that can hold statements; expressions never contain a def or class
+    pending = deque([ast.parse(content)])
+    while pending:
+        node = pending.popleft()
+        if isinstance(node, (ast.FunctionDef, ast.ClassDef)) and node.name not in spans:
+            spans[node.name] = (line_offset(node.lineno - 1), line_offset(node.end_lineno))
+        pending.extend(child for child in ast.iter_child_nodes(node) if isinstance(child, STATEMENT_NODE_TYPES))
+    return spans
+
+def _splice_at_line(content: str, new_content: str, head_end: Optional[int], tail_start: Optional[int]) -> str:
+    """
+    Put new_content on its own lines between content[:head_end] and content[tail_start:].
+
+    Gives the same result as replacing lines in content.split('\n') and joining
+    them again, without building the list of lines. Offsets come from _definition_spans.
+    """
+    head = content + '\n' if head_end is None else content[:head_end]
+    tail = '' if tail_start is None else '\n' + content[tail_start:]
+    return head + new_content + tail
+
 def update_target(content: str, new_content: str, target: str, mode: str) -> str:
     """
     Update a specific function or class within the file content.
@@ -744,19 +1299,16 @@ def update_target(content: str, new_content: str, target: str, mode: str) -> str
     Raises:
         ValueError: If the target is not found in the file.
     """
-    tree = ast.parse(content)
-    for node in ast.walk(tree):
-        if isinstance(node, (ast.FunctionDef, ast.ClassDef)) and node.name == target:
-            start_line = node.lineno - 1
-            end_line = node.end_lineno
-            lines = content.split('\n')
-            if mode == "replace":
-                lines[start_line:end_line] = new_content.split('\n')
-            elif mode == "append":
-                lines[end_line:end_line] = new_content.split('\n')
-            elif mode == "prepend":
-                lines[start_line:start_line] = new_content.split('\n')
-            return '\n'.join(lines)
+    target_span = _definition_spans(content).get(target)
+    if target_span is not None:
+        start, end = target_span
+        if mode == "replace":
+            return _splice_at_line(content, new_content, start, end)
+        elif mode == "append":
+            return _splice_at_line(content, new_content, end, end)
+        elif mode == "prepend":
+            return _splice_at_line(content, new_content, start, start)
+        return content
     
     raise ValueError(f"Target {target} not found in the file.")
 
@@ -782,6 +1334,88 @@ def get_current_datetime(tool_input: Dict[str, Any]) -> Dict[str, Any]:
         "timezone": now.astimezone().tzname()
     }
 
+# The parts of the code change analysis action plan that are the same on every
+# call. They are built once and shared by every plan, so they must not be modified.
+ACTION_PLAN_REPORTS = [
+    {
+        "name": "Affected Files Report",
+        "steps": [
+            "Analyze the project structure and identify all files that may be affected by the requested changes.",
+            "List these files along with their relative paths in the project.",
+            "Provide a brief explanation of why each file is considered affected."
+        ]
+    },
+    {
+        "name": "Implementation Strategy Report",
+        "steps": [
+            "Outline a step-by-step plan for implementing the requested changes.",
+            "Break down the implementation into manageable tasks.",
+            "Identify any dependencies between tasks and suggest an order of execution."
+        ]
+    },
+    {
+        "name": "Risk Assessment Report",
+        "steps": [
+            "Evaluate potential risks associated with the proposed changes.",
+            "Consider factors such as system stability, performance impacts, and potential side effects.",
+            "Suggest mitigation strategies for each identified risk."
+        ]
+    },
+    {
+        "name": "Impact Analysis Report",
+        "steps": [
+            "Analyze how the proposed changes might affect other parts of the system.",
+            "Identify any components, modules, or services that may need to be updated as a result of these changes.",
+            "Assess the potential impact on system architecture and design patterns."
+        ]
+    },
+    {
+        "name": "Testing and Validation Plan",
+        "steps": [
+            "Propose a comprehensive testing strategy for the changes.",
+            "Identify specific test cases that should be developed or updated.",
+            "Suggest integration and system-level tests to ensure overall system integrity."
+        ]
+    }
+]
+# Post-report steps when the user reviews the changes before they are applied
+INTERACTIVE_POST_REPORT_STEPS = [
+    {
+        "name": "Present Proposed Changes",
+        "steps": [
+            "Summarize the findings from all reports.",
+            "Present a clear and concise overview of the proposed changes.",
+            "Highlight potential risks and mitigation strategies."
+        ]
+    },
+    {
+        "name": "User Approval",
+        "steps": [
+            "Present the proposed changes to the user for review.",
+            "Address any questions or concerns raised by the user.",
+            "Obtain explicit approval from the user to proceed with the changes."
+        ]
+    },
+    {
+        "name": "Apply Changes",
+        "steps": [
+            "Call the intelligent_edit tool to apply the approved changes.",
+            "Provide the tool with the necessary information from the reports and user approval.",
+            "Execute the changes in a controlled manner, following the implementation strategy."
+        ]
+    }
+]
+# Post-report steps when the changes are applied without asking
+NON_INTERACTIVE_POST_REPORT_STEPS = [
+    {
+        "name": "Apply Changes",
+        "steps": [
+            "Call the intelligent_edit tool to apply the changes based on the reports.",
+            "Execute the changes in a controlled manner, following the implementation strategy."
+        ]
+    }
+]
+
 def code_change_analysis_action_plan(tool_input):
     """
     Generate an action plan for code change analysis based on the provided input.
@@ -824,89 +1458,10 @@ def code_change_analysis_action_plan(tool_input):
         "original_request": user_request,
         "additional_context": additional_context,
         "preliminary_steps": [],
-        "reports": [
-            {
-                "name": "Affected Files Report",
-                "steps": [
-                    "Analyze the project structure and identify all files that may be affected by the requested changes.",
-                    "List these files along with their relative paths in the project.",
-                    "Provide a brief explanation of why each file is considered affected."
-                ]
-            },
-            {
-                "name": "Implementation Strategy Report",
-                "steps": [
-                    "Outline a step-by-step plan for implementing the requested changes.",
-                    "Break down the implementation into manageable tasks.",
-                    "Identify any dependencies between tasks and suggest an order of execution."
-                ]
-            },
-            {
-                "name": "Risk Assessment Report",
-                "steps": [
-                    "Evaluate potential risks associated with the proposed changes.",
-                    "Consider factors such as system stability, performance impacts, and potential side effects.",
-                    "Suggest mitigation strategies for each identified risk."
-                ]
-            },
-            {
-                "name": "Impact Analysis Report",
-                "steps": [
-                    "Analyze how the proposed changes might affect other parts of the system.",
-                    "Identify any components, modules, or services that may need to be updated as a result of these changes.",
-                    "Assess the potential impact on system architecture and design patterns."
-                ]
-            },
-            {
-                "name": "Testing and Validation Plan",
-                "steps": [
-                    "Propose a comprehensive testing strategy for the changes.",
-                    "Identify specific test cases that should be developed or updated.",
-                    "Suggest integration and system-level tests to ensure overall system integrity."
-                ]
-            }
-        ],
-        "post_report_steps": []
+        "reports": ACTION_PLAN_REPORTS,
+        "post_report_steps": INTERACTIVE_POST_REPORT_STEPS if interactive_mode else NON_INTERACTIVE_POST_REPORT_STEPS
     }
 
-    if interactive_mode:
-        action_plan["post_report_steps"] = [
-            {
-                "name": "Present Proposed Changes",
-                "steps": [
-                    "Summarize the findings from all reports.",
-                    "Present a clear and concise overview of the proposed changes.",
-                    "Highlight potential risks and mitigation strategies."
-                ]
-            },
-            {
-                "name": "User Approval",
-                "steps": [
-                    "Present the proposed changes to the user for review.",
-                    "Address any questions or concerns raised by the user.",
-                    "Obtain explicit approval from the user to proceed with the changes."
-                ]
-            },
-            {
-                "name": "Apply Changes",
-                "steps": [
-                    "Call the intelligent_edit tool to apply the approved changes.",
-                    "Provide the tool with the necessary information from the reports and user approval.",
-                    "Execute the changes in a controlled manner, following the implementation strategy."
-                ]
-            }
-        ]
-    else:
-        action_plan["post_report_steps"] = [
-            {
-                "name": "Apply Changes",
-                "steps": [
-                    "Call the intelligent_edit tool to apply the changes based on the reports.",
-                    "Execute the changes in a controlled manner, following the implementation strategy."
-                ]
-            }
-        ]
-
     # Check if files exist and add preliminary steps if necessary
     if not os.path.exists(os.path.join(project_folder, project_structure_file)):
         action_plan["preliminary_steps"].append({
@@ -932,8 +1487,7 @@ def code_change_analysis_action_plan(tool_input):
     
     # Save action plan to a file in JSON format
     action_plan_file = os.path.join(project_folder, "code_change_analysis_action_plan.json")
-    with open(action_plan_file, "w") as f:
-        json.dump(action_plan, f, indent=2)
+    write_json_file(action_plan_file, action_plan)
 
     # Use relative paths in the return dictionary
     relative_action_plan_file = os.path.relpath(action_plan_file, start=os.getcwd())
@@ -947,15 +1501,119 @@ def code_change_analysis_action_plan(tool_input):
     }
 
 def _get_all_files(structure: Dict[str, Any]) -> List[str]:
-    """Recursively get all file names from the project structure."""
+    """Get all file names from the project structure, in depth-first order."""
     files = []
-    if structure["type"] == "file":
-        return [structure["name"]]
-    for child in structure.get("children", []):
-        child_files = _get_all_files(child)
-        files.extend(child_files)  # Add child files directly without joining paths
+    # An explicit stack instead of recursion: no call per node, no list per
+    # directory, and no recursion limit on deep trees
+    stack = [structure]
+    while stack:
+        node = stack.pop()
+        if node["type"] == "file":
+            files.append(node["name"])  # File names only, without joining paths
+        else:
+            # Reversed so the children are popped in their original order
+            stack.extend(reversed(node.get("children", [])))
     return files
 
+def _expanded_action_plan_steps(action_plan_path: str) -> List[Dict[str, str]]:
+    """
+    Expand an action plan into the ordered list of steps the planner walks through.
+
+    The planner is called once per step, so the expansion is cached per file and
+    reused while its mtime and size are unchanged; the list is shared and must
+    not be modified.
+
+    Args:
+        action_plan_path (str): Path of the action plan JSON file.
+
+    Returns:
+        List[Dict[str, str]]: Steps with their "name", "type" and "action".
+    """
+    stat_result = os.stat(action_plan_path)
+    cache_key = os.path.abspath(action_plan_path)
+    cached = _action_plan_steps_cache.get(cache_key)
+    if cached and cached[0] == stat_result.st_mtime_ns and cached[1] == stat_result.st_size:
+        return cached[2]
+    
+    action_plan = read_json_file(action_plan_path)
+    
+    # Extract and expand all steps with review and progress update. The names are
+    # interned so progress keys built from them share one string per step
+    all_steps = []
+    
+    # Preliminary steps
+    for step in action_plan.get("preliminary_steps", []):
+        all_steps.append({"name": sys.intern(f"Execute: {step['name']}"), "type": "preliminary step", "action": "execute"})
+        all_steps.append({"name": sys.intern(f"Review and Update Progress: {step['name']}"), "type": "review", "action": "review"})
+    
+    # Reports
+    for report in action_plan.get("reports", []):
+        all_steps.append({"name": sys.intern(report["name"]), "type": "report", "action": "generate"})
+        all_steps.append({"name": sys.intern(f"Review and Update Progress: {report['name']}"), "type": "review", "action": "review"})
+    
+    # Post-report steps
+    for step in action_plan.get("post_report_steps", []):
+        all_steps.append({"name": sys.intern(f"Execute: {step['name']}"), "type": "post_report step", "action": "execute"})
+        all_steps.append({"name": sys.intern(f"Review and Update Progress: {step['name']}"), "type": "review", "action": "review"})
+    
+    _action_plan_steps_cache[cache_key] = (stat_result.st_mtime_ns, stat_result.st_size, all_steps)
+    return all_steps
+
+def _copy_progress(progress: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Copy a progress mapping deep enough that updating a step's status leaves the original intact."""
+    return {name: dict(entry) for name, entry in progress.items()}
+
+def _load_progress(progress_update_path: str) -> Dict[str, Dict[str, Any]]:
+    """
+    Read a code change analysis progress file, reusing the last parse while the file is unchanged.
+
+    The planner, report and review tools each load the progress once per call,
+    usually right after another of them wrote it, so the state they wrote is
+    kept in memory instead of being read back and parsed again.
+
+    Args:
+        progress_update_path (str): Path of the progress JSON file.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: A copy of the progress that the caller may modify.
+
+    Raises:
+        FileNotFoundError: If the progress file does not exist.
+        json.JSONDecodeError: If the progress file is not valid JSON.
+    """
+    stat_result = os.stat(progress_update_path)
+    cache_key = os.path.abspath(progress_update_path)
+    cached = _progress_cache.get(cache_key)
+    if cached is None or cached[:3] != (stat_result.st_ino, stat_result.st_mtime_ns, stat_result.st_size):
+        progress = read_json_file(progress_update_path)
+        cached = (stat_result.st_ino, stat_result.st_mtime_ns, stat_result.st_size, progress)
+        _progress_cache[cache_key] = cached
+    return _copy_progress(cached[3])
+
+def _save_progress(progress_update_path: str, progress: Dict[str, Dict[str, Any]], atomic: bool = False) -> None:
+    """
+    Write a code change analysis progress file and remember what was written for _load_progress.
+
+    The file is always written straight away, so other processes and a restarted
+    session see the same state as this one.
+
+    Args:
+        progress_update_path (str): Path of the progress JSON file.
+        progress (Dict[str, Dict[str, Any]]): The progress to write.
+        atomic (bool): Write to a temporary file and move it into place, so readers
+            never see a partly written file.
+    """
+    if atomic:
+        temp_file = progress_update_path + '.tmp'
+        write_json_file(temp_file, progress)
+        os.replace(temp_file, progress_update_path)  # Atomic operation
+    else:
+        write_json_file(progress_update_path, progress)
+    stat_result = os.stat(progress_update_path)
+    _progress_cache[os.path.abspath(progress_update_path)] = (
+        stat_result.st_ino, stat_result.st_mtime_ns, stat_result.st_size, _copy_progress(progress)
+    )
+
 def code_change_analysis_planner(tool_input: Dict[str, Any]) -> Dict[str, Any]:
     """
     Read the action plan and determine the next analysis to be conducted, including preliminary steps,
@@ -983,35 +1641,16 @@ def code_change_analysis_planner(tool_input: Dict[str, Any]) -> Dict[str, Any]:
     action_plan_path = os.path.join(project_folder, action_plan_file)
     progress_update_path = os.path.join(project_folder, "code_change_analysis_progress.json")
     
-    if not os.path.exists(action_plan_path):
+    # Opening the files directly saves a separate existence check on each call
+    try:
+        all_steps = _expanded_action_plan_steps(action_plan_path)
+    except FileNotFoundError:
         return {"error": f"Action plan file not found: {action_plan_file}", "project_folder": project_folder, "is_error": True}
     
-    with open(action_plan_path, 'r') as f:
-        action_plan = json.load(f)
-    
-    # Extract and expand all steps with review and progress update
-    all_steps = []
-    
-    # Preliminary steps
-    for step in action_plan.get("preliminary_steps", []):
-        all_steps.append({"name": f"Execute: {step['name']}", "type": "preliminary step", "action": "execute"})
-        all_steps.append({"name": f"Review and Update Progress: {step['name']}", "type": "review", "action": "review"})
-    
-    # Reports
-    for report in action_plan.get("reports", []):
-        all_steps.append({"name": report["name"], "type": "report", "action": "generate"})
-        all_steps.append({"name": f"Review and Update Progress: {report['name']}", "type": "review", "action": "review"})
-    
-    # Post-report steps
-    for step in action_plan.get("post_report_steps", []):
-        all_steps.append({"name": f"Execute: {step['name']}", "type": "post_report step", "action": "execute"})
-        all_steps.append({"name": f"Review and Update Progress: {step['name']}", "type": "review", "action": "review"})
-    
     # Check existing progress or initialize new progress
-    if os.path.exists(progress_update_path):
-        with open(progress_update_path, 'r') as f:
-            progress = json.load(f)
-    else:
+    try:
+        progress = _load_progress(progress_update_path)
+    except FileNotFoundError:
         progress = {step["name"]: {"status": "Not Started"} for step in all_steps}
     
     # Determine next step to be executed
@@ -1030,8 +1669,7 @@ def code_change_analysis_planner(tool_input: Dict[str, Any]) -> Dict[str, Any]:
         }
     
     # Save updated progress
-    with open(progress_update_path, 'w') as f:
-        json.dump(progress, f, indent=2)
+    _save_progress(progress_update_path, progress)
     
     # Use relative paths in the return dictionary
     relative_progress_update_path = os.path.relpath(progress_update_path, start=os.getcwd())
@@ -1064,12 +1702,11 @@ def generate_code_change_analysis_report(tool_input: Dict[str, Any]) -> Dict[str
     
     progress_update_path = os.path.join(project_folder, progress_update_file)
     
-    if not os.path.exists(progress_update_path):
+    try:
+        progress = _load_progress(progress_update_path)
+    except FileNotFoundError:
         return {"error": f"Progress update file not found: {progress_update_path}", "is_error": True}
     
-    with open(progress_update_path, 'r') as f:
-        progress = json.load(f)
-    
     next_report = next((report for report in progress if progress[report]["status"] == "In Progress"), None)
     
     if not next_report:
@@ -1127,13 +1764,11 @@ def save_code_change_analysis_report(tool_input: Dict[str, Any]) -> Dict[str, An
     
     # Update progress
     progress_update_path = os.path.join(project_folder, progress_update_file)
-    with open(progress_update_path, 'r') as f:
-        progress = json.load(f)
+    progress = _load_progress(progress_update_path)
     
     progress[report_name]["status"] = "Completed"
     
-    with open(progress_update_path, 'w') as f:
-        json.dump(progress, f, indent=2)
+    _save_progress(progress_update_path, progress)
     
     return {
         "message": f"Generated report saved: {report_name}",
@@ -1202,48 +1837,58 @@ def review_and_update_progress(tool_input: Dict[str, Any]) -> Dict[str, Any]:
         except FileNotFoundError:
             pass  # If the file is already gone, that's fine
 
+    # flock blocks in the kernel until the lock is free instead of polling every
+    # 100 ms, and is released by the OS even if the process dies. The lock file
+    # is kept: removing it would let a waiter and a newcomer lock different files.
+    use_flock = fcntl is not None
+    lock_handle = None
     try:
         # Acquire lock
-        if not acquire_lock(lock_file):
+        if use_flock:
+            lock_handle = open(lock_file, 'a')
+            fcntl.flock(lock_handle, fcntl.LOCK_EX)
+        elif not acquire_lock(lock_file):
             raise IOError("Unable to acquire lock for progress file")
 
         # Read existing progress
         try:
-            with open(progress_update_path, 'r') as f:
-                progress = json.load(f)
+            progress = _load_progress(progress_update_path)
         except (FileNotFoundError, json.JSONDecodeError):
             progress = {}
 
+        updates = {}
         if action in ["execute", "generate"]:
             # Update progress for execution or generation steps
             action_step_name = f"Execute: {step_name}" if action == "execute" else step_name
             review_step_name = f"Review and Update Progress: {step_name}"
 
-            progress[action_step_name] = {
+            updates[action_step_name] = {
                 "status": status,
                 "outcome": outcome
             }
-            progress[review_step_name] = {
+            updates[review_step_name] = {
                 "status": "Completed"
             }
 
         elif action == "review":
             # Update progress for review steps
-            progress[step_name] = {
+            updates[step_name] = {
                 "status": status,
                 "outcome": outcome
             }
 
-        # Write updated progress
-        temp_file = progress_update_path + '.tmp'
-        with open(temp_file, 'w') as f:
-            json.dump(progress, f, indent=2)
-        os.replace(temp_file, progress_update_path)  # Atomic operation
+        # Write updated progress, unless a repeated call left it as it was
+        if any(progress.get(name) != entry for name, entry in updates.items()):
+            progress.update(updates)
+            _save_progress(progress_update_path, progress, atomic=True)
 
     except IOError as e:
         raise IOError(f"Error accessing progress file: {str(e)}")
     finally:
-        release_lock(lock_file)
+        if not use_flock:
+            release_lock(lock_file)
+        elif lock_handle is not None:
+            lock_handle.close()  # Closing the file releases the flock
 
     # Prepare review result
     review_result = {
@@ -1259,6 +1904,25 @@ def review_and_update_progress(tool_input: Dict[str, Any]) -> Dict[str, Any]:
 
     return review_result
 
+# Functions implementing each tool in TOOLS, looked up by execute_tool
+TOOL_HANDLERS = {
+    "list_files": _list_files,
+    "read_file": _read_file,
+    "read_files_in_folder": read_files_in_folder,
+    "create_file": _create_file,
+    "create_folder": _create_folder,
+    "project_structure": project_structure,
+    "project_study": project_study,
+    "code_change_analysis_action_plan": code_change_analysis_action_plan,
+    "code_change_analysis_planner": code_change_analysis_planner,
+    "generate_code_change_analysis_report": generate_code_change_analysis_report,
+    "save_code_change_analysis_report": save_code_change_analysis_report,
+    "review_and_update_progress": review_and_update_progress,
+    "intelligent_edit": intelligent_edit,
+    "code_edit_tool": code_edit_tool,
+    "get_current_datetime": get_current_datetime,
+}
+
 def execute_tool(tool_name: str, tool_input: Dict[str, Any]) -> Dict[str, Any]:
     """
     Execute a tool and return the result.
@@ -1270,42 +1934,15 @@ def execute_tool(tool_name: str, tool_input: Dict[str, Any]) -> Dict[str, Any]:
     Returns:
         Dict[str, Any]: The result of the tool execution.
     """
-    logger.debug(f"Executing tool: {tool_name} with input: {tool_input}")
+    # Lazy formatting: tool_input can hold whole file contents
+    logger.debug("Executing tool: %s with input: %s", tool_name, tool_input)
     try:
-        if tool_name == "list_files":
-            return _list_files(tool_input)
-        elif tool_name == "read_file":
-            return _read_file(tool_input)
-        elif tool_name == "read_files_in_folder":
-            return read_files_in_folder(tool_input)
-        elif tool_name == "create_file":
-            return _create_file(tool_input)
-        elif tool_name == "create_folder":
-            return _create_folder(tool_input)
-        elif tool_name == "project_structure":
-            return project_structure(tool_input)
-        elif tool_name == "project_study":
-            return project_study(tool_input)
-        elif tool_name == "code_change_analysis_action_plan":
-            return code_change_analysis_action_plan(tool_input)
-        elif tool_name == "code_change_analysis_planner":
-            return code_change_analysis_planner(tool_input)
-        elif tool_name == "generate_code_change_analysis_report":
-            return generate_code_change_analysis_report(tool_input)
-        elif tool_name == "save_code_change_analysis_report":
-            return save_code_change_analysis_report(tool_input)
-        elif tool_name == "review_and_update_progress":
-            return review_and_update_progress(tool_input)
-        elif tool_name == "intelligent_edit":
-            return intelligent_edit(tool_input)
-        elif tool_name == "code_edit_tool":
-            return code_edit_tool(tool_input)
-        elif tool_name == "get_current_datetime":
-            return get_current_datetime(tool_input)
-        else:
+        handler = TOOL_HANDLERS.get(tool_name)
+        if handler is None:
             error_msg = f"Unknown tool: {tool_name}"
             logger.error(error_msg)
             return {"error": error_msg, "is_error": True}
+        return handler(tool_input)
     except Exception as e:
         error_msg = f"An error occurred while executing tool {tool_name}: {str(e)}"
         logger.error(error_msg, exc_info=True)
@@ -1515,6 +2152,11 @@ TOOLS = [
                         "max_tokens": {"type": "integer"},
                         "anthropic_headers": {"type": "object"},
                         "interactive_mode": {"type": "boolean"},
+                        "batch_threshold": {"type": "integer"},
+                        "batch_poll_interval": {"type": "number"},
+                        "batch_timeout": {"type": "number"},
+                        "edit_cache": {"type": "boolean"},
+                        "edit_cache_dir": {"type": "string"},
                         "api_key": {"type": "string"}
                     }
                 }
@@ -1,15 +1,136 @@
 # wise_counsel.py
 
+import asyncio
+import functools
+import hashlib
+import itertools
 import logging
 import textwrap
 import re
 import json
-from typing import Dict, Union, Any, List
+from collections import OrderedDict
+from typing import Dict, Union, Any, Iterator, List, Optional, Tuple
 import anthropic
 from anthropic.types import Message
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+# Patterns for the final verdict in a review, compiled once instead of looked up
+# in the re module's cache on every review
+APPROVAL_STATUS_RE = re.compile(r'<approval_status>(.*?)</approval_status>', re.IGNORECASE | re.DOTALL)
+FEEDBACK_RE = re.compile(r'<approval_status>.*?</approval_status>\s*(.*?)\s*</final_verdict>', re.IGNORECASE | re.DOTALL)
+TOTAL_SCORE_RE = re.compile(r'<total_score>total score:\s*(\d+)</total_score>')
+# The final verdict is the last part of a review; once it has closed the rest is not needed
+FINAL_VERDICT_CLOSE = '</final_verdict>'
+# One final verdict per response in a review_responses reply
+INDEXED_VERDICT_RE = re.compile(r'<final_verdict index="(\d+)">.*?</final_verdict>', re.IGNORECASE | re.DOTALL)
+
+# Reviews remembered per WiseCounsel, least recently used evicted first
+REVIEW_CACHE_SIZE = 128
+
+# Output tokens budgeted per response in a review_responses call; as many responses
+# share a call as fit in config['max_tokens'] at this rate
+BATCH_REVIEW_TOKENS_PER_RESPONSE = 2000
+
+# Review instructions sent as the system message, with {context} and {base_prompt}
+# filled in per review. Kept flush left so the indentation is not sent as tokens.
+REVIEW_SYSTEM_MESSAGE_TEMPLATE = """
+You are an extremely critical AI consultant tasked with meticulously reviewing AI-generated responses. Your job is to scrutinize the following response with the highest standards, considering these criteria:
+
+1. Adherence to guidelines and context (Score 0-10)
+2. Accuracy and correctness of information (Score 0-10)
+3. Clarity and coherence of the response (Score 0-10)
+4. Appropriateness of tone and style (Score 0-10)
+5. Consistency with the base prompt (Score 0-10)
+6. Depth and insightfulness of the response (Score 0-10)
+7. Creativity and innovative thinking (Score 0-10)
+8. Practical applicability of any suggestions or solutions (Score 0-10)
+9. Anticipation of potential issues or edge cases (Score 0-10)
+10. Overall impression and effectiveness (Score 0-10)
+
+The context of the conversation is:
+<context>
+{context}
+</context>
+
+The base prompt used in the conversation is:
+<base_prompt>
+{base_prompt}
+</base_prompt>
+
+Provide your assessment in the following format:
+1. Detailed evaluation of each criterion (2-3 sentences each, including the score)
+2. In-depth comparison with the base prompt (3-4 sentences)
+3. Comprehensive feedback and specific suggestions for improvement (be extremely thorough)
+4. List of at least 5 ways the response could be enhanced or optimized
+5. Identification of any missed opportunities or unexplored angles in the response
+6. Final verdict and total score: This step is CRITICAL and MUST be followed EXACTLY as described:
+
+   a. Calculate the total score out of 100.
+
+   b. You MUST use the following format to report the final verdict:
+
+      <final_verdict>
+      <total_score>total score: [YOUR CALCULATED SCORE]</total_score>
+      <approval_status>[APPROVAL DECISION]</approval_status>
+      [EXPLANATION IF NOT APPROVED]
+      </final_verdict>
+
+   c. Replace [YOUR CALCULATED SCORE] with the actual numeric score you calculated.
+
+   d. Replace [APPROVAL DECISION] with either "APPROVED" or "NOT APPROVED" based on these criteria:
+      - If the total score is 90 or above AND no individual criterion scores below 8, use "APPROVED"
+      - Otherwise, use "NOT APPROVED"
+
+   e. If the decision is "NOT APPROVED", provide a detailed explanation of why it falls short 
+      immediately after the </approval_status> tag but still within the <final_verdict> tags.
+
+   Example of a complete final verdict:
+
+   <final_verdict>
+   <total_score>total score: 95</total_score>
+   <approval_status>APPROVED</approval_status>
+   </final_verdict>
+
+   OR
+
+   <final_verdict>
+   <total_score>total score: 85</total_score>
+   <approval_status>NOT APPROVED</approval_status>
+   This response falls short of approval because the total score is below 90. 
+   Additionally, the response lacks depth in addressing [specific issue], and 
+   the proposed solution for [particular problem] is not sufficiently detailed.
+   </final_verdict>
+
+IMPORTANT: Failure to follow this format precisely will be considered a critical error in your review. 
+All tags (<final_verdict>, <total_score>, and <approval_status>) are mandatory and will be used 
+for automated processing of your review. Ensure that the tags are correctly opened and closed, 
+and that the content within each tag is accurate and follows the specified format.
+
+Be extremely picky and demanding in your review. Look for any possible flaws, inconsistencies, or areas for improvement, no matter how small. The goal is to ensure only the highest quality responses are approved. Do not hesitate to be critical - it's better to be too strict than too lenient.
+""".strip()
+
+# Added to the review instructions when review_responses reviews several responses at once
+BATCH_REVIEW_INSTRUCTIONS = """
+
+You will be given several numbered AI responses, each answering the same context and base prompt. Review every response separately, following all of the steps above for each one, and give each its own final verdict with the response's index k on the opening tag:
+
+<final_verdict index="k">
+<total_score>total score: [YOUR CALCULATED SCORE]</total_score>
+<approval_status>[APPROVAL DECISION]</approval_status>
+[EXPLANATION IF NOT APPROVED]
+</final_verdict>"""
+
+@functools.lru_cache(maxsize=None)
+def _text_wrapper(width: int) -> textwrap.TextWrapper:
+    """Return the wrapper used by wrap_text_for_logging for a width, created once per width."""
+    return textwrap.TextWrapper(width=width, break_long_words=False, replace_whitespace=False)
+
 def wrap_text_for_logging(content: Any, width: int = 100, max_length: int = 10000) -> str:
     """
     Wrap and format content for better readability in logs.
@@ -24,6 +145,11 @@ def wrap_text_for_logging(content: Any, width: int = 100, max_length: int = 1000
     """
     def format_value(value: Any) -> str:
         if isinstance(value, (dict, list)):
+            if orjson is not None:
+                try:
+                    return orjson.dumps(value, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS).decode('utf-8')
+                except TypeError:
+                    pass  # Something orjson cannot serialise; json.dumps reports it as before
             return json.dumps(value, indent=2)
         else:
             return str(value)
@@ -31,22 +157,41 @@ def wrap_text_for_logging(content: Any, width: int = 100, max_length: int = 1000
     separator = "=" * width
     header = "-" * width
 
-    if isinstance(content, dict):
-        formatted_content = "Dictionary Content:\n" + header + "\n"
-        for key, value in content.items():
-            formatted_value = format_value(value)
-            formatted_content += f"{key}:\n{textwrap.indent(formatted_value, '  ')}\n"
-    elif isinstance(content, list):
-        formatted_content = "List Content:\n" + header + "\n"
-        for item in content:
-            formatted_item = format_value(item)
-            formatted_content += f"- {formatted_item}\n"
-    else:
-        formatted_content = "Content:\n" + header + "\n" + str(content)
+    def formatted_chunks() -> Iterator[str]:
+        # Produced one entry at a time, each ending in a newline, so formatting
+        # stops along with wrapping once the output is long enough
+        if isinstance(content, dict):
+            yield "Dictionary Content:\n" + header + "\n"
+            for key, value in content.items():
+                formatted_value = format_value(value)
+                if isinstance(value, (dict, list)):
+                    # JSON output has no blank lines, so this prefixes every line like
+                    # textwrap.indent, without also splitting at line separators that
+                    # orjson leaves unescaped inside strings
+                    indented_value = "  " + formatted_value.replace("\n", "\n  ")
+                else:
+                    indented_value = textwrap.indent(formatted_value, '  ')
+                yield f"{key}:\n{indented_value}\n"
+        elif isinstance(content, list):
+            yield "List Content:\n" + header + "\n"
+            for item in content:
+                formatted_item = format_value(item)
+                yield f"- {formatted_item}\n"
+        else:
+            yield "Content:\n" + header + "\n" + str(content)
 
+    # textwrap.wrap would build a new TextWrapper for every line
+    wrapper = _text_wrapper(width)
     wrapped_lines = []
-    for line in formatted_content.split('\n'):
-        wrapped_lines.extend(textwrap.wrap(line, width=width, break_long_words=False, replace_whitespace=False))
+    # Length of the wrapped lines joined with newlines. Once it passes max_length
+    # the output is truncated there, and later lines cannot change what is kept
+    wrapped_length = -1
+    for line in itertools.chain.from_iterable(chunk.split('\n') for chunk in formatted_chunks()):
+        for wrapped_line in wrapper.wrap(line):
+            wrapped_lines.append(wrapped_line)
+            wrapped_length += len(wrapped_line) + 1
+        if wrapped_length > max_length:
+            break
 
     wrapped_text = '\n'.join(wrapped_lines)
 
@@ -56,17 +201,21 @@ def wrap_text_for_logging(content: Any, width: int = 100, max_length: int = 1000
     return f"\n{separator}\n{wrapped_text}\n{separator}\n"
 
 class WiseCounsel:
-    def __init__(self, client: anthropic.Anthropic, config: Dict[str, Any]):
+    def __init__(self, client: Union[anthropic.AsyncAnthropic, anthropic.Anthropic], config: Dict[str, Any]):
         """
         Initialize the WiseCounsel instance.
 
         Args:
-            client (anthropic.Anthropic): The Anthropic client for making API calls.
+            client (Union[anthropic.AsyncAnthropic, anthropic.Anthropic]): The Anthropic client for making
+                API calls. A synchronous client is run in a worker thread so it does not block the event loop.
             config (Dict[str, Any]): Configuration dictionary for the Anthropic API.
         """
         self.client = client
         self.config = config
-        logger.info("WiseCounsel initialized with config:\n%s", wrap_text_for_logging(str(config)))
+        # Successful reviews keyed by a digest of the reviewed response, context and base prompt
+        self._review_cache: OrderedDict[bytes, Dict[str, Any]] = OrderedDict()
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("WiseCounsel initialized with config:\n%s", wrap_text_for_logging(str(config)))
 
     async def review_response(self, response: Message, context: str, base_prompt: str) -> Dict[str, Any]:
         """
@@ -83,173 +232,300 @@ class WiseCounsel:
         logger.info("Starting review_response method")
         
         # Extract the text content from the response
-        response_text = "".join(content.text for content in response.content if content.type == 'text')
-        logger.info("Extracted response text (length: %d):\n%s", len(response_text), wrap_text_for_logging(response_text))
+        response_text = self._response_text(response)
+
+        # Nothing to review; the reviewer could only reject it, so skip the API call
+        if not response_text.strip():
+            logger.warning("Response has no text to review")
+            return self._no_text_result()
+
+        cache_key = self._cache_key(response_text, context, base_prompt)
+        cached = self._review_cache.get(cache_key)
+        if cached is not None:
+            self._review_cache.move_to_end(cache_key)
+            logger.info("Reusing cached review")
+            return dict(cached)
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Extracted response text (length: %d):\n%s", len(response_text), wrap_text_for_logging(response_text))
 
         # Prepare the system message with strict review instructions
-        system_message = f"""
-        You are an extremely critical AI consultant tasked with meticulously reviewing AI-generated responses. Your job is to scrutinize the following response with the highest standards, considering these criteria:
-
-        1. Adherence to guidelines and context (Score 0-10)
-        2. Accuracy and correctness of information (Score 0-10)
-        3. Clarity and coherence of the response (Score 0-10)
-        4. Appropriateness of tone and style (Score 0-10)
-        5. Consistency with the base prompt (Score 0-10)
-        6. Depth and insightfulness of the response (Score 0-10)
-        7. Creativity and innovative thinking (Score 0-10)
-        8. Practical applicability of any suggestions or solutions (Score 0-10)
-        9. Anticipation of potential issues or edge cases (Score 0-10)
-        10. Overall impression and effectiveness (Score 0-10)
-
-        The context of the conversation is:
-        <context>
-        {context}
-        </context>
-
-        The base prompt used in the conversation is:
-        <base_prompt>
-        {base_prompt}
-        </base_prompt>
-
-        Provide your assessment in the following format:
-        1. Detailed evaluation of each criterion (2-3 sentences each, including the score)
-        2. In-depth comparison with the base prompt (3-4 sentences)
-        3. Comprehensive feedback and specific suggestions for improvement (be extremely thorough)
-        4. List of at least 5 ways the response could be enhanced or optimized
-        5. Identification of any missed opportunities or unexplored angles in the response
-        6. Final verdict and total score: This step is CRITICAL and MUST be followed EXACTLY as described:
-
-           a. Calculate the total score out of 100.
-
-           b. You MUST use the following format to report the final verdict:
-
-              <final_verdict>
-              <total_score>total score: [YOUR CALCULATED SCORE]</total_score>
-              <approval_status>[APPROVAL DECISION]</approval_status>
-              [EXPLANATION IF NOT APPROVED]
-              </final_verdict>
-
-           c. Replace [YOUR CALCULATED SCORE] with the actual numeric score you calculated.
-
-           d. Replace [APPROVAL DECISION] with either "APPROVED" or "NOT APPROVED" based on these criteria:
-              - If the total score is 90 or above AND no individual criterion scores below 8, use "APPROVED"
-              - Otherwise, use "NOT APPROVED"
-
-           e. If the decision is "NOT APPROVED", provide a detailed explanation of why it falls short 
-              immediately after the </approval_status> tag but still within the <final_verdict> tags.
-
-           Example of a complete final verdict:
-
-           <final_verdict>
-           <total_score>total score: 95</total_score>
-           <approval_status>APPROVED</approval_status>
-           </final_verdict>
-
-           OR
-
-           <final_verdict>
-           <total_score>total score: 85</total_score>
-           <approval_status>NOT APPROVED</approval_status>
-           This response falls short of approval because the total score is below 90. 
-           Additionally, the response lacks depth in addressing [specific issue], and 
-           the proposed solution for [particular problem] is not sufficiently detailed.
-           </final_verdict>
-
-        IMPORTANT: Failure to follow this format precisely will be considered a critical error in your review. 
-        All tags (<final_verdict>, <total_score>, and <approval_status>) are mandatory and will be used 
-        for automated processing of your review. Ensure that the tags are correctly opened and closed, 
-        and that the content within each tag is accurate and follows the specified format.
-
-        Be extremely picky and demanding in your review. Look for any possible flaws, inconsistencies, or areas for improvement, no matter how small. The goal is to ensure only the highest quality responses are approved. Do not hesitate to be critical - it's better to be too strict than too lenient.
-        """
+        system_message = REVIEW_SYSTEM_MESSAGE_TEMPLATE.format(context=context, base_prompt=base_prompt)
 
-        logger.info("Prepared system message (length: %d):\n%s", len(system_message), wrap_text_for_logging(system_message))
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Prepared system message (length: %d):\n%s", len(system_message), wrap_text_for_logging(system_message))
 
         user_message = f"Please conduct a rigorous and highly critical review of this AI response:\n\n<ai_response>{response_text}</ai_response>\n\nand compare it meticulously against the provided Base Prompt and Context."
-        logger.info("Prepared user message (length: %d):\n%s", len(user_message), wrap_text_for_logging(user_message))
+        if logger.isEnabledFor(logging.INFO):
+            logger.info("Prepared user message (length: %d):\n%s", len(user_message), wrap_text_for_logging(user_message))
 
         try:
-            review_response = await self._get_review_response(system_message, user_message)
+            review_text = await self._get_review_response(system_message, user_message)
             logger.info("Received review response")
 
-            review_text = review_response.content[0].text if review_response.content else ""
-            logger.info("Extracted review text (length: %d):\n%s", len(review_text), wrap_text_for_logging(review_text))
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("Extracted review text (length: %d):\n%s", len(review_text), wrap_text_for_logging(review_text))
 
-            # Parse the review text to determine approval and extract feedback
-            approval_status_match = re.search(r'<approval_status>(.*?)</approval_status>', review_text, re.IGNORECASE | re.DOTALL)
-            if approval_status_match:
-                approval_status = approval_status_match.group(1).strip()
-                approved = approval_status.upper() == "APPROVED"
-                logger.info(f"Extracted approval status: {approval_status}")
-            else:
-                approved = False
-                logger.warning("Could not find approval status in the expected format")
+            result, has_verdict = self._parse_review(review_text, review_text)
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("Review completed. Result:\n%s", wrap_text_for_logging(str(result)))
 
-            feedback_match = re.search(r'<approval_status>.*?</approval_status>\s*(.*?)\s*</final_verdict>', review_text, re.IGNORECASE | re.DOTALL)
-            if feedback_match:
-                feedback = feedback_match.group(1).strip()
-            else:
-                feedback = ""
-                logger.warning("Could not extract feedback from the review")
+            # A review without a verdict is worth asking for again
+            if has_verdict:
+                self._remember(cache_key, result)
+            return result
 
-            logger.info(f"Extracted feedback: {feedback[:100]}..." if len(feedback) > 100 else feedback)
+        except Exception as e:
+            logger.error("Error in review process: %s", str(e))
+            return self._error_result(str(e))
 
-            # Extract the total score
-            total_score = 0
-            total_score_match = re.search(r'<total_score>total score:\s*(\d+)</total_score>', review_text)
-            if total_score_match:
-                try:
-                    total_score = int(total_score_match.group(1))
-                except ValueError:
-                    logger.warning("Could not parse total score from: %s", total_score_match.group(0))
-            else:
-                logger.warning("Could not find total score in the expected format")
+    async def review_responses(self, responses: List[Message], context: str, base_prompt: str) -> List[Dict[str, Any]]:
+        """
+        Review several responses to the same context and base prompt with as few API calls as the output limit allows.
 
-            result = {
-                "approved": approved,
-                "feedback": feedback,
-                "full_review": review_text,
-                "total_score": total_score
-            }
-            logger.info("Review completed. Result:\n%s", wrap_text_for_logging(str(result)))
+        Responses without text and responses already reviewed are answered without
+        the API. The rest are split into calls that fit in config['max_tokens'],
+        which run concurrently; a call left with a single response goes through
+        review_response.
 
-            return result
+        Args:
+            responses (List[Message]): The responses from Claude to be reviewed.
+            context (str): The conversation context.
+            base_prompt (str): The base prompt used in the conversation.
 
-        except Exception as e:
-            logger.error("Error in review process: %s", str(e))
-            return {
-                "approved": False,
-                "feedback": "An error occurred during the review process.",
-                "full_review": str(e),
-                "total_score": 0
-            }
-
-    async def _get_review_response(self, system_message: str, user_message: str) -> Message:
+        Returns:
+            List[Dict[str, Any]]: One result per response, in order, shaped like the result of
+            review_response. Responses missing from the review get the error result.
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(responses)
+        pending: List[Tuple[int, str, bytes]] = []
+        for index, response in enumerate(responses):
+            response_text = self._response_text(response)
+            if not response_text.strip():
+                results[index] = self._no_text_result()
+                continue
+            cache_key = self._cache_key(response_text, context, base_prompt)
+            cached = self._review_cache.get(cache_key)
+            if cached is not None:
+                self._review_cache.move_to_end(cache_key)
+                results[index] = dict(cached)
+            else:
+                pending.append((index, response_text, cache_key))
+
+        configured_max_tokens = self.config.get('max_tokens', 2000)
+        per_call = max(1, configured_max_tokens // BATCH_REVIEW_TOKENS_PER_RESPONSE)
+        await asyncio.gather(*(
+            self._review_chunk(responses, pending[start:start + per_call], context, base_prompt, results)
+            for start in range(0, len(pending), per_call)
+        ))
+        return results
+
+    async def _review_chunk(self, responses: List[Message], pending: List[Tuple[int, str, bytes]],
+                            context: str, base_prompt: str, results: List[Optional[Dict[str, Any]]]) -> None:
+        """Review the pending responses that fit in one reply, writing each result into results at its index."""
+        if len(pending) == 1:
+            index = pending[0][0]
+            results[index] = await self.review_response(responses[index], context, base_prompt)
+        else:
+            logger.info("Starting batched review of %d responses", len(pending))
+            system_message = REVIEW_SYSTEM_MESSAGE_TEMPLATE.format(context=context, base_prompt=base_prompt) + BATCH_REVIEW_INSTRUCTIONS
+            items = "\n".join(
+                f'<ai_response index="{index}">{response_text}</ai_response>'
+                for index, response_text, _ in pending
+            )
+            user_message = f"Please conduct a rigorous and highly critical review of each of these AI responses:\n\n{items}\n\nand compare each one meticulously against the provided Base Prompt and Context."
+
+            try:
+                messages = [{"role": "user", "content": user_message}]
+                review_response = await self._make_api_call(
+                    system_message, messages,
+                    max_tokens=min(self.config.get('max_tokens', 2000), BATCH_REVIEW_TOKENS_PER_RESPONSE * len(pending))
+                )
+                review_text = self._response_text(review_response)
+            except Exception as e:
+                logger.error("Error in batched review process: %s", str(e))
+                for index, _, _ in pending:
+                    results[index] = self._error_result(str(e))
+                return
+
+            verdicts = {int(match.group(1)): match.group(0) for match in INDEXED_VERDICT_RE.finditer(review_text)}
+            for index, _, cache_key in pending:
+                verdict = verdicts.get(index)
+                if verdict is None:
+                    logger.warning("No final verdict for response %d in the batched review", index)
+                    results[index] = self._error_result(review_text)
+                    continue
+                result, has_verdict = self._parse_review(verdict, review_text)
+                if has_verdict:
+                    self._remember(cache_key, result)
+                results[index] = result
+
+            logger.info("Batched review completed for %d responses", len(pending))
+
+    @staticmethod
+    def _response_text(response: Message) -> str:
+        """The text blocks of a response, joined."""
+        texts = [content.text for content in response.content if content.type == 'text']
+        # Usually a single block, which needs no joining
+        return texts[0] if len(texts) == 1 else "".join(texts)
+
+    @staticmethod
+    def _parse_review(verdict_text: str, full_review: str) -> Tuple[Dict[str, Any], bool]:
+        """
+        Build a review result from the text holding the final verdict.
+
+        Args:
+            verdict_text (str): The review text to parse, or the part of it with one final verdict.
+            full_review (str): The review text to include in the result.
+
+        Returns:
+            Tuple[Dict[str, Any], bool]: The review result, and whether an approval status was found.
+        """
+        # Parse the review text to determine approval and extract feedback
+        approval_status_match = APPROVAL_STATUS_RE.search(verdict_text)
+        if approval_status_match:
+            approval_status = approval_status_match.group(1).strip()
+            approved = approval_status.upper() == "APPROVED"
+            logger.info(f"Extracted approval status: {approval_status}")
+        else:
+            approved = False
+            logger.warning("Could not find approval status in the expected format")
+
+        # The feedback pattern can only match where the approval status pattern
+        # does, so it is tried at that one position instead of over the whole review
+        feedback_match = FEEDBACK_RE.match(verdict_text, approval_status_match.start()) if approval_status_match else None
+        if feedback_match:
+            feedback = feedback_match.group(1).strip()
+        else:
+            feedback = ""
+            logger.warning("Could not extract feedback from the review")
+
+        logger.info(f"Extracted feedback: {feedback[:100]}..." if len(feedback) > 100 else feedback)
+
+        # Extract the total score
+        total_score = 0
+        total_score_match = TOTAL_SCORE_RE.search(verdict_text)
+        if total_score_match:
+            try:
+                total_score = int(total_score_match.group(1))
+            except ValueError:
+                logger.warning("Could not parse total score from: %s", total_score_match.group(0))
+        else:
+            logger.warning("Could not find total score in the expected format")
+
+        result = {
+            "approved": approved,
+            "feedback": feedback,
+            "full_review": full_review,
+            "total_score": total_score
+        }
+        return result, approval_status_match is not None
+
+    @staticmethod
+    def _no_text_result() -> Dict[str, Any]:
+        """Result for a response that has no text to review."""
+        return {
+            "approved": False,
+            "feedback": "The response contained no text to review.",
+            "full_review": "",
+            "total_score": 0
+        }
+
+    @staticmethod
+    def _error_result(full_review: str) -> Dict[str, Any]:
+        """Result returned when the review could not be obtained."""
+        return {
+            "approved": False,
+            "feedback": "An error occurred during the review process.",
+            "full_review": full_review,
+            "total_score": 0
+        }
+
+    @staticmethod
+    def _cache_key(response_text: str, context: str, base_prompt: str) -> bytes:
+        """Digest of a review's inputs; the separators keep differently split inputs apart."""
+        return hashlib.blake2b("\x00".join((response_text, context, base_prompt)).encode("utf-8"), digest_size=16).digest()
+
+    def _remember(self, cache_key: bytes, result: Dict[str, Any]) -> None:
+        """Cache a copy of a successful review, evicting the least recently used one if full."""
+        self._review_cache[cache_key] = dict(result)
+        if len(self._review_cache) > REVIEW_CACHE_SIZE:
+            self._review_cache.popitem(last=False)
+
+    async def _get_review_response(self, system_message: str, user_message: str) -> str:
         """
         Get a response from the AI for reviewing purposes.
 
+        With an async client the response is streamed and reading stops as soon as
+        the final verdict is complete.
+
         Args:
             system_message (str): The system message containing review instructions.
             user_message (str): The user message containing the response to be reviewed.
 
         Returns:
-            Message: The AI's review response.
+            str: The text of the AI's review response.
 
         Raises:
             Exception: If there's an error in the API call.
         """
         logger.info("Getting review response")
+        # The user message was logged when it was prepared, so it is not logged again here
         messages = [{"role": "user", "content": user_message}]
-        logger.info("Messages for API call:\n%s", wrap_text_for_logging(str(messages)))
-        return await self._make_api_call(system_message, messages)
+        if isinstance(self.client, anthropic.AsyncAnthropic):
+            return await self._stream_review(system_message, messages)
+        response = await self._make_api_call(system_message, messages)
+        return response.content[0].text if response.content else ""
 
-    async def _make_api_call(self, system: str, messages: List[Dict[str, str]]) -> Message:
+    async def _stream_review(self, system: str, messages: List[Dict[str, str]]) -> str:
+        """
+        Stream a review, stopping once the final verdict has been received.
+
+        Args:
+            system (str): The system message.
+            messages (List[Dict[str, str]]): The list of messages for the conversation.
+
+        Returns:
+            str: The review text received so far.
+
+        Raises:
+            Exception: If there's an error in the API call.
+        """
+        logger.info("Streaming review response")
+        text = ""
+        try:
+            async with self.client.messages.stream(**self._request_params(system, messages)) as stream:
+                async for chunk in stream.text_stream:
+                    text += chunk
+                    # Stop at the closing tag, but only once the verdict parses, so a
+                    # tag quoted earlier in the review does not cut it short
+                    if FINAL_VERDICT_CLOSE in text[-(len(chunk) + len(FINAL_VERDICT_CLOSE)):] and FEEDBACK_RE.search(text):
+                        logger.info("Final verdict received, closing the stream early")
+                        break
+        except Exception as e:
+            logger.error("Error in API call: %s", str(e))
+            raise
+        return text
+
+    def _request_params(self, system: str, messages: List[Dict[str, str]], max_tokens: Optional[int] = None) -> Dict[str, Any]:
+        """Keyword arguments for messages.create or messages.stream; max_tokens defaults to the configured limit."""
+        if max_tokens is None:
+            max_tokens = self.config.get('max_tokens', 2000)  # Increased max_tokens for more detailed reviews
+        return dict(
+            model=self.config['model_name'],
+            max_tokens=max_tokens,
+            system=system,
+            messages=messages,
+            extra_headers=self.config.get('anthropic_headers', {})
+        )
+
+    async def _make_api_call(self, system: str, messages: List[Dict[str, str]], max_tokens: Optional[int] = None) -> Message:
         """
         Make an API call to the Anthropic client.
 
         Args:
             system (str): The system message.
             messages (List[Dict[str, str]]): The list of messages for the conversation.
+            max_tokens (Optional[int]): Output token limit for the response; None uses the configured limit.
 
         Returns:
             Message: The response from the Anthropic API.
@@ -259,14 +535,13 @@ class WiseCounsel:
         """
         logger.info("Making API call to Anthropic")
         try:
-            response = self.client.messages.create(
-                model=self.config['model_name'],
-                max_tokens=self.config.get('max_tokens', 2000),  # Increased max_tokens for more detailed reviews
-                system=system,
-                messages=messages,
-                extra_headers=self.config.get('anthropic_headers', {})
-            )
-            logger.info("API call successful. Response:\n%s", wrap_text_for_logging(str(response)))
+            params = self._request_params(system, messages, max_tokens)
+            if isinstance(self.client, anthropic.AsyncAnthropic):
+                response = await self.client.messages.create(**params)
+            else:
+                response = await asyncio.to_thread(self.client.messages.create, **params)
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("API call successful. Response:\n%s", wrap_text_for_logging(str(response)))
             return response
         except Exception as e:
             logger.error("Error in API call: %s", str(e))